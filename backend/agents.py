@@ -1,6 +1,6 @@
-from crewai import Agent, Task, Crew
 from typing import Dict, Any, Optional
 import logging
+import threading
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -54,17 +54,36 @@ class UITools:
 class GreetingAgent:
     """
     Agent responsible for greeting users and collecting basic information
+    
+    Instances are stateless between requests: per-request data only flows through
+    method arguments, so one instance per worker is shared via the agent registry.
+    The CrewAI agent is only built when something actually needs the LLM stack;
+    the template responses below never touch it.
     """
     
     def __init__(self):
         self.tools = UITools()
-        self.agent = Agent(
-            role="The primary greeter and initial guide",
-            goal="To warmly welcome the user, introduce the app's functionality, and obtain their basic identity (name) to personalize the interaction",
-            backstory="You are the friendly AI concierge for Music Besties, an app that helps users find their music tribe. Your job is to make users feel welcome and guide them through their first interaction.",
-            verbose=True,
-            allow_delegation=False
-        )
+        self._agent = None
+        self._agent_lock = threading.Lock()
+    
+    @property
+    def agent(self):
+        """The underlying CrewAI agent, built on first access"""
+        if self._agent is None:
+            with self._agent_lock:
+                if self._agent is None:
+                    # Imported here so importing this module doesn't pull in all of crewai
+                    from crewai import Agent
+                    
+                    logger.info("Building CrewAI agent for GreetingAgent")
+                    self._agent = Agent(
+                        role="The primary greeter and initial guide",
+                        goal="To warmly welcome the user, introduce the app's functionality, and obtain their basic identity (name) to personalize the interaction",
+                        backstory="You are the friendly AI concierge for Music Besties, an app that helps users find their music tribe. Your job is to make users feel welcome and guide them through their first interaction.",
+                        verbose=True,
+                        allow_delegation=False
+                    )
+        return self._agent
     
     def greet_user_and_ask_name(self, user_message: str) -> Dict[str, Any]:
         """
@@ -0,0 +1,109 @@
+"""
+Change feed staleness benchmark for The Music Besties API
+Runs the change feed against the in-memory Supabase stand-in while song titles are
+updated at a steady rate, and reports how long each change took to reach its cache
+invalidation handler against the bound of one poll interval plus one poll, along
+with what each poll costs.
+
+Usage:
+    python -m benchmarks.change_feed [--interval S] [--updates-per-second N] [--duration S]
+                                     [--db-latency-ms MS]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from typing import Dict, List
+
+os.environ.setdefault("SUPABASE_BACKEND", "memory")
+os.environ.setdefault("TEST_MODE", "true")
+
+from benchmarks.e2e import percentile
+from benchmarks.workload import WorkloadConfig, generate
+from utils.change_feed import ChangeFeed
+from utils.memory_supabase import get_memory_client
+
+async def run(interval: float, rate: float, duration: float) -> Dict[str, float]:
+    client = get_memory_client()
+    latency, client.latency = client.latency, 0.0
+    generate(client, WorkloadConfig())
+    client.latency = latency
+    song_ids = list(client.get_table("songs").rows)
+
+    written: Dict[str, float] = {}
+    staleness: List[float] = []
+
+    def on_songs(rows):
+        now = time.perf_counter()
+        for row in rows:
+            started = written.pop(f"{row['id']}|{row['title']}", None)
+            if started is not None:
+                staleness.append(now - started)
+
+    feed = ChangeFeed(client_factory=lambda: client, interval=interval)
+    feed.subscribe("songs", on_songs, columns="title")
+
+    poll_times: List[float] = []
+    measuring = False
+    poll = feed.poll
+
+    async def timed_poll():
+        start = time.perf_counter()
+        try:
+            return await poll()
+        finally:
+            if measuring:
+                poll_times.append(time.perf_counter() - start)
+
+    feed.poll = timed_poll
+    await feed.start()
+    # Polls re-read the freshly seeded catalog until it leaves the lookback window
+    await asyncio.sleep(feed.lookback.total_seconds() + interval * 1.5)
+    measuring = True
+
+    rng = random.Random(0)
+    deadline = time.perf_counter() + duration
+    updates = 0
+    while time.perf_counter() < deadline:
+        song_id = rng.choice(song_ids)
+        title = f"Renamed {updates}"
+        written[f"{song_id}|{title}"] = time.perf_counter()
+        await asyncio.to_thread(lambda: client.table("songs").update({"title": title}).eq("id", song_id).execute())
+        updates += 1
+        await asyncio.sleep(rng.expovariate(rate))
+
+    # Let the last changes arrive
+    await asyncio.sleep(interval * 2 + 0.5)
+    await feed.stop()
+
+    staleness.sort()
+    poll_times.sort()
+    return {
+        "updates": updates,
+        "delivered": len(staleness),
+        "missed": len(written),
+        "staleness_p50_ms": percentile(staleness, 0.5) * 1000,
+        "staleness_p99_ms": percentile(staleness, 0.99) * 1000,
+        "staleness_max_ms": (staleness[-1] if staleness else 0.0) * 1000,
+        "bound_ms": (interval + (poll_times[-1] if poll_times else 0.0)) * 1000,
+        "polls": len(poll_times),
+        "poll_p50_ms": percentile(poll_times, 0.5) * 1000,
+        "poll_max_ms": (poll_times[-1] if poll_times else 0.0) * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--interval", type=float, default=1.0)
+    parser.add_argument("--updates-per-second", type=float, default=20.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Injected latency per DB query")
+    args = parser.parse_args()
+
+    get_memory_client().latency = args.db_latency_ms / 1000
+    results = asyncio.run(run(args.interval, args.updates_per_second, args.duration))
+    for key, value in results.items():
+        print(f"{key:20s} {value:.2f}" if isinstance(value, float) else f"{key:20s} {value}")
+
+if __name__ == "__main__":
+    main()
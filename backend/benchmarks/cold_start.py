@@ -0,0 +1,87 @@
+"""
+Cold-start import benchmark for The Music Besties API
+Imports main in a fresh interpreter with -X importtime, reports the slowest top-level
+imports and fails if the total exceeds the cold-start budget
+
+Usage:
+    python -m benchmarks.cold_start [--budget-ms N] [--runs N] [--top N]
+"""
+import argparse
+import os
+import re
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules that must not be imported while loading the app; they are deferred to first use
+DEFERRED_MODULES = ("openai", "supabase", "crewai", "numpy")
+
+DEFAULT_BUDGET_MS = float(os.getenv("COLD_START_BUDGET_MS", "1000"))
+
+LINE_RE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+def profile_import() -> Tuple[float, List[Tuple[str, float]], Dict[str, float]]:
+    """
+    Import main in a subprocess with -X importtime
+
+    Returns:
+        (total_ms, top-level imports as (module, cumulative_ms), every module's cumulative_ms)
+    """
+    env = dict(os.environ, PYTHONDONTWRITEBYTECODE="1")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=BACKEND_DIR,
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True
+    )
+
+    top_level: List[Tuple[str, float]] = []
+    modules: Dict[str, float] = {}
+    total_ms = 0.0
+    for line in result.stderr.splitlines():
+        match = LINE_RE.match(line)
+        if not match:
+            continue
+        cumulative_ms = int(match.group(2)) / 1000
+        depth = len(match.group(3)) // 2
+        module = match.group(4)
+        modules[module] = cumulative_ms
+        if module == "main":
+            total_ms = cumulative_ms
+        elif depth == 1:
+            top_level.append((module, cumulative_ms))
+
+    top_level.sort(key=lambda item: item[1], reverse=True)
+    return total_ms, top_level, modules
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--budget-ms", type=float, default=DEFAULT_BUDGET_MS)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    totals = []
+    for _ in range(args.runs):
+        total_ms, top_level, modules = profile_import()
+        totals.append(total_ms)
+
+    median_ms = statistics.median(totals)
+    print(f"import main: median {median_ms:.1f} ms over {args.runs} runs (budget {args.budget_ms:.0f} ms)")
+    print("slowest imports (last run):")
+    for module, cumulative_ms in top_level[:args.top]:
+        print(f"  {cumulative_ms:8.1f} ms  {module}")
+
+    eager = [name for name in DEFERRED_MODULES if name in modules]
+    if eager:
+        raise SystemExit(f"Deferred modules imported at startup: {', '.join(eager)}")
+    if median_ms > args.budget_ms:
+        raise SystemExit(f"Cold-start import time {median_ms:.1f} ms exceeds {args.budget_ms:.0f} ms budget")
+
+if __name__ == "__main__":
+    main()
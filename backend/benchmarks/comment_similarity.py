@@ -0,0 +1,122 @@
+"""
+Comment similarity benchmark for The Music Besties API
+Generates comments in near-duplicate families (a base comment plus copies with a few
+words inserted, dropped or swapped), indexes them with MinHash/LSH, and measures:
+
+    - precision and recall of LSH matches against exact Jaccard similarity of the
+      shingle sets, over a sample of query comments
+    - index throughput (comments per second) and query latency
+    - the brute-force scans LSH replaces: exact Jaccard against every distinct text,
+      and comparing the query signature against every signature
+
+Usage:
+    python -m benchmarks.comment_similarity [--comments N] [--queries N] [--threshold T]
+"""
+import argparse
+import random
+import time
+import uuid
+from typing import Dict, List, Set
+
+import numpy as np
+
+from benchmarks.e2e import percentile
+from utils.comment_similarity import CommentSimilarityIndex, normalize, shingles
+
+# Index ids are interned UUIDs; users and items get their own ranges
+USER_OFFSET = 1 << 32
+ITEM_OFFSET = 2 << 32
+
+def bench_id(number: int) -> str:
+    return str(uuid.UUID(int=number))
+
+def make_comments(count: int, rng: random.Random) -> List[str]:
+    """Comments in families of near-duplicates with 0-5 word edits each"""
+    vocabulary = ["".join(rng.choice("abcdefghijklmnopqrstuvwxyz") for _ in range(rng.randint(2, 8))) for _ in range(3000)]
+    comments = []
+    while len(comments) < count:
+        base = [rng.choice(vocabulary) for _ in range(rng.randint(4, 16))]
+        for _ in range(rng.randint(1, 12)):
+            words = list(base)
+            for _ in range(rng.randint(0, 5)):
+                edit = rng.random()
+                position = rng.randrange(len(words) + 1)
+                if edit < 0.4:
+                    words.insert(position, rng.choice(vocabulary))
+                elif edit < 0.7 and len(words) > 2:
+                    words.pop(min(position, len(words) - 1))
+                else:
+                    words[min(position, len(words) - 1)] = rng.choice(vocabulary)
+            comments.append(" ".join(words))
+    return comments[:count]
+
+def jaccard(a: Set[str], b: Set[str]) -> float:
+    return len(a & b) / len(a | b)
+
+def timed(values: List[float]) -> str:
+    values.sort()
+    return f"p50 {percentile(values, 0.5) * 1000:7.3f} ms  p99 {percentile(values, 0.99) * 1000:7.3f} ms"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--comments", type=int, default=20000)
+    parser.add_argument("--items", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--threshold", type=float, default=0.5)
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    comments = make_comments(args.comments, rng)
+    index = CommentSimilarityIndex(threshold=args.threshold)
+    start = time.perf_counter()
+    for i, comment in enumerate(comments):
+        index.add(bench_id(i), bench_id(USER_OFFSET + i), ("song", bench_id(ITEM_OFFSET + rng.randrange(args.items))), comment)
+    elapsed = time.perf_counter() - start
+    print(f"indexed          {len(index)} comments, {index.distinct_texts} distinct, {len(index) / elapsed:,.0f} comments/s")
+    print(f"LSH              {index.bands} bands x {index.rows} rows, threshold {args.threshold}")
+
+    texts = list(index._texts)
+    shingle_sets: Dict[str, Set[str]] = {text: shingles(text) for text in texts}
+    signatures = np.stack([index._texts[text].signature for text in texts])
+
+    true_pairs = found_pairs = correct = 0
+    lsh_times, scan_times, exact_times = [], [], []
+    for text in rng.sample(texts, min(args.queries, len(texts))):
+        start = time.perf_counter()
+        found = {match for match, _ in index.similar_texts(text)} - {text}
+        lsh_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        (signatures == index._texts[text].signature).mean(axis=1) >= args.threshold
+        scan_times.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        query = shingle_sets[text]
+        truth = {other for other in texts if other != text and jaccard(query, shingle_sets[other]) >= args.threshold}
+        exact_times.append(time.perf_counter() - start)
+
+        true_pairs += len(truth)
+        found_pairs += len(found)
+        correct += len(found & truth)
+
+    print(f"precision        {correct / max(found_pairs, 1):.3f} ({found_pairs} matches)")
+    print(f"recall           {correct / max(true_pairs, 1):.3f} ({true_pairs} pairs at Jaccard >= {args.threshold})")
+    print(f"LSH query        {timed(lsh_times)}")
+    print(f"signature scan   {timed(scan_times)}")
+    print(f"exact scan       {timed(exact_times)}")
+
+    # Per-item lookups go through the same buckets and filter by item
+    per_item = []
+    for i in rng.sample(range(len(comments)), min(args.queries, len(comments))):
+        start = time.perf_counter()
+        index.similar(bench_id(i), same_item=True)
+        per_item.append(time.perf_counter() - start)
+    print(f"same-item query  {timed(per_item)}")
+
+    start = time.perf_counter()
+    for comment in comments[:1000]:
+        index.hasher.signature(normalize(comment))
+    print(f"signature        {(time.perf_counter() - start) / min(1000, len(comments)) * 1e6:.1f} us per comment")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+"""
+Compression benchmark for The Music Besties API
+Measures CPU time against bytes saved for gzip and brotli across levels on discography,
+curations and search payloads, then compares compressing on every request with
+replaying a precompressed ValidatorCache entry.
+
+Usage:
+    python -m benchmarks.compression [--iterations N]
+"""
+import argparse
+import gzip
+import time
+from typing import Callable, Dict
+
+from benchmarks.serialization import make_curations, make_discography
+from utils.compression import SUPPORTED_ENCODINGS, brotli, compress
+from utils.http_cache import ValidatorCache, conditional_response
+from utils.serialization import dumps
+
+# Levels compared per encoding; the configured defaults are gzip 6 and brotli 4
+LEVELS = {"gzip": (1, 6, 9), "br": (1, 4, 6, 9)}
+
+def make_search_results(count: int) -> Dict[str, object]:
+    return {"items": [
+        {"id": f"{i:08d}-0000-4000-8000-000000000000", "name": f"Artist {i}", "genre": "Pop", "image_url": f"https://example.com/artist-{i}.jpg"}
+        for i in range(count)
+    ]}
+
+def compressor(encoding: str, level: int) -> Callable[[bytes], bytes]:
+    if encoding == "br":
+        return lambda body: brotli.compress(body, quality=level)
+    return lambda body: gzip.compress(body, compresslevel=level, mtime=0)
+
+def cpu_per_call(fn: Callable[[], object], iterations: int) -> float:
+    """CPU microseconds per call"""
+    fn()
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+class _Request:
+    """Just enough of a Request for conditional_response"""
+    def __init__(self, accept_encoding: str):
+        self.headers = {"Accept-Encoding": accept_encoding}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    payloads = {
+        "discography (12x16)": make_discography(12, 16),
+        "curations (1000 rows)": make_curations(1000),
+        "search (10 artists)": make_search_results(10),
+    }
+
+    for name, payload in payloads.items():
+        body = dumps(payload)
+        print(f"{name}: {len(body)} bytes")
+        for encoding in SUPPORTED_ENCODINGS:
+            for level in LEVELS[encoding]:
+                fn = compressor(encoding, level)
+                encoded = fn(body)
+                cpu = cpu_per_call(lambda: fn(body), args.iterations)
+                saved = len(body) - len(encoded)
+                print(
+                    f"  {encoding:<4} level {level:<2} {len(encoded):>7} bytes ({len(encoded) / len(body):5.1%})  "
+                    f"{cpu:>8.1f} us CPU  {cpu / max(saved, 1) * 1000:>6.2f} us/KB saved"
+                )
+
+        # A cache hit compresses nothing: the first request per encoding paid for it
+        cache = ValidatorCache("benchmark")
+        cache.set("key", payload)
+        for encoding in SUPPORTED_ENCODINGS:
+            request = _Request(encoding)
+            per_request = cpu_per_call(lambda: compress(body, encoding), args.iterations)
+            hit = cpu_per_call(lambda: conditional_response(request, cached=cache.get("key")), args.iterations)
+            print(f"  {encoding:<4} response: {per_request:>8.1f} us compressing per request, {hit:>6.1f} us from the precompressed cache")
+        identity = _Request("identity")
+        hit = cpu_per_call(lambda: conditional_response(identity, cached=cache.get("key")), args.iterations)
+        print(f"  none response: {hit:>6.1f} us from the cache")
+
+if __name__ == "__main__":
+    main()
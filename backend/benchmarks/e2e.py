@@ -0,0 +1,194 @@
+"""
+End-to-end benchmark for The Music Besties API
+Generates a synthetic workload in the in-memory Supabase stand-in, replays mixed traffic
+against the ASGI app in-process with the LLM stubbed, and reports throughput plus
+p50/p95/p99 latency per route. Results are written as JSON for run-to-run comparison.
+
+By default chat uses the TEST_MODE canned responses. With --llm-stub the real OpenAI
+client path runs against the local stub server from benchmarks/llm_stub.py.
+
+Usage:
+    python -m benchmarks.e2e [--requests N] [--concurrency N] [--db-latency-ms MS]
+                             [--llm-stub] [--llm-ttft-ms MS] [--llm-tokens-per-second N]
+                             [--output results.json] [--compare baseline.json]
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+# Configure the app for offline benchmarking before it is imported
+os.environ.setdefault("SUPABASE_BACKEND", "memory")
+os.environ.setdefault("TEST_MODE", "true")
+# Synthetic users share one client address; measure the app, not the rate limiter
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+
+import httpx
+
+from benchmarks.llm_stub import StubConfig, StubServer
+from benchmarks.workload import DEFAULT_MIX, WorkloadConfig, generate, plan_requests
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    """Nearest-rank percentile of an already sorted list"""
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: Dict[str, List[float]], errors: Dict[str, int], elapsed: float) -> Dict[str, Any]:
+    """Build the per-route and overall summary"""
+    routes = {}
+    total = 0
+    for route, values in sorted(latencies.items()):
+        values.sort()
+        total += len(values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": errors.get(route, 0),
+            "throughput_rps": len(values) / elapsed if elapsed else 0.0,
+            "mean_ms": statistics.fmean(values) * 1000 if values else 0.0,
+            "p50_ms": percentile(values, 0.50) * 1000,
+            "p95_ms": percentile(values, 0.95) * 1000,
+            "p99_ms": percentile(values, 0.99) * 1000,
+        }
+    return {
+        "elapsed_s": elapsed,
+        "requests": total,
+        "throughput_rps": total / elapsed if elapsed else 0.0,
+        "routes": routes,
+    }
+
+async def replay(app, planned, concurrency: int) -> Dict[str, Any]:
+    """Replay planned requests with a fixed number of concurrent clients"""
+    latencies: Dict[str, List[float]] = {}
+    errors: Dict[str, int] = {}
+    queue: asyncio.Queue = asyncio.Queue()
+    for request in planned:
+        queue.put_nowait(request)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as client:
+        async def worker():
+            while True:
+                try:
+                    request = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                headers = {"Authorization": f"Bearer {request.token}"}
+                start = time.perf_counter()
+                response = await client.request(request.method, request.path, json=request.json, headers=headers)
+                latencies.setdefault(request.route, []).append(time.perf_counter() - start)
+                if response.status_code >= 400:
+                    errors[request.route] = errors.get(request.route, 0) + 1
+                # A request that never suspends doesn't yield to the loop; a real client
+                # would, so let callbacks from worker threads run between requests
+                await asyncio.sleep(0)
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    return summarize(latencies, errors, elapsed)
+
+def print_report(results: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> None:
+    """Print a per-route table, with deltas against a baseline run if given"""
+    print(f"{results['requests']} requests in {results['elapsed_s']:.2f}s -> {results['throughput_rps']:.1f} req/s")
+    print(f"{'route':<12} {'reqs':>6} {'err':>4} {'rps':>8} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for route, stats in results["routes"].items():
+        line = (
+            f"{route:<12} {stats['requests']:>6} {stats['errors']:>4} {stats['throughput_rps']:>8.1f} "
+            f"{stats['p50_ms']:>8.2f} {stats['p95_ms']:>8.2f} {stats['p99_ms']:>8.2f}"
+        )
+        base = (baseline or {}).get("routes", {}).get(route)
+        if base and base["p95_ms"]:
+            change = (stats["p95_ms"] - base["p95_ms"]) / base["p95_ms"] * 100
+            line += f"   p95 {change:+.1f}% vs baseline"
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--artists", type=int, default=WorkloadConfig.artists)
+    parser.add_argument("--users", type=int, default=WorkloadConfig.users)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Injected latency per DB query")
+    parser.add_argument("--llm-stub", action="store_true", help="Run chat through the real OpenAI client against the local stub")
+    parser.add_argument("--llm-ttft-ms", type=float, default=StubConfig.ttft_ms)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=StubConfig.tokens_per_second)
+    parser.add_argument("--llm-error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-rate-limit-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write results JSON to this path")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    args = parser.parse_args()
+
+    # Keep request logging from dominating the measurement
+    import logging
+    logging.disable(logging.INFO)
+
+    stub = None
+    if args.llm_stub:
+        stub = StubServer(StubConfig(
+            ttft_ms=args.llm_ttft_ms,
+            tokens_per_second=args.llm_tokens_per_second,
+            error_rate=args.llm_error_rate,
+            rate_limit_rate=args.llm_rate_limit_rate,
+            seed=args.seed
+        )).start()
+        os.environ["OPENAI_BASE_URL"] = stub.base_url
+
+    from main import app
+    from utils.memory_supabase import get_memory_client
+
+    client = get_memory_client()
+    client.latency = args.db_latency_ms / 1000
+    config = WorkloadConfig(artists=args.artists, users=args.users, seed=args.seed)
+
+    latency, client.latency = client.latency, 0.0
+    workload = generate(client, config)
+    client.latency = latency
+
+    planned = plan_requests(workload, args.requests, seed=args.seed + 1)
+    try:
+        results = asyncio.run(replay(app, planned, args.concurrency))
+    finally:
+        if stub is not None:
+            stub.stop()
+    results["config"] = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "db_latency_ms": args.db_latency_ms,
+        "llm_stub": {
+            "ttft_ms": args.llm_ttft_ms,
+            "tokens_per_second": args.llm_tokens_per_second,
+            "error_rate": args.llm_error_rate,
+            "rate_limit_rate": args.llm_rate_limit_rate,
+        } if args.llm_stub else None,
+        "workload": vars(config),
+        "mix": DEFAULT_MIX,
+    }
+    results["environment"] = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print_report(results, baseline)
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results written to {args.output}")
+
+if __name__ == "__main__":
+    main()
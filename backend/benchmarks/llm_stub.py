@@ -0,0 +1,180 @@
+"""
+Deterministic OpenAI-compatible stub server for The Music Besties benchmarks
+Serves POST /v1/chat/completions (streaming and non-streaming) with configurable
+time-to-first-token, tokens/sec, error rate and 429 rate, so the real
+utils.llm completion paths can be exercised offline. Point the app at it with
+OPENAI_BASE_URL=http://127.0.0.1:<port>/v1.
+
+Usage:
+    python -m benchmarks.llm_stub [--port 8100] [--ttft-ms 250] [--tokens-per-second 60]
+                                  [--error-rate 0.0] [--rate-limit-rate 0.0]
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Tuple
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+VOCABULARY = (
+    "music", "album", "song", "curate", "favorite", "artist", "tribe", "lyrics", "bridge",
+    "chorus", "vinyl", "playlist", "era", "track", "love", "listen", "the", "a", "your", "and",
+)
+
+@dataclass
+class StubConfig:
+    ttft_ms: float = float(os.getenv("LLM_STUB_TTFT_MS", "250"))
+    tokens_per_second: float = float(os.getenv("LLM_STUB_TOKENS_PER_SECOND", "60"))
+    completion_tokens: int = int(os.getenv("LLM_STUB_COMPLETION_TOKENS", "40"))
+    error_rate: float = float(os.getenv("LLM_STUB_ERROR_RATE", "0"))
+    rate_limit_rate: float = float(os.getenv("LLM_STUB_RATE_LIMIT_RATE", "0"))
+    seed: int = int(os.getenv("LLM_STUB_SEED", "0"))
+
+def _completion_tokens(messages: List[Dict[str, Any]], count: int, seed: int) -> List[str]:
+    """Pick a deterministic token sequence for a conversation"""
+    digest = hashlib.sha256(json.dumps(messages, sort_keys=True).encode("utf-8")).digest()
+    rng = random.Random(int.from_bytes(digest[:8], "big") ^ seed)
+    words = [rng.choice(VOCABULARY) for _ in range(count)]
+    return [word if i == 0 else " " + word for i, word in enumerate(words)]
+
+def create_app(config: StubConfig) -> FastAPI:
+    """Build the stub ASGI app"""
+    app = FastAPI()
+    fault_rng = random.Random(config.seed)
+    fault_lock = threading.Lock()
+    state = {"requests": 0}
+
+    def draw_fault() -> Tuple[int, str]:
+        # One shared seeded stream, so a fixed request order replays the same faults
+        with fault_lock:
+            state["requests"] += 1
+            roll = fault_rng.random()
+        if roll < config.rate_limit_rate:
+            return 429, "Rate limit reached for requests"
+        if roll < config.rate_limit_rate + config.error_rate:
+            return 500, "The server had an error while processing your request"
+        return 200, ""
+
+    @app.get("/v1/models")
+    async def list_models():
+        return {"object": "list", "data": [{"id": "stub", "object": "model", "owned_by": "stub"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        status, error = draw_fault()
+        if status != 200:
+            error_type = "rate_limit_error" if status == 429 else "server_error"
+            headers = {"Retry-After": "1"} if status == 429 else {}
+            return JSONResponse({"error": {"message": error, "type": error_type}}, status_code=status, headers=headers)
+
+        messages = body.get("messages", [])
+        model = body.get("model", "stub")
+        count = min(config.completion_tokens, body.get("max_tokens") or config.completion_tokens)
+        tokens = _completion_tokens(messages, count, config.seed)
+        prompt_tokens = sum(len(str(message.get("content", "")).split()) for message in messages)
+        completion_id = f"chatcmpl-stub-{state['requests']}"
+        created = int(time.time())
+        token_interval = 1 / config.tokens_per_second if config.tokens_per_second > 0 else 0.0
+
+        if not body.get("stream"):
+            await asyncio.sleep(config.ttft_ms / 1000 + token_interval * max(len(tokens) - 1, 0))
+            return {
+                "id": completion_id,
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": "".join(tokens)},
+                    "finish_reason": "stop"
+                }],
+                "usage": {
+                    "prompt_tokens": prompt_tokens,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_tokens + len(tokens)
+                }
+            }
+
+        async def stream():
+            def chunk(delta: Dict[str, Any], finish_reason=None) -> str:
+                payload = {
+                    "id": completion_id,
+                    "object": "chat.completion.chunk",
+                    "created": created,
+                    "model": model,
+                    "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]
+                }
+                return f"data: {json.dumps(payload)}\n\n"
+
+            await asyncio.sleep(config.ttft_ms / 1000)
+            yield chunk({"role": "assistant", "content": ""})
+            for i, token in enumerate(tokens):
+                if i:
+                    await asyncio.sleep(token_interval)
+                yield chunk({"content": token})
+            yield chunk({}, finish_reason="stop")
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(stream(), media_type="text/event-stream")
+
+    return app
+
+class StubServer:
+    """Runs the stub under uvicorn in a background thread"""
+    def __init__(self, config: StubConfig, host: str = "127.0.0.1", port: int = 0):
+        import uvicorn
+
+        self._server = uvicorn.Server(uvicorn.Config(create_app(config), host=host, port=port, log_level="warning"))
+        self._thread = threading.Thread(target=self._server.run, daemon=True)
+        self.host = host
+
+    @property
+    def base_url(self) -> str:
+        port = self._server.servers[0].sockets[0].getsockname()[1]
+        return f"http://{self.host}:{port}/v1"
+
+    def start(self) -> "StubServer":
+        self._thread.start()
+        while not self._server.started:
+            time.sleep(0.01)
+        return self
+
+    def stop(self) -> None:
+        self._server.should_exit = True
+        self._thread.join(timeout=5)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    defaults = StubConfig()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--ttft-ms", type=float, default=defaults.ttft_ms)
+    parser.add_argument("--tokens-per-second", type=float, default=defaults.tokens_per_second)
+    parser.add_argument("--completion-tokens", type=int, default=defaults.completion_tokens)
+    parser.add_argument("--error-rate", type=float, default=defaults.error_rate)
+    parser.add_argument("--rate-limit-rate", type=float, default=defaults.rate_limit_rate)
+    parser.add_argument("--seed", type=int, default=defaults.seed)
+    args = parser.parse_args()
+
+    import uvicorn
+
+    config = StubConfig(
+        ttft_ms=args.ttft_ms,
+        tokens_per_second=args.tokens_per_second,
+        completion_tokens=args.completion_tokens,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        seed=args.seed
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,66 @@
+"""
+Instrumentation overhead benchmark for The Music Besties API
+Drives a minimal ASGI app directly, with and without MetricsMiddleware, and reports the
+added cost per request (budget: 50us)
+
+Usage:
+    python -m benchmarks.metrics [--requests N]
+"""
+import argparse
+import asyncio
+import time
+
+from utils.metrics import MetricsMiddleware, record_db_call
+
+OVERHEAD_BUDGET_US = 50.0
+
+class _Route:
+    path = "/api/music/artists/{artist_id}/albums"
+
+async def bare_app(scope, receive, send):
+    """Minimal endpoint that issues one recorded DB call"""
+    scope["route"] = _Route
+    record_db_call("albums", 0.0)
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"[]"})
+
+async def run(app, requests: int) -> float:
+    """Return mean wall time per request in microseconds"""
+    scope = {"type": "http", "method": "GET", "path": "/api/music/artists/1/albums", "headers": []}
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for _ in range(requests):
+        await app(dict(scope), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+async def main_async(requests: int):
+    instrumented = MetricsMiddleware(bare_app)
+    # Warm up both paths so label series already exist
+    await run(bare_app, 1000)
+    await run(instrumented, 1000)
+
+    bare = await run(bare_app, requests)
+    with_metrics = await run(instrumented, requests)
+    overhead = with_metrics - bare
+
+    print(f"bare app          {bare:8.2f} us/request")
+    print(f"with metrics      {with_metrics:8.2f} us/request")
+    print(f"overhead          {overhead:8.2f} us/request (budget {OVERHEAD_BUDGET_US:.0f} us)")
+    return overhead
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    overhead = asyncio.run(main_async(args.requests))
+    if overhead > OVERHEAD_BUDGET_US:
+        raise SystemExit(f"Instrumentation overhead {overhead:.2f}us exceeds {OVERHEAD_BUDGET_US:.0f}us budget")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Notification fan-out benchmark for The Music Besties API
+Subscribes N consumers to one artist topic, publishes a burst of events and reports
+publish (fan-out) time, time until every consumer has drained its queue, and the cost
+that per-recipient serialization would have added.
+
+Usage:
+    python -m benchmarks.pubsub [--subscribers N] [--events N] [--policy coalesce]
+"""
+import argparse
+import asyncio
+import time
+
+from utils.pubsub import POLICIES, PubSub
+from utils.serialization import dumps
+
+def sample_event(i: int) -> dict:
+    return {
+        "kind": "curation",
+        "user_id": "5d0c3d1e-8f4b-4c57-9a0e-0b7f2a6c1d42",
+        "item_id": f"album-{i % 20}",
+        "item_type": "album",
+        "rating": i % 5 + 1,
+        "weighted_rank_percentage": i % 101,
+        "username": "Sarah",
+        "match_percentage": 92,
+    }
+
+async def run(subscribers: int, events: int, policy: str, queue_size: int) -> dict:
+    hub = PubSub()
+    await hub.start()
+    subscriptions = [hub.subscribe(["artist:taylor-swift"], maxsize=queue_size, policy=policy) for _ in range(subscribers)]
+    received = [0] * subscribers
+
+    async def consume(index, subscription):
+        async for _ in subscription:
+            received[index] += 1
+
+    consumers = [asyncio.create_task(consume(i, s)) for i, s in enumerate(subscriptions)]
+    await asyncio.sleep(0)
+
+    start = time.perf_counter()
+    for i in range(events):
+        hub.publish("artist:taylor-swift", sample_event(i), key=f"curation:sarah:album-{i % 20}")
+    published = time.perf_counter() - start
+
+    # Consumers drain after the burst, so bounded queues and policies take effect
+    for subscription in subscriptions:
+        subscription.close()
+    await asyncio.gather(*consumers)
+    drained = time.perf_counter() - start
+
+    # What serializing once per recipient would have cost for the same burst
+    start = time.perf_counter()
+    sample = {"type": "notification", "topic": "artist:taylor-swift", "event": sample_event(0)}
+    for _ in range(min(subscribers * events, 200_000)):
+        dumps(sample)
+    per_recipient = (time.perf_counter() - start) / min(subscribers * events, 200_000) * subscribers * events
+
+    await hub.stop()
+    return {
+        "deliveries": subscribers * events,
+        "received": sum(received),
+        "dropped": sum(s.dropped for s in subscriptions),
+        "publish_ms": published * 1000,
+        "publish_us_per_delivery": published / (subscribers * events) * 1e6,
+        "drain_ms": drained * 1000,
+        "per_recipient_serialization_ms": per_recipient * 1000,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--subscribers", type=int, default=10_000)
+    parser.add_argument("--events", type=int, default=100)
+    parser.add_argument("--policy", choices=POLICIES, default="coalesce")
+    parser.add_argument("--queue-size", type=int, default=100)
+    args = parser.parse_args()
+    results = asyncio.run(run(args.subscribers, args.events, args.policy, args.queue_size))
+    for key, value in results.items():
+        print(f"{key:32s} {value:.2f}" if isinstance(value, float) else f"{key:32s} {value}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Rate limiter overhead benchmark for The Music Besties API
+Drives a minimal ASGI app directly, with and without RateLimitMiddleware, and reports the
+added cost per request for a limited route and a pass-through route (budget: 20us)
+
+Usage:
+    python -m benchmarks.rate_limit [--requests N]
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# A budget large enough that no request is rejected, so every request pays for a token
+os.environ.setdefault("RATE_LIMITS", '{"/api/music/search": [1000000, 1000000]}')
+
+from utils.rate_limit import MemoryBucketStore, RateLimitMiddleware
+
+OVERHEAD_BUDGET_US = 20.0
+
+async def bare_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": [(b"content-type", b"application/json")]})
+    await send({"type": "http.response.body", "body": b"[]"})
+
+async def run(app, path: str, requests: int, clients: int = 1000) -> float:
+    """Return mean wall time per request in microseconds, spreading requests over many clients"""
+    scopes = [
+        {"type": "http", "method": "GET", "path": path, "headers": [], "client": (f"10.0.{i // 256}.{i % 256}", 50000)}
+        for i in range(clients)
+    ]
+
+    async def receive():
+        return {"type": "http.request", "body": b""}
+
+    async def send(message):
+        pass
+
+    start = time.perf_counter()
+    for i in range(requests):
+        await app(dict(scopes[i % clients]), receive, send)
+    return (time.perf_counter() - start) / requests * 1e6
+
+async def main_async(requests: int):
+    limited = RateLimitMiddleware(bare_app, store=MemoryBucketStore(), enabled=True)
+    for path in ("/api/music/search", "/api/music/artists/1/albums"):
+        await run(bare_app, path, 1000)
+        await run(limited, path, 1000)
+
+    results = {}
+    for label, path in (("limited route", "/api/music/search"), ("pass-through", "/api/music/artists/1/albums")):
+        bare = await run(bare_app, path, requests)
+        with_limiter = await run(limited, path, requests)
+        results[label] = with_limiter - bare
+        print(f"{label:14s} bare {bare:7.2f} us  limited {with_limiter:7.2f} us  overhead {with_limiter - bare:6.2f} us")
+
+    await limited.loop_monitor.stop()
+    print(f"budget {OVERHEAD_BUDGET_US:.0f} us/request")
+    return max(results.values())
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=50000)
+    args = parser.parse_args()
+    overhead = asyncio.run(main_async(args.requests))
+    if overhead > OVERHEAD_BUDGET_US:
+        raise SystemExit(f"Rate limiter overhead {overhead:.2f}us exceeds {OVERHEAD_BUDGET_US:.0f}us budget")
+
+if __name__ == "__main__":
+    main()
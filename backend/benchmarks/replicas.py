@@ -0,0 +1,136 @@
+"""
+Read-replica consistency benchmark for The Music Besties API
+Runs the app against the in-memory primary with lagging in-memory replicas and has
+every user save a curation and immediately list their curations, as the app does after
+the curate button. Reports, with and without write watermarks:
+
+    - stale reads: listings missing the curation just saved (must be 0 with watermarks)
+    - where reads were served (replica, or primary and why)
+    - listing latency
+
+then waits out the lag and checks that the same users' reads are back on the replicas.
+The write buffer is off by default: its per-worker overlay would hide replica staleness.
+
+Usage:
+    python -m benchmarks.replicas [--replicas N] [--lag-ms MS] [--users N] [--rounds N]
+"""
+import argparse
+import asyncio
+import os
+import time
+from typing import Dict, List
+
+os.environ.setdefault("SUPABASE_BACKEND", "memory")
+os.environ.setdefault("TEST_MODE", "true")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+os.environ.setdefault("WRITE_BUFFER_WINDOW_MS", "0")
+
+import httpx
+
+from benchmarks.e2e import percentile
+from benchmarks.workload import WorkloadConfig, generate
+
+READ_LABELS = (("replica", "routed"), ("primary", "watermark"), ("primary", "unavailable"), ("primary", "failover"))
+
+class NoWatermarks:
+    """Watermark store that forgets every write: plain round-robin replica reads"""
+    def get(self, user_id: str) -> int:
+        return 0
+
+    def mark(self, user_ids, lsn: int) -> None:
+        pass
+
+    def pin(self, user_ids, seconds: float) -> None:
+        pass
+
+    def prune(self, replicated: int) -> None:
+        pass
+
+def read_counts() -> Dict[str, float]:
+    from utils.metrics import REPLICA_READS
+    return {f"{target}/{reason}": REPLICA_READS.value(target, reason) for target, reason in READ_LABELS}
+
+async def write_then_read(http: httpx.AsyncClient, workload, song_ids: List[str], rounds: int, prefix: str) -> Dict[str, object]:
+    """Each user saves a curation and lists their curations, `rounds` times"""
+    stale = 0
+    timings: List[float] = []
+
+    async def user(index: int):
+        nonlocal stale
+        headers = {"Authorization": f"Bearer {workload.tokens[index]}"}
+        song_id = song_ids[index % len(song_ids)]
+        for round_number in range(rounds):
+            comment = f"{prefix} round {round_number}"
+            await http.post("/api/music/curate", headers=headers, json={"item_id": song_id, "item_type": "song", "rating": 5, "comment": comment})
+            start = time.perf_counter()
+            response = await http.get("/api/music/curations", headers=headers)
+            timings.append(time.perf_counter() - start)
+            if not any(c["curated_item_id"] == song_id and c["comment"] == comment for c in response.json()):
+                stale += 1
+            await asyncio.sleep(0)
+
+    before = read_counts()
+    await asyncio.gather(*(user(i) for i in range(len(workload.tokens))))
+    after = read_counts()
+    timings.sort()
+    return {
+        "stale": stale,
+        "reads": {label: after[label] - before[label] for label in after if after[label] > before[label]},
+        "p50_ms": percentile(timings, 0.5) * 1000,
+        "p99_ms": percentile(timings, 0.99) * 1000,
+    }
+
+async def read_only(http: httpx.AsyncClient, workload) -> Dict[str, float]:
+    before = read_counts()
+    for token in workload.tokens:
+        await http.get("/api/music/curations", headers={"Authorization": f"Bearer {token}"})
+    after = read_counts()
+    return {label: after[label] - before[label] for label in after if after[label] > before[label]}
+
+async def run(args) -> None:
+    from main import app
+    from utils.memory_supabase import get_memory_client
+    from utils.supabase_client import get_supabase_client
+
+    client = get_memory_client()
+    workload = generate(client, WorkloadConfig(artists=20, users=args.users))
+    for replica in client.replicas:
+        replica.latency = client.latency = args.db_latency_ms / 1000
+    router = get_supabase_client()._client
+    song_ids = list(client.get_table("songs").rows)[:args.users]
+    lag = args.lag_ms / 1000
+    print(f"{len(client.replicas)} replicas, {args.lag_ms:g} ms behind; {args.users} users x {args.rounds} rounds of curate + list")
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+        await asyncio.sleep(lag)
+        store, router._store = router._store, NoWatermarks()
+        results = await write_then_read(http, workload, song_ids, args.rounds, "plain")
+        print(f"round-robin      stale {results['stale']:5d}  p50 {results['p50_ms']:6.2f} ms  p99 {results['p99_ms']:6.2f} ms  reads {results['reads']}")
+
+        await asyncio.sleep(lag)
+        router._store = store
+        results = await write_then_read(http, workload, song_ids, args.rounds, "watermark")
+        print(f"watermarks       stale {results['stale']:5d}  p50 {results['p50_ms']:6.2f} ms  p99 {results['p99_ms']:6.2f} ms  reads {results['reads']}")
+
+        await asyncio.sleep(lag + router._position_ttl)
+        print(f"after the lag    reads {await read_only(http, workload)}")
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--replicas", type=int, default=2)
+    parser.add_argument("--lag-ms", type=float, default=200)
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--db-latency-ms", type=float, default=0.0, help="Injected latency per DB query")
+    args = parser.parse_args()
+
+    os.environ["MEMORY_DB_REPLICAS"] = str(args.replicas)
+    os.environ["MEMORY_DB_REPLICA_LAG_MS"] = str(args.lag_ms)
+
+    import logging
+    logging.disable(logging.INFO)
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,88 @@
+"""
+Full-text search benchmark for The Music Besties API
+Builds the BM25 index over the synthetic catalog and curations, then reports build
+time, posting list size against uncompressed pairs, query latency for whole words,
+multi-word and as-you-type prefix queries, the cost of incremental updates, and the
+ilike title scan the index replaces.
+
+Usage:
+    python -m benchmarks.search [--artists N] [--queries N]
+"""
+import argparse
+import os
+import random
+import time
+import uuid
+from typing import Callable, Dict, List
+
+os.environ.setdefault("SUPABASE_BACKEND", "memory")
+os.environ.setdefault("TEST_MODE", "true")
+
+from benchmarks.e2e import percentile
+from benchmarks.workload import WorkloadConfig, generate
+from utils.memory_supabase import get_memory_client
+from utils.search_index import _decode_postings, build_index
+
+WORDS = ("midnight", "river", "golden", "echo", "paper", "moon", "static", "velvet", "lover", "red", "repeat", "underrated")
+
+def latencies(fn: Callable[[str], object], queries: List[str]) -> Dict[str, float]:
+    timings = []
+    for query in queries:
+        start = time.perf_counter()
+        fn(query)
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    return {"p50_ms": percentile(timings, 0.5) * 1000, "p99_ms": percentile(timings, 0.99) * 1000, "max_ms": timings[-1] * 1000}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--artists", type=int, default=200)
+    parser.add_argument("--queries", type=int, default=500)
+    args = parser.parse_args()
+
+    client = get_memory_client()
+    workload = generate(client, WorkloadConfig(artists=args.artists))
+
+    start = time.perf_counter()
+    index = build_index(client)
+    build_ms = (time.perf_counter() - start) * 1000
+    postings = sum(len(_decode_postings(p.data)[0]) for field in index._postings.values() for p in field.values())
+    print(f"documents        {len(index)}")
+    print(f"vocabulary       {index.vocabulary_size} terms")
+    print(f"build            {build_ms:.0f} ms")
+    print(f"postings         {postings} in {index.postings_bytes} bytes ({index.postings_bytes / postings:.2f} B each; int32 pairs: {postings * 8} bytes)")
+
+    rng = random.Random(0)
+    query_sets = {
+        "one word": [rng.choice(WORDS) for _ in range(args.queries)],
+        "two words": [f"{rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(args.queries)],
+        "artist + title": [f"{rng.choice(workload.artist_names)} {rng.choice(WORDS)}" for _ in range(args.queries)],
+        "prefix (typing)": [rng.choice(WORDS)[:rng.randint(2, 4)] for _ in range(args.queries)],
+    }
+    for name, queries in query_sets.items():
+        stats = latencies(lambda q: index.search(q, limit=20), queries)
+        print(f"query {name:<16} p50 {stats['p50_ms']:6.2f} ms  p99 {stats['p99_ms']:6.2f} ms  max {stats['max_ms']:6.2f} ms")
+
+    def ilike_scan(query: str):
+        for table in ("albums", "songs"):
+            client.table(table).select("id, title").ilike("title", f"%{query}%").limit(20).execute()
+    stats = latencies(ilike_scan, query_sets["one word"][:50])
+    print(f"ilike title scan       p50 {stats['p50_ms']:6.2f} ms  p99 {stats['p99_ms']:6.2f} ms  (in-memory stand-in; no index)")
+
+    song_ids = list(client.get_table("songs").rows)
+    start = time.perf_counter()
+    for i in range(1000):
+        index.apply("user_curations", [{
+            "id": str(uuid.UUID(int=i)), "user_id": workload.user_ids[0], "curated_item_id": rng.choice(song_ids),
+            "item_type": "song", "rating": 5, "comment": f"{rng.choice(WORDS)} on {rng.choice(WORDS)} forever"
+        }])
+    print(f"comment upsert   {(time.perf_counter() - start) * 1000:.1f} us each")
+    start = time.perf_counter()
+    for artist_id in workload.artist_ids[:20]:
+        index.apply("artists", [{"id": artist_id, "name": f"Renamed {artist_id[:8]}"}])
+    per_rename = (time.perf_counter() - start) / 20 * 1000
+    print(f"artist rename    {per_rename:.2f} ms each (re-indexes {WorkloadConfig().albums_per_artist} albums and their songs)")
+    print(f"tombstoned docs  {index.dead_docs}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+Serialization benchmark for The Music Besties API
+Compares FastAPI's default JSON path (response_model validation + jsonable_encoder
++ json.dumps) against the fast encoder path for large curations and discography payloads
+
+Usage:
+    python -m benchmarks.serialization [--iterations N]
+"""
+import argparse
+import time
+import uuid
+from typing import Any, Callable, Dict, List
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from models.curations import CurationItem
+from models.obsessions import ArtistDiscography
+from utils.serialization import FastJSONResponse
+
+def make_curations(count: int) -> List[Dict[str, Any]]:
+    """Build synthetic curation rows"""
+    return [
+        {
+            "id": str(uuid.uuid4()),
+            "user_id": str(uuid.uuid4()),
+            "curated_item_id": str(uuid.uuid4()),
+            "item_type": "song" if i % 3 else "album",
+            "rating": i % 5 + 1,
+            "comment": f"Comment number {i} about why this one is special",
+            "weighted_rank_percentage": i % 101
+        }
+        for i in range(count)
+    ]
+
+def make_discography(album_count: int, tracks_per_album: int) -> Dict[str, Any]:
+    """Build a synthetic artist discography"""
+    return {
+        "id": str(uuid.uuid4()),
+        "name": "Taylor Swift",
+        "genre": "Pop",
+        "image_url": "https://example.com/artist.jpg",
+        "albums": [
+            {
+                "id": str(uuid.uuid4()),
+                "title": f"Album {a}",
+                "release_year": 2006 + a,
+                "image_url": f"https://example.com/album-{a}.jpg",
+                "tracks": [
+                    {"id": str(uuid.uuid4()), "title": f"Track {t}", "duration": 180 + t, "track_number": t + 1}
+                    for t in range(tracks_per_album)
+                ]
+            }
+            for a in range(album_count)
+        ]
+    }
+
+def measure(render: Callable[[], bytes], iterations: int) -> Dict[str, float]:
+    """Run a render function and report CPU time per response and throughput"""
+    size = len(render())
+    start_cpu = time.process_time()
+    start_wall = time.perf_counter()
+    for _ in range(iterations):
+        render()
+    cpu = time.process_time() - start_cpu
+    wall = time.perf_counter() - start_wall
+    return {
+        "bytes": size,
+        "cpu_us_per_response": cpu / iterations * 1e6,
+        "mb_per_sec": size * iterations / wall / 1e6
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    curations = make_curations(1000)
+    discography = make_discography(12, 16)
+
+    cases = {
+        "curations (1000 rows)": {
+            "before": lambda: JSONResponse(jsonable_encoder([CurationItem(**row) for row in curations])).body,
+            "after": lambda: FastJSONResponse(curations).body
+        },
+        "discography (12x16)": {
+            "before": lambda: JSONResponse(jsonable_encoder(ArtistDiscography(**discography))).body,
+            "after": lambda: FastJSONResponse(discography).body
+        }
+    }
+
+    for name, paths in cases.items():
+        print(name)
+        for label, render in paths.items():
+            result = measure(render, args.iterations)
+            print(
+                f"  {label:<6} {result['bytes']:>8} bytes  "
+                f"{result['cpu_us_per_response']:>9.1f} us CPU/response  "
+                f"{result['mb_per_sec']:>8.1f} MB/s"
+            )
+
+if __name__ == "__main__":
+    main()
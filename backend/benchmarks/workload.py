@@ -0,0 +1,160 @@
+"""
+Synthetic workload generation for The Music Besties benchmarks
+Builds a catalog, users and curations with Zipfian artist popularity in the in-memory
+Supabase stand-in, and samples a mixed request stream against it
+"""
+import bisect
+import itertools
+import random
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from utils.memory_supabase import MemorySupabaseClient
+
+# Relative weights of each request type in the replayed traffic
+DEFAULT_MIX: Dict[str, float] = {
+    "search": 0.20,
+    "discography": 0.30,
+    "curate": 0.20,
+    "curations": 0.20,
+    "chat": 0.10,
+}
+
+SEARCH_TERMS = ("taylor", "the", "band", "boy", "girl", "moon", "river", "a", "lo", "red")
+
+@dataclass
+class WorkloadConfig:
+    artists: int = 200
+    albums_per_artist: int = 8
+    tracks_per_album: int = 12
+    users: int = 500
+    mean_curations_per_user: int = 25
+    zipf_exponent: float = 1.1
+    seed: int = 0
+
+@dataclass
+class Workload:
+    """Ids of the generated data, used to build requests"""
+    artist_ids: List[str] = field(default_factory=list)
+    artist_names: List[str] = field(default_factory=list)
+    albums_by_artist: Dict[str, List[str]] = field(default_factory=dict)
+    songs_by_artist: Dict[str, List[str]] = field(default_factory=dict)
+    user_ids: List[str] = field(default_factory=list)
+    tokens: List[str] = field(default_factory=list)
+    artist_cum_weights: List[float] = field(default_factory=list)
+
+    def pick_artist(self, rng: random.Random) -> str:
+        """Sample an artist by Zipfian popularity"""
+        point = rng.random() * self.artist_cum_weights[-1]
+        return self.artist_ids[bisect.bisect_left(self.artist_cum_weights, point)]
+
+    def pick_user(self, rng: random.Random) -> Tuple[str, str]:
+        """Sample a (user_id, token) pair uniformly"""
+        index = rng.randrange(len(self.user_ids))
+        return self.user_ids[index], self.tokens[index]
+
+def zipf_cum_weights(count: int, exponent: float) -> List[float]:
+    """Cumulative Zipf weights for ranks 1..count"""
+    return list(itertools.accumulate(1.0 / (rank ** exponent) for rank in range(1, count + 1)))
+
+def _uuid(rng: random.Random) -> str:
+    return str(uuid.UUID(int=rng.getrandbits(128), version=4))
+
+def generate(client: MemorySupabaseClient, config: WorkloadConfig) -> Workload:
+    """
+    Populate a client with a synthetic catalog, users and curations
+
+    Artist popularity follows a Zipf distribution: users' primary artists and their
+    curated items are drawn from popular artists far more often than from the tail.
+    """
+    rng = random.Random(config.seed)
+    workload = Workload()
+    genres = ("Pop", "Rock", "Indie", "Folk", "Hip-Hop", "Country")
+    words = ("Midnight", "River", "Golden", "Echo", "Paper", "Moon", "Static", "Velvet", "Lover", "Red")
+
+    for a in range(config.artists):
+        artist_id = _uuid(rng)
+        name = f"{rng.choice(words)} {rng.choice(words)} {a}"
+        workload.artist_ids.append(artist_id)
+        workload.artist_names.append(name)
+        client.seed("artists", [{"id": artist_id, "name": name, "genre": rng.choice(genres), "image_url": None}])
+
+        albums, songs = [], []
+        for b in range(config.albums_per_artist):
+            album_id = _uuid(rng)
+            albums.append({"id": album_id, "artist_id": artist_id, "title": f"{rng.choice(words)} {b}", "release_year": 1990 + rng.randrange(35), "image_url": None})
+            for t in range(config.tracks_per_album):
+                songs.append({"id": _uuid(rng), "album_id": album_id, "title": f"{rng.choice(words)} {rng.choice(words)}", "duration": rng.randint(120, 420), "track_number": t + 1})
+        client.seed("albums", albums)
+        client.seed("songs", songs)
+        workload.albums_by_artist[artist_id] = [album["id"] for album in albums]
+        workload.songs_by_artist[artist_id] = [song["id"] for song in songs]
+
+    workload.artist_cum_weights = zipf_cum_weights(config.artists, config.zipf_exponent)
+
+    for u in range(config.users):
+        user_id = _uuid(rng)
+        primary_artist = workload.pick_artist(rng)
+        workload.user_ids.append(user_id)
+        workload.tokens.append(client.auth.add_user(user_id, email=f"user{u}@example.com"))
+        client.seed("profiles", [{"id": user_id, "username": f"user{u}", "avatar_url": None, "primary_artist_id": primary_artist}])
+
+        # Curation counts are heavy-tailed too: most users curate a little, a few curate a lot
+        count = min(int(rng.expovariate(1 / config.mean_curations_per_user)) + 1, 500)
+        seen = set()
+        curations = []
+        for _ in range(count):
+            artist_id = primary_artist if rng.random() < 0.6 else workload.pick_artist(rng)
+            is_song = rng.random() < 0.75
+            item_id = rng.choice(workload.songs_by_artist[artist_id] if is_song else workload.albums_by_artist[artist_id])
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+            curations.append({
+                "user_id": user_id,
+                "curated_item_id": item_id,
+                "item_type": "song" if is_song else "album",
+                "rating": min(5, max(1, round(rng.gauss(3.8, 1.0)))),
+                "comment": rng.choice([None, None, "On repeat", "Bridge of the decade", "Underrated"]),
+                "weighted_rank_percentage": rng.randint(0, 100)
+            })
+        client.seed("user_curations", curations)
+
+    return workload
+
+@dataclass
+class PlannedRequest:
+    route: str
+    method: str
+    path: str
+    token: str
+    json: Optional[dict] = None
+
+def plan_requests(workload: Workload, count: int, mix: Dict[str, float] = DEFAULT_MIX, seed: int = 1) -> List[PlannedRequest]:
+    """Sample a deterministic mixed request stream"""
+    rng = random.Random(seed)
+    routes: Sequence[str] = list(mix)
+    weights = [mix[route] for route in routes]
+    planned = []
+    for route in rng.choices(routes, weights=weights, k=count):
+        _, token = workload.pick_user(rng)
+        if route == "search":
+            planned.append(PlannedRequest(route, "POST", "/api/music/search", token, {"query": rng.choice(SEARCH_TERMS)}))
+        elif route == "discography":
+            planned.append(PlannedRequest(route, "GET", f"/api/music/artists/{workload.pick_artist(rng)}/discography", token))
+        elif route == "curate":
+            artist_id = workload.pick_artist(rng)
+            planned.append(PlannedRequest(route, "POST", "/api/music/curate", token, {
+                "item_id": rng.choice(workload.songs_by_artist[artist_id]),
+                "item_type": "song",
+                "rating": rng.randint(1, 5),
+                "weighted_rank_percentage": rng.randint(0, 100)
+            }))
+        elif route == "curations":
+            planned.append(PlannedRequest(route, "GET", "/api/music/curations", token))
+        elif route == "chat":
+            planned.append(PlannedRequest(route, "POST", "/api/chat/", token, {
+                "message": rng.choice(["hi", "tell me about my favorite artist", "recommend something"])
+            }))
+    return planned
@@ -0,0 +1,210 @@
+"""
+WebSocket chat load test for The Music Besties API
+Starts one uvicorn worker with the in-memory Supabase stand-in, holds thousands of idle
+chat connections open while a set of active connections stream chat turns, and reports
+connect latency, time to first token, full-turn latency and worker memory per connection.
+
+By default chat uses the TEST_MODE canned responses. With --llm-stub turns stream from
+the local stub server in benchmarks/llm_stub.py through the real OpenAI client.
+
+Usage:
+    python -m benchmarks.ws_load [--idle N] [--active N] [--turns N]
+                                 [--worker-logs] [--llm-stub] [--llm-ttft-ms MS] [--llm-tokens-per-second N]
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from typing import Dict, List, Optional
+
+from websockets.asyncio.client import connect
+
+from benchmarks.e2e import percentile
+from benchmarks.llm_stub import StubConfig, StubServer
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = "test-token-for-development-only"
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+def _raise_fd_limit() -> None:
+    """Allow one process to hold thousands of sockets (inherited by the worker)"""
+    try:
+        import resource
+    except ImportError:  # pragma: no cover - Windows
+        return
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+def _rss_mb(pid: int) -> Optional[float]:
+    """Resident memory of a process in MB (Linux only)"""
+    try:
+        with open(f"/proc/{pid}/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        return None
+    return None
+
+def start_worker(port: int, env: Dict[str, str], logs: bool = False) -> subprocess.Popen:
+    worker_env = {
+        **os.environ,
+        "TEST_MODE": "true",
+        "SUPABASE_BACKEND": "memory",
+        "RATE_LIMIT_ENABLED": "false",
+        **env,
+    }
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=BACKEND_DIR,
+        env=worker_env,
+        # Per-connection INFO logs would dominate the worker's CPU at this scale
+        stdout=None if logs else subprocess.DEVNULL,
+        stderr=None if logs else subprocess.DEVNULL
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("Worker did not start")
+
+async def open_session(url: str):
+    """Connect, authenticate and wait for the ready frame"""
+    ws = await connect(url, ping_interval=None, max_queue=None)
+    await ws.send(json.dumps({"type": "auth", "token": TOKEN}))
+    while json.loads(await ws.recv())["type"] != "ready":
+        pass
+    return ws
+
+async def run_turn(ws) -> Dict[str, float]:
+    """Send one message; returns time to first token and to the done frame"""
+    start = time.perf_counter()
+    first_token = None
+    await ws.send(json.dumps({"type": "message", "content": "Tell me about my favorite artist"}))
+    while True:
+        frame = json.loads(await ws.recv())
+        if frame["type"] == "token" and first_token is None:
+            first_token = time.perf_counter() - start
+        elif frame["type"] == "done":
+            total = time.perf_counter() - start
+            return {"ttft": first_token if first_token is not None else total, "turn": total}
+        elif frame["type"] == "error":
+            raise RuntimeError(frame["detail"])
+
+async def run(url: str, pid: int, idle: int, active: int, turns: int, connect_concurrency: int) -> Dict[str, object]:
+    gate = asyncio.Semaphore(connect_concurrency)
+    connect_times: List[float] = []
+
+    async def timed_open():
+        async with gate:
+            start = time.perf_counter()
+            ws = await open_session(url)
+            connect_times.append(time.perf_counter() - start)
+            return ws
+
+    rss_start = _rss_mb(pid)
+    idle_sockets = await asyncio.gather(*(timed_open() for _ in range(idle)))
+    rss_idle = _rss_mb(pid)
+
+    active_sockets = await asyncio.gather(*(timed_open() for _ in range(active)))
+    ttfts: List[float] = []
+    turn_times: List[float] = []
+    errors = 0
+
+    async def chat(ws):
+        nonlocal errors
+        for _ in range(turns):
+            try:
+                timing = await run_turn(ws)
+            except Exception:
+                errors += 1
+                continue
+            ttfts.append(timing["ttft"])
+            turn_times.append(timing["turn"])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(chat(ws) for ws in active_sockets))
+    elapsed = time.perf_counter() - start
+    rss_active = _rss_mb(pid)
+
+    # Idle connections must still be served after the active phase
+    alive = 0
+    for ws in idle_sockets[::max(1, idle // 100)]:
+        await ws.send(json.dumps({"type": "ping"}))
+        if json.loads(await ws.recv())["type"] == "pong":
+            alive += 1
+    sampled = len(idle_sockets[::max(1, idle // 100)])
+
+    await asyncio.gather(*(ws.close() for ws in idle_sockets + active_sockets), return_exceptions=True)
+
+    connect_times.sort()
+    ttfts.sort()
+    turn_times.sort()
+    return {
+        "connections": idle + active,
+        "connect_p50_ms": percentile(connect_times, 0.5) * 1000,
+        "connect_p99_ms": percentile(connect_times, 0.99) * 1000,
+        "turns": len(turn_times),
+        "errors": errors,
+        "turns_per_second": len(turn_times) / elapsed if elapsed else 0.0,
+        "ttft_p50_ms": percentile(ttfts, 0.5) * 1000,
+        "ttft_p95_ms": percentile(ttfts, 0.95) * 1000,
+        "ttft_p99_ms": percentile(ttfts, 0.99) * 1000,
+        "turn_p50_ms": percentile(turn_times, 0.5) * 1000,
+        "turn_p99_ms": percentile(turn_times, 0.99) * 1000,
+        "idle_alive": f"{alive}/{sampled}",
+        "rss_start_mb": rss_start,
+        "rss_idle_mb": rss_idle,
+        "rss_active_mb": rss_active,
+        "kb_per_idle_connection": (rss_idle - rss_start) * 1024 / idle if rss_start and rss_idle and idle else None,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--idle", type=int, default=2000)
+    parser.add_argument("--active", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--connect-concurrency", type=int, default=100)
+    parser.add_argument("--worker-logs", action="store_true", help="Show the worker's log output")
+    parser.add_argument("--llm-stub", action="store_true")
+    parser.add_argument("--llm-ttft-ms", type=float, default=StubConfig.ttft_ms)
+    parser.add_argument("--llm-tokens-per-second", type=float, default=StubConfig.tokens_per_second)
+    args = parser.parse_args()
+
+    _raise_fd_limit()
+    env = {}
+    stub = None
+    if args.llm_stub:
+        stub = StubServer(StubConfig(ttft_ms=args.llm_ttft_ms, tokens_per_second=args.llm_tokens_per_second)).start()
+        env["OPENAI_BASE_URL"] = stub.base_url
+
+    port = _free_port()
+    worker = start_worker(port, env, logs=args.worker_logs)
+    try:
+        results = asyncio.run(run(
+            f"ws://127.0.0.1:{port}/api/chat/ws", worker.pid,
+            args.idle, args.active, args.turns, args.connect_concurrency
+        ))
+    finally:
+        worker.terminate()
+        worker.wait(timeout=10)
+        if stub is not None:
+            stub.stop()
+
+    for key, value in results.items():
+        print(f"{key:26s} {value:.2f}" if isinstance(value, float) else f"{key:26s} {value}")
+
+if __name__ == "__main__":
+    main()
@@ -4,14 +4,28 @@ This version focuses on the core API functionality without external dependencies
 """
 from fastapi import FastAPI, HTTPException, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from pydantic import BaseModel
 import os
 import logging
+from contextlib import asynccontextmanager
 from typing import Optional
 
+from utils.serialization import FastJSONResponse
+from utils.metrics import MetricsMiddleware, render_metrics
+from utils.rate_limit import RateLimitMiddleware
+from utils.compression import CompressionMiddleware
+from utils.loop_monitor import LOOP_BLOCK_FAIL, LOOP_MONITOR_ENABLED, BlockingCallMiddleware, get_loop_monitor
+from utils.jobs import get_job_queue
+from utils.pubsub import get_pubsub
+from utils.change_feed import CHANGE_FEED_ENABLED, get_change_feed
+from utils.search_index import SEARCH_INDEX_ENABLED, get_catalog_search
+from utils.comment_similarity import COMMENT_SIMILARITY_ENABLED, get_comment_similarity
+from utils.profiling import PROFILING_ENABLED, ProfilingMiddleware
+
 # Import routes
 from routes.auth import router as auth_router
-from routes.music import router as music_router
+from routes.music import router as music_router, curation_buffer
 from routes.chat import router as chat_router
 
 # Configure logging
@@ -21,15 +35,14 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-# Initialize FastAPI app
-app = FastAPI()
-
 # Get environment variables
 port = int(os.getenv("PORT", 8000))
 frontend_url = os.getenv("FRONTEND_URL", "http://localhost:3000")
 supabase_url = os.getenv("SUPABASE_URL")
 supabase_key = os.getenv("SUPABASE_KEY")
 openai_api_key = os.getenv("OPENAI_API_KEY")
+# Heavy clients are built on first use; WARM_START builds them in the lifespan hook instead
+warm_start = os.getenv("WARM_START", "false").lower() == "true"
 
 # Log startup information
 logger.info(f"Starting server on port {port}")
@@ -38,6 +51,44 @@ logger.info(f"Supabase URL is {'set' if supabase_url else 'not set'}")
 logger.info(f"Supabase Key is {'set' if supabase_key else 'not set'}")
 logger.info(f"OpenAI API Key is {'set' if openai_api_key else 'not set'}")
 
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Optionally construct heavy clients before serving the first request"""
+    if LOOP_MONITOR_ENABLED:
+        get_loop_monitor().start()
+    # Before the job queue: recovered notify jobs publish from worker threads
+    await get_pubsub().start()
+    await get_job_queue().start()
+    if CHANGE_FEED_ENABLED:
+        await get_change_feed().start()
+    if SEARCH_INDEX_ENABLED:
+        # Builds in the background; the first search waits for it
+        await get_catalog_search().start()
+    if COMMENT_SIMILARITY_ENABLED:
+        await get_comment_similarity().start()
+    if warm_start:
+        from utils.supabase_client import get_supabase_client
+        from utils.llm import get_openai_client
+
+        logger.info("Warm start: initializing Supabase and OpenAI clients")
+        get_supabase_client()
+        try:
+            get_openai_client()
+        except ValueError as e:
+            logger.warning(f"Skipping OpenAI client warm-up: {e}")
+    yield
+    # Write buffered curations, then finish post-response work before the worker exits
+    await curation_buffer.close()
+    await get_change_feed().stop()
+    await get_catalog_search().stop()
+    await get_comment_similarity().stop()
+    await get_job_queue().drain()
+    await get_pubsub().stop()
+    await get_loop_monitor().stop()
+
+# Initialize FastAPI app
+app = FastAPI(default_response_class=FastJSONResponse, lifespan=lifespan)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -52,10 +103,30 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Test mode: fail requests whose handlers block the event loop
+if LOOP_BLOCK_FAIL:
+    app.add_middleware(BlockingCallMiddleware)
+
+# Rate limit and shed load on expensive routes before any work is done
+app.add_middleware(RateLimitMiddleware)
+
+# Compress JSON responses that aren't already precompressed from a validator cache
+app.add_middleware(CompressionMiddleware)
+
+# Record per-route latency and add Server-Timing (outermost, so it times the whole stack)
+app.add_middleware(MetricsMiddleware)
+
+# On-demand profiling, outside everything it profiles; not installed at all without PROFILING_TOKEN
+if PROFILING_ENABLED:
+    app.add_middleware(ProfilingMiddleware)
+
 # Include routers
 app.include_router(auth_router, prefix="/api")
 app.include_router(music_router, prefix="/api")
 app.include_router(chat_router, prefix="/api")
+if PROFILING_ENABLED:
+    from routes.debug import router as debug_router
+    app.include_router(debug_router)
 
 # Define routes
 @app.get("/")
@@ -67,6 +138,11 @@ async def health_check():
     logger.info("Health check endpoint called")
     return {"status": "healthy"}
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Expose performance metrics in Prometheus text format"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
     logger.info("Starting server")
@@ -1,4 +1,4 @@
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 from typing import Optional, List
 
 class Artist(BaseModel):
@@ -23,10 +23,33 @@ class Song(BaseModel):
 
 class MusicSearch(BaseModel):
     query: str
+    mode: str = "artists"  # 'artists' (name match) or 'all' (ranked albums, songs, artists and comments)
+    types: Optional[List[str]] = None  # mode 'all': restrict to 'artist', 'album', 'song', 'comment'
+    limit: int = Field(20, ge=1, le=50)  # mode 'all': maximum results
 
 class MusicSearchResult(BaseModel):
-    items: List[dict]  # List of artists
+    items: List[dict]  # Artists, or typed results in mode 'all'
 
 class UserArtist(BaseModel):
     user_id: str
     artist_id: str
+
+class Track(BaseModel):
+    id: str
+    title: str
+    duration: Optional[int] = None  # in seconds
+    track_number: Optional[int] = None
+
+class AlbumWithTracks(BaseModel):
+    id: str
+    title: str
+    release_year: Optional[int] = None
+    image_url: Optional[str] = None
+    tracks: List[Track] = []
+
+class ArtistDiscography(BaseModel):
+    id: str
+    name: str
+    genre: Optional[str] = None
+    image_url: Optional[str] = None
+    albums: List[AlbumWithTracks] = []
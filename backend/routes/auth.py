@@ -1,6 +1,9 @@
 from fastapi import APIRouter, HTTPException, Depends, Request
 from models.auth import UserSignup, UserLogin, AuthResponse, UserProfile
 from utils.supabase_client import get_supabase_client
+from utils.jobs import enqueue_job, register_job
+from utils.analytics import track
+from utils.read_replicas import bind_user
 import logging
 
 # Configure logging
@@ -13,14 +16,22 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Get Supabase client
-supabase = get_supabase_client()
+def _create_profiles(profiles):
+    """Background job: create profile rows for new users in one bulk upsert"""
+    supabase = get_supabase_client()
+    response = supabase.table("profiles").upsert(profiles).execute()
+    if hasattr(response, 'error') and response.error:
+        raise RuntimeError(f"Error creating profiles: {response.error}")
+
+register_job("profiles.create", _create_profiles, batch_size=50)
 
 @router.post("/signup", response_model=AuthResponse)
 async def signup(user: UserSignup):
     """
     Register a new user with email, password, and username
     """
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Attempting to register user with email: {user.email}")
         
@@ -39,19 +50,14 @@ async def signup(user: UserSignup):
             logger.error(f"Supabase signup error: {auth_response.error}")
             raise HTTPException(status_code=400, detail=auth_response.error.message)
         
-        # Create profile record
+        # Create profile record after the response; the user is already created
         new_user = auth_response.user
-        profile_data = {
+        enqueue_job("profiles.create", {
             "id": new_user.id,
             "username": user.username,
             "updated_at": "now()"
-        }
-        
-        profile_response = supabase.table("profiles").insert(profile_data).execute()
-        
-        if hasattr(profile_response, 'error') and profile_response.error:
-            logger.error(f"Error creating profile: {profile_response.error}")
-            # Continue anyway since the user is created
+        })
+        track("user_signed_up", user_id=new_user.id)
         
         # Return success response
         return AuthResponse(
@@ -73,6 +79,8 @@ async def login(user: UserLogin):
     """
     Authenticate a user with email and password
     """
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Attempting to login user with email: {user.email}")
         
@@ -88,6 +96,7 @@ async def login(user: UserLogin):
         
         # Get user profile
         user_id = auth_response.user.id
+        bind_user(user_id)
         profile_response = supabase.table("profiles").select("*").eq("id", user_id).execute()
         
         if hasattr(profile_response, 'error') and profile_response.error:
@@ -123,6 +132,8 @@ async def logout(request: Request):
     """
     Log out the current user
     """
+    supabase = get_supabase_client()
+
     try:
         # Get JWT token from Authorization header
         auth_header = request.headers.get("Authorization")
@@ -145,6 +156,8 @@ async def get_current_user(request: Request):
     """
     Get the current authenticated user's profile
     """
+    supabase = get_supabase_client()
+
     try:
         # Get JWT token from Authorization header
         auth_header = request.headers.get("Authorization")
@@ -161,6 +174,7 @@ async def get_current_user(request: Request):
             raise HTTPException(status_code=401, detail="Invalid token")
         
         user_id = user_response.user.id
+        bind_user(user_id)
         
         # Get user profile
         profile_response = supabase.table("profiles").select("*").eq("id", user_id).execute()
@@ -1,9 +1,13 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Body
+from fastapi import APIRouter, Depends, HTTPException, status, Body, WebSocket, WebSocketDisconnect
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
+import asyncio
 import os
 import json
 import logging
+import time
+import uuid
 from datetime import datetime
 
 # Configure logger
@@ -11,8 +15,15 @@ logger = logging.getLogger(__name__)
 
 # Import Supabase client and LLM integration
 from utils.supabase import get_supabase_client
-from utils.llm import generate_response, LLMResponse
-from models.auth import User, get_current_user
+from utils.llm import agenerate_response, LLMResponse, LLMStream
+from utils.jobs import enqueue_job, register_job
+from utils.analytics import track
+from utils.rate_limit import take_token
+from utils.pubsub import COALESCE, get_pubsub
+from utils.serialization import dumps
+from utils.taste_digest import get_taste_digests
+from utils.read_replicas import bind_user
+from utils.test_config import TEST_MODE, TEST_TOKEN, get_test_user
 
 # Create router
 router = APIRouter(
@@ -44,30 +55,74 @@ class ChatResponse(BaseModel):
     sideboard_content: Optional[Dict[str, Any]] = None
     component_trigger: Optional[Dict[str, Any]] = None
 
+def _persist_chat_turns(turns: List[Dict[str, Any]]):
+    """Background job: store chat turns in chat_messages in one bulk insert"""
+    rows = [
+        {
+            "user_id": turn["user_id"],
+            "conversation_id": turn.get("conversation_id"),
+            "sender": message["sender"],
+            "content": message["content"],
+            "metadata": message.get("metadata")
+        }
+        for turn in turns
+        for message in turn["messages"]
+    ]
+    supabase = get_supabase_client()
+    response = supabase.table("chat_messages").insert(rows).execute()
+    if hasattr(response, 'error') and response.error:
+        raise RuntimeError(f"Error storing chat messages: {response.error}")
+
+register_job("chat.persist", _persist_chat_turns, batch_size=100)
+
+def _enqueue_turn(user_id: str, conversation_id: Optional[str], message: str, llm_response: LLMResponse):
+    """Store a chat turn and track it after the response"""
+    enqueue_job("chat.persist", {
+        "user_id": user_id,
+        "conversation_id": conversation_id,
+        "messages": [
+            {"sender": "user", "content": message},
+            {"sender": "assistant", "content": llm_response.message, "metadata": {"sideboard_content": llm_response.sideboard_content}}
+        ]
+    })
+    track("chat_message", user_id=user_id, conversation_id=conversation_id)
+
+# Bearer token for the HTTP chat routes; missing credentials are handled per route
+bearer = HTTPBearer(auto_error=False)
+
+async def get_chat_user_id(credentials: Optional[HTTPAuthorizationCredentials] = Depends(bearer)) -> Optional[str]:
+    """
+    Dependency resolving the bearer token to a user ID
+
+    Returns:
+        Optional[str]: The authenticated user's ID, or None without a valid token
+    """
+    if credentials is None:
+        return None
+    return await _authenticate_token(credentials.credentials)
+
 # Routes
 @router.post("/", response_model=ChatResponse)
 async def process_chat_message(
     message: str = Body(...),
-    user_id: Optional[str] = Body(None),
     conversation_id: Optional[str] = Body(None),
     context: Optional[Dict[str, Any]] = Body({}),
-    current_user: Optional[User] = None
+    user_id: Optional[str] = Depends(get_chat_user_id)
 ):
     """
     Process a chat message and return an AI response
+
+    The user comes from the bearer token only; turns are stored and the taste digest
+    loaded for that user.
     """
-    # Log the received request for debugging
-    logger.info(f"Received chat message: {message}, user_id: {user_id}, conversation_id: {conversation_id}")
-    
-    # Get user ID from authenticated user or request parameter
-    user_id = current_user.id if current_user else user_id
-    logger.info(f"Using user_id: {user_id}")
+    logger.info(f"Received chat message for user_id: {user_id}, conversation_id: {conversation_id}")
     
     if not user_id:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Authentication required for chat"
         )
+    bind_user(user_id)
     
     # Get Supabase client
     supabase = get_supabase_client()
@@ -83,11 +138,15 @@ async def process_chat_message(
     # Get conversation history (simplified - in a real app, you'd fetch from a database)
     conversation_history = context.get("conversation_history") if context else []
     
+    # Cached summary of the user's curations for grounding
+    taste_digest = await get_taste_digests().load(user_id, profile)
+    
     # Generate response using LLM
-    llm_response = generate_response(
+    llm_response = await agenerate_response(
         message=message,
         user_profile=profile,
-        conversation_history=conversation_history
+        conversation_history=conversation_history,
+        taste_digest=taste_digest
     )
     
     # Create response
@@ -96,23 +155,19 @@ async def process_chat_message(
         suggested_actions=llm_response.suggested_actions,
         context_modules=llm_response.context_modules,
         sideboard_content=llm_response.sideboard_content,
-        component_trigger=None  # Add component triggers if needed
+        component_trigger=llm_response.component_trigger
     )
     
-    # In a production system, we would store the conversation history in the database
+    # Store the turn after the response
+    _enqueue_turn(user_id, conversation_id, message, llm_response)
     
     return response
 
 @router.post("/init", response_model=ChatResponse)
-async def initialize_chat(
-    user_id: Optional[str] = Body(None, embed=False),
-    current_user: Optional[User] = None
-):
+async def initialize_chat(user_id: Optional[str] = Depends(get_chat_user_id)):
     """
-    Initialize a new chat conversation
+    Initialize a new chat conversation, personalized when a valid bearer token is sent
     """
-    # Get user ID from authenticated user or request
-    user_id = current_user.id if current_user else user_id
     logger.info(f"Initializing chat for user_id: {user_id}")
     
     # Get Supabase client
@@ -121,6 +176,7 @@ async def initialize_chat(
     # Get user profile information if user is authenticated
     profile = None
     if user_id:
+        bind_user(user_id)
         try:
             profile_response = supabase.table("profiles").select("*").eq("id", user_id).execute()
             profile = profile_response.data[0] if profile_response.data else None
@@ -128,7 +184,7 @@ async def initialize_chat(
             print(f"Error fetching profile: {e}")
     
     # Generate welcome message using LLM
-    llm_response = generate_response(
+    llm_response = await agenerate_response(
         message="start_conversation",  # Special trigger for welcome message
         user_profile=profile,
         conversation_history=[]
@@ -144,3 +200,219 @@ async def initialize_chat(
     )
     
     return response
+
+# WebSocket chat settings
+WS_AUTH_TIMEOUT = float(os.getenv("WS_AUTH_TIMEOUT", "10"))
+WS_HEARTBEAT_INTERVAL = float(os.getenv("WS_HEARTBEAT_INTERVAL", "25"))
+WS_IDLE_TIMEOUT = float(os.getenv("WS_IDLE_TIMEOUT", "75"))
+# Outgoing frames buffered per connection before a turn waits for the client
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "64"))
+# Messages of history kept in the connection and sent to the model
+WS_HISTORY_LIMIT = int(os.getenv("WS_HISTORY_LIMIT", "20"))
+
+async def _authenticate_token(token: str) -> Optional[str]:
+    """Resolve a bearer token to a user ID, or None if it is invalid"""
+    if TEST_MODE and token == TEST_TOKEN:
+        return get_test_user().id
+    supabase = get_supabase_client()
+    try:
+        user_response = await asyncio.to_thread(supabase.auth.get_user, token)
+        return user_response.user.id
+    except Exception as e:
+        logger.info(f"WebSocket authentication failed: {e}")
+        return None
+
+async def _fetch_profile(user_id: str) -> Optional[Dict[str, Any]]:
+    supabase = get_supabase_client()
+    try:
+        profile_response = await asyncio.to_thread(
+            lambda: supabase.table("profiles").select("*").eq("id", user_id).execute()
+        )
+        return profile_response.data[0] if profile_response.data else None
+    except Exception as e:
+        logger.error(f"Error fetching profile: {e}")
+        return None
+
+class ChatSession:
+    """
+    State for one WebSocket chat connection
+
+    The user and profile are resolved once when the socket authenticates, and the
+    conversation history lives here instead of being re-sent with every message.
+    Outgoing frames go through a bounded queue drained by a single sender task, so a
+    slow client makes the streaming turn wait rather than buffering without limit.
+    """
+    def __init__(self, websocket: WebSocket, user_id: str, profile: Optional[Dict[str, Any]], conversation_id: str):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.profile = profile
+        self.conversation_id = conversation_id
+        self.history: List[Dict[str, Any]] = []
+        self.outbox: asyncio.Queue = asyncio.Queue(maxsize=WS_SEND_QUEUE)
+        self.last_seen = time.monotonic()
+        self.turn: Optional[asyncio.Task] = None
+
+    async def send(self, frame: Union[Dict[str, Any], str]) -> None:
+        """Queue a frame (or already serialized JSON), waiting while the client is behind"""
+        await self.outbox.put(frame)
+
+    def send_nowait(self, frame: Dict[str, Any]) -> None:
+        """Queue a control frame, dropping it if the client is already behind"""
+        try:
+            self.outbox.put_nowait(frame)
+        except asyncio.QueueFull:
+            pass
+
+    async def sender(self) -> None:
+        """Write queued frames to the socket, merging runs of token frames"""
+        held = None
+        while True:
+            frame = held or await self.outbox.get()
+            held = None
+            if isinstance(frame, str):
+                # Notifications arrive already serialized, once for all recipients
+                await self.websocket.send_text(frame)
+                continue
+            if frame["type"] == "token":
+                # A client that fell behind gets fewer, larger token frames
+                while not self.outbox.empty():
+                    following = self.outbox.get_nowait()
+                    if isinstance(following, str) or following["type"] != "token":
+                        held = following
+                        break
+                    frame = {"type": "token", "delta": frame["delta"] + following["delta"]}
+            await self.websocket.send_text(dumps(frame).decode("utf-8"))
+
+    async def notifications(self) -> None:
+        """Forward pub/sub notifications for this user and their primary artist"""
+        topics = [f"user:{self.user_id}"]
+        if self.profile and self.profile.get("primary_artist_id"):
+            topics.append(f"artist:{self.profile['primary_artist_id']}")
+        subscription = get_pubsub().subscribe(topics, policy=COALESCE)
+        try:
+            async for payload in subscription:
+                await self.send(payload)
+        finally:
+            subscription.close()
+
+    async def heartbeat(self) -> None:
+        """Ping idle clients and close connections that stopped answering"""
+        while True:
+            await asyncio.sleep(WS_HEARTBEAT_INTERVAL)
+            if time.monotonic() - self.last_seen > WS_IDLE_TIMEOUT:
+                logger.info(f"Closing idle chat connection for user: {self.user_id}")
+                await self.websocket.close(code=1001)
+                return
+            self.send_nowait({"type": "ping"})
+
+    async def run_turn(self, message: str) -> None:
+        """Stream one response, then send its component frames and a done frame"""
+        # A cache hit after the first turn; rebuilt only once the digest expires
+        taste_digest = await get_taste_digests().load(self.user_id, self.profile)
+        stream = LLMStream(message=message, user_profile=self.profile, conversation_history=self.history, taste_digest=taste_digest)
+        async for delta in stream:
+            await self.send({"type": "token", "delta": delta})
+
+        llm_response = stream.response
+        if llm_response.sideboard_content:
+            await self.send({"type": "sideboard_content", "data": llm_response.sideboard_content})
+        if llm_response.component_trigger:
+            await self.send({"type": "component_trigger", "data": llm_response.component_trigger})
+        await self.send({
+            "type": "done",
+            "message": llm_response.message,
+            "suggested_actions": llm_response.suggested_actions,
+            "context_modules": llm_response.context_modules
+        })
+
+        # The welcome trigger is not part of the conversation
+        if message != "start_conversation":
+            self.history.extend([
+                {"sender": "user", "content": message},
+                {"sender": "ai", "content": llm_response.message}
+            ])
+            del self.history[:-WS_HISTORY_LIMIT]
+            _enqueue_turn(self.user_id, self.conversation_id, message, llm_response)
+
+@router.websocket("/ws")
+async def chat_websocket(websocket: WebSocket):
+    """
+    Persistent chat channel, authenticated once per connection
+
+    All frames are JSON text. The first client frame must authenticate:
+        {"type": "auth", "token": "<access token>", "conversation_id": "<optional>"}
+    Then the client sends:
+        {"type": "message", "content": "..."}   a chat turn
+        {"type": "init"}                        the welcome message
+        {"type": "ping"} / {"type": "pong"}     keepalive; answer server pings with pong
+    and the server sends:
+        {"type": "ready", "user_id": ..., "conversation_id": ...}
+        {"type": "token", "delta": "..."}       response text as it is generated
+        {"type": "sideboard_content", "data": {...}}
+        {"type": "component_trigger", "data": {...}}
+        {"type": "done", "message": "...", "suggested_actions": [...], "context_modules": [...]}
+        {"type": "notification", "topic": "artist:<id>", "event": {...}}
+        {"type": "ping"}, {"type": "pong"}, {"type": "error", "detail": "..."}
+    """
+    await websocket.accept()
+
+    try:
+        auth = await asyncio.wait_for(websocket.receive_json(), WS_AUTH_TIMEOUT)
+    except (asyncio.TimeoutError, ValueError, WebSocketDisconnect):
+        await websocket.close(code=1008)
+        return
+    user_id = None
+    if isinstance(auth, dict) and auth.get("type") == "auth" and auth.get("token"):
+        user_id = await _authenticate_token(auth["token"])
+    if not user_id:
+        await websocket.close(code=1008, reason="Authentication required for chat")
+        return
+    bind_user(user_id)
+
+    profile = await _fetch_profile(user_id)
+    session = ChatSession(websocket, user_id, profile, auth.get("conversation_id") or str(uuid.uuid4()))
+    logger.info(f"Chat connection opened for user: {user_id}, conversation_id: {session.conversation_id}")
+
+    tasks = [
+        asyncio.create_task(session.sender()),
+        asyncio.create_task(session.heartbeat()),
+        asyncio.create_task(session.notifications())
+    ]
+    session.send_nowait({"type": "ready", "user_id": user_id, "conversation_id": session.conversation_id})
+    try:
+        while True:
+            try:
+                frame = await websocket.receive_json()
+            except ValueError:
+                session.send_nowait({"type": "error", "detail": "Frames must be JSON objects"})
+                continue
+            session.last_seen = time.monotonic()
+            kind = frame.get("type") if isinstance(frame, dict) else None
+
+            if kind == "ping":
+                session.send_nowait({"type": "pong"})
+            elif kind == "pong":
+                continue
+            elif kind in ("message", "init"):
+                message = "start_conversation" if kind == "init" else str(frame.get("content") or "").strip()
+                if not message:
+                    session.send_nowait({"type": "error", "detail": "Message content is required"})
+                elif session.turn is not None and not session.turn.done():
+                    session.send_nowait({"type": "error", "detail": "A response is still streaming"})
+                else:
+                    allowed, retry_after = await take_token(websocket.url.path, f"user:{user_id}")
+                    if allowed:
+                        session.turn = asyncio.create_task(session.run_turn(message))
+                    else:
+                        session.send_nowait({"type": "error", "detail": "Too many requests", "retry_after": round(retry_after, 1)})
+            else:
+                session.send_nowait({"type": "error", "detail": f"Unknown frame type: {kind}"})
+    except WebSocketDisconnect:
+        pass
+    finally:
+        if session.turn is not None:
+            tasks.append(session.turn)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        logger.info(f"Chat connection closed for user: {user_id}")
@@ -0,0 +1,55 @@
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from utils.profiling import PROFILE_SESSION_MAX_SECONDS, check_token, get_profiler
+from utils.serialization import FastJSONResponse
+import logging
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Only included when PROFILING_TOKEN is set
+async def require_profiling_token(request: Request):
+    token = request.headers.get("X-Profile-Token") or request.query_params.get("_profile_token")
+    if not check_token(token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+# Initialize router
+router = APIRouter(
+    prefix="/debug",
+    tags=["debug"],
+    dependencies=[Depends(require_profiling_token)],
+    responses={404: {"description": "Not found"}},
+)
+
+@router.post("/profile", response_model=dict)
+async def start_profile_session(
+    seconds: float = Query(30, gt=0, le=PROFILE_SESSION_MAX_SECONDS),
+    interval_ms: float = Query(5, ge=0.5, le=100)
+):
+    """
+    Sample every request on the worker that receives this for a number of seconds
+    """
+    profiler = get_profiler()
+    if profiler.busy:
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker")
+    profile_id = profiler.start_session(seconds, interval_ms / 1000)
+    logger.info(f"Started {seconds:g}s profiling session {profile_id}")
+    return {"id": profile_id, "seconds": seconds}
+
+@router.get("/profiles", response_model=list)
+async def list_profiles():
+    """
+    List this worker's recent profiles
+    """
+    return get_profiler().store.list()
+
+@router.get("/profiles/{profile_id}")
+async def get_profile(profile_id: str):
+    """
+    Download a profile (speedscope JSON for sample and session profiles)
+    """
+    entry = get_profiler().store.get(profile_id)
+    if entry is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if entry["status"] != "done":
+        return FastJSONResponse({"id": profile_id, "status": entry["status"]}, status_code=202)
+    return FastJSONResponse(entry["profile"], headers={"Content-Disposition": f'attachment; filename="{profile_id}.json"'})
@@ -1,9 +1,22 @@
-from fastapi import APIRouter, HTTPException, Depends, Request
-from models.obsessions import Artist, Album, Song, MusicSearch, MusicSearchResult, UserArtist
+from fastapi import APIRouter, HTTPException, Depends, Query, Request
+from models.obsessions import Artist, Album, Song, MusicSearch, MusicSearchResult, UserArtist, ArtistDiscography
 from models.curations import CurationItem, CurationSubmission, CurationResponse
 from utils.supabase_client import get_supabase_client
+from utils.http_cache import ValidatorCache, conditional_response, PRIVATE_CACHE_CONTROL
+from utils.serialization import FastJSONResponse
+from utils.projections import ArtistRow, AlbumRow, TrackRow, CurationRow, columns, project, pick, discography_columns
+from utils.analytics import track
+from utils.jobs import enqueue_job, register_job
+from utils.pubsub import get_pubsub
+from utils.write_buffer import WriteBuffer
+from utils.taste_digest import get_taste_digests
+from utils.change_feed import get_change_feed
+from utils.search_index import KINDS, SEARCH_INDEX_ENABLED, get_catalog_search
+from utils.comment_similarity import COMMENT_SIMILARITY_ENABLED, get_comment_similarity
+from utils.read_replicas import bind_user
 import logging
-from typing import List
+import uuid
+from typing import Any, Dict, List
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -15,8 +28,91 @@ router = APIRouter(
     responses={404: {"description": "Not found"}},
 )
 
-# Get Supabase client
-supabase = get_supabase_client()
+# Validator caches for shared catalog responses
+albums_cache = ValidatorCache("artist_albums")
+tracks_cache = ValidatorCache("album_tracks")
+discography_cache = ValidatorCache("discography")
+
+# Drop exactly the cached responses a catalog change affects, in every worker
+def _on_artists_changed(rows: List[Dict[str, Any]]):
+    for row in rows:
+        discography_cache.invalidate(row["id"])
+
+def _on_albums_changed(rows: List[Dict[str, Any]]):
+    for row in rows:
+        albums_cache.invalidate(row["artist_id"])
+        discography_cache.invalidate(row["artist_id"])
+
+def _on_songs_changed(rows: List[Dict[str, Any]]):
+    for row in rows:
+        tracks_cache.invalidate(row["album_id"])
+        if row.get("albums"):
+            discography_cache.invalidate(row["albums"]["artist_id"])
+
+get_change_feed().subscribe("artists", _on_artists_changed)
+get_change_feed().subscribe("albums", _on_albums_changed, columns="artist_id")
+get_change_feed().subscribe("songs", _on_songs_changed, columns="album_id, albums(artist_id)")
+
+def _notify_curations(curations: List[Dict[str, Any]]):
+    """Background job: announce curations to everyone following each item's artist"""
+    supabase = get_supabase_client()
+    album_ids = {c["item_id"] for c in curations if c["item_type"] == "album"}
+    song_ids = [c["item_id"] for c in curations if c["item_type"] == "song"]
+
+    song_albums = {}
+    if song_ids:
+        response = supabase.table("songs").select("id, album_id").in_("id", song_ids).execute()
+        song_albums = {row["id"]: row["album_id"] for row in response.data}
+        album_ids.update(song_albums.values())
+    album_artists = {}
+    if album_ids:
+        response = supabase.table("albums").select("id, artist_id").in_("id", list(album_ids)).execute()
+        album_artists = {row["id"]: row["artist_id"] for row in response.data}
+
+    pubsub = get_pubsub()
+    for curation in curations:
+        album_id = curation["item_id"] if curation["item_type"] == "album" else song_albums.get(curation["item_id"])
+        artist_id = album_artists.get(album_id)
+        if artist_id:
+            # Keyed per user and item so a burst of re-ratings reaches slow clients as one event
+            pubsub.publish(f"artist:{artist_id}", {"kind": "curation", **curation}, key=f"curation:{curation['user_id']}:{curation['item_id']}")
+
+register_job("notifications.curation", _notify_curations, batch_size=100)
+
+def _index_comments(rows: List[Dict[str, Any]]):
+    """Make curation comments searchable and comparable in this worker"""
+    get_catalog_search().apply("user_curations", rows)
+    get_comment_similarity().apply("user_curations", rows)
+
+def _announce_curations(rows: List[Dict[str, Any]]):
+    """Update cached taste digests and comment indexes, and enqueue notifications for saved curation rows"""
+    get_taste_digests().apply_curations(rows)
+    _index_comments(rows)
+    for row in rows:
+        enqueue_job("notifications.curation", {
+            "user_id": row["user_id"],
+            "item_id": row["curated_item_id"],
+            "item_type": row["item_type"],
+            "rating": row.get("rating"),
+            "weighted_rank_percentage": row.get("weighted_rank_percentage")
+        })
+
+# Coalesces bursts of re-ratings and slider drags per (user, item, type) into one upsert
+# Unique key of user_curations (database/schema-curations-unique.sql)
+CURATION_KEY = "user_id,curated_item_id,item_type"
+# Namespace for curation ids derived from their key
+CURATION_ID_NAMESPACE = uuid.UUID("6f1c8f5e-3b1d-4c55-9a8e-2d7f0c4b9e21")
+
+curation_buffer = WriteBuffer("user_curations", get_supabase_client, on_flush=_announce_curations, on_conflict=CURATION_KEY)
+
+def _curation_id(user_id: str, item_id: str, item_type: str) -> str:
+    """
+    Id for a new curation, derived from its key
+
+    Workers that both miss an unflushed curation mint the same id, so their upserts
+    merge into one row without rewriting its id.
+    """
+    return str(uuid.uuid5(CURATION_ID_NAMESPACE, f"{user_id}:{item_id}:{item_type}"))
 
 # Helper function to get user ID from auth token
 async def get_user_id(request: Request):
@@ -26,11 +122,15 @@ async def get_user_id(request: Request):
     
     token = auth_header.split(" ")[1]
     
+    supabase = get_supabase_client()
+
     try:
         user_response = supabase.auth.get_user(token)
         if hasattr(user_response, 'error') and user_response.error:
             raise HTTPException(status_code=401, detail="Invalid token")
         
+        # Read-your-writes: this user's reads skip replicas that haven't caught up
+        bind_user(user_response.user.id)
         return user_response.user.id
     except Exception as e:
         logger.error(f"Error getting user ID: {str(e)}")
@@ -39,30 +139,29 @@ async def get_user_id(request: Request):
 @router.post("/search", response_model=MusicSearchResult)
 async def search_music(search: MusicSearch, user_id: str = Depends(get_user_id)):
     """
-    Search for music artists from our database
+    Search for music artists from our database, or albums, songs, artists and comments with mode 'all'
     """
+    if search.mode == "all":
+        return await _search_catalog(search)
+    if search.mode != "artists":
+        raise HTTPException(status_code=400, detail="Invalid search mode. Must be 'artists' or 'all'")
+
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Searching for artists with query: {search.query}")
         
         # Search for artists in our database
         search_query = f"%{search.query}%"
-        artists_response = supabase.table("artists").select("*").ilike("name", search_query).limit(10).execute()
+        artists_response = supabase.table("artists").select(columns(ArtistRow)).ilike("name", search_query).limit(10).execute()
         
         if hasattr(artists_response, 'error') and artists_response.error:
             logger.error(f"Database error: {artists_response.error}")
             raise HTTPException(status_code=500, detail="Database error")
         
-        # Format the response
-        artists = []
-        for artist in artists_response.data:
-            artists.append({
-                "id": artist["id"],
-                "name": artist["name"],
-                "genre": artist.get("genre", ""),
-                "image_url": artist.get("image_url", "")
-            })
-        
-        return MusicSearchResult(items=artists)
+        # Rows come straight from our database, so skip MusicSearchResult re-validation
+        artists = project(ArtistRow, artists_response.data)
+        return FastJSONResponse({"items": artists})
         
     except HTTPException:
         raise
@@ -70,32 +169,46 @@ async def search_music(search: MusicSearch, user_id: str = Depends(get_user_id))
         logger.error(f"Error searching for music: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Search failed: {str(e)}")
 
+async def _search_catalog(search: MusicSearch):
+    """Ranked full-text search over the in-process index"""
+    if not SEARCH_INDEX_ENABLED:
+        raise HTTPException(status_code=503, detail="Catalog search is disabled")
+    if search.types and not set(search.types) <= set(KINDS):
+        raise HTTPException(status_code=400, detail=f"Invalid search types. Must be among {', '.join(KINDS)}")
+
+    try:
+        results = await get_catalog_search().search(search.query, search.types, search.limit)
+    except RuntimeError as e:
+        logger.error(f"Error searching catalog: {str(e)}")
+        raise HTTPException(status_code=503, detail="Search is temporarily unavailable")
+    return FastJSONResponse({"items": results})
+
 @router.get("/artists/{artist_id}/albums", response_model=List[dict])
-async def get_artist_albums(artist_id: str, user_id: str = Depends(get_user_id)):
+async def get_artist_albums(artist_id: str, request: Request, user_id: str = Depends(get_user_id)):
     """
     Get albums for a specific artist from our database
     """
+    supabase = get_supabase_client()
+
     try:
+        cached = albums_cache.get(artist_id)
+        if cached:
+            return conditional_response(request, cached=cached)
+
         logger.info(f"Getting albums for artist: {artist_id}")
         
         # Get albums from our database
-        albums_response = supabase.table("albums").select("*").eq("artist_id", artist_id).execute()
+        albums_response = supabase.table("albums").select(columns(AlbumRow)).eq("artist_id", artist_id).execute()
         
         if hasattr(albums_response, 'error') and albums_response.error:
             logger.error(f"Database error: {albums_response.error}")
             raise HTTPException(status_code=500, detail="Database error")
         
-        # Format the response
-        albums = []
-        for album in albums_response.data:
-            albums.append({
-                "id": album["id"],
-                "title": album["title"],
-                "release_year": album.get("release_year"),
-                "image_url": album.get("image_url", "")
-            })
-        
-        return albums
+        albums = project(AlbumRow, albums_response.data)
+        if not albums:
+            # Unknown ids must not fill the cache
+            return conditional_response(request, albums)
+        return conditional_response(request, cached=albums_cache.set(artist_id, albums))
         
     except HTTPException:
         raise
@@ -104,31 +217,31 @@ async def get_artist_albums(artist_id: str, user_id: str = Depends(get_user_id))
         raise HTTPException(status_code=500, detail=f"Failed to get albums: {str(e)}")
 
 @router.get("/albums/{album_id}/tracks", response_model=List[dict])
-async def get_album_tracks(album_id: str, user_id: str = Depends(get_user_id)):
+async def get_album_tracks(album_id: str, request: Request, user_id: str = Depends(get_user_id)):
     """
     Get tracks for a specific album from our database
     """
+    supabase = get_supabase_client()
+
     try:
+        cached = tracks_cache.get(album_id)
+        if cached:
+            return conditional_response(request, cached=cached)
+
         logger.info(f"Getting tracks for album: {album_id}")
         
         # Get tracks from our database
-        tracks_response = supabase.table("songs").select("*").eq("album_id", album_id).order("track_number").execute()
+        tracks_response = supabase.table("songs").select(columns(TrackRow)).eq("album_id", album_id).order("track_number").execute()
         
         if hasattr(tracks_response, 'error') and tracks_response.error:
             logger.error(f"Database error: {tracks_response.error}")
             raise HTTPException(status_code=500, detail="Database error")
         
-        # Format the response
-        tracks = []
-        for track in tracks_response.data:
-            tracks.append({
-                "id": track["id"],
-                "title": track["title"],
-                "duration": track.get("duration"),
-                "track_number": track.get("track_number")
-            })
-        
-        return tracks
+        tracks = project(TrackRow, tracks_response.data)
+        if not tracks:
+            # Unknown ids must not fill the cache
+            return conditional_response(request, tracks)
+        return conditional_response(request, cached=tracks_cache.set(album_id, tracks))
         
     except HTTPException:
         raise
@@ -136,11 +249,56 @@ async def get_album_tracks(album_id: str, user_id: str = Depends(get_user_id)):
         logger.error(f"Error getting album tracks: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get tracks: {str(e)}")
 
+def _build_discography(artist: Dict[str, Any]) -> Dict[str, Any]:
+    """Order an embedded discography row in place; it is already in the API shape"""
+    albums = artist.get("albums") or []
+    for album in albums:
+        album["tracks"].sort(key=lambda track: (track["track_number"] is None, track["track_number"] or 0))
+    albums.sort(key=lambda album: (album["release_year"] is None, album["release_year"] or 0))
+    artist["albums"] = albums
+    return artist
+
+@router.get("/artists/{artist_id}/discography", response_model=ArtistDiscography)
+async def get_artist_discography(artist_id: str, request: Request, user_id: str = Depends(get_user_id)):
+    """
+    Get an artist with all albums and tracks in a single round trip
+    """
+    supabase = get_supabase_client()
+
+    try:
+        # Serve unchanged discographies from the validator cache without touching the database
+        cached = discography_cache.get(artist_id)
+        if cached:
+            return conditional_response(request, cached=cached)
+
+        logger.info(f"Getting discography for artist: {artist_id}")
+
+        # One embedded query: artist -> albums -> songs
+        artist_response = supabase.table("artists").select(discography_columns()).eq("id", artist_id).execute()
+
+        if hasattr(artist_response, 'error') and artist_response.error:
+            logger.error(f"Database error: {artist_response.error}")
+            raise HTTPException(status_code=500, detail="Database error")
+
+        if not artist_response.data:
+            raise HTTPException(status_code=404, detail="Artist not found")
+
+        payload = _build_discography(artist_response.data[0])
+        return conditional_response(request, cached=discography_cache.set(artist_id, payload))
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting artist discography: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get discography: {str(e)}")
+
 @router.post("/set-primary-artist", response_model=dict)
 async def set_primary_artist(user_artist: UserArtist, user_id: str = Depends(get_user_id)):
     """
     Set a user's primary artist obsession
     """
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Setting primary artist for user: {user_id}")
         
@@ -158,6 +316,9 @@ async def set_primary_artist(user_artist: UserArtist, user_id: str = Depends(get
             logger.error(f"Error updating profile: {profile_response.error}")
             raise HTTPException(status_code=500, detail="Error updating profile")
         
+        # The digest names the primary artist; rebuild it on the next chat turn
+        get_taste_digests().invalidate(user_id)
+        
         return {"message": "Primary artist set successfully"}
         
     except HTTPException:
@@ -171,6 +332,8 @@ async def curate_item(curation: CurationSubmission, user_id: str = Depends(get_u
     """
     Create or update a curation for an album or song
     """
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Creating curation for user: {user_id}, item: {curation.item_id}, type: {curation.item_type}")
         
@@ -178,12 +341,17 @@ async def curate_item(curation: CurationSubmission, user_id: str = Depends(get_u
         if curation.item_type not in ["album", "song"]:
             raise HTTPException(status_code=400, detail="Invalid item type. Must be 'album' or 'song'")
         
-        # Check if curation already exists
-        existing_curation = supabase.table("user_curations").select("*").eq("user_id", user_id).eq("curated_item_id", curation.item_id).eq("item_type", curation.item_type).execute()
-        
-        if hasattr(existing_curation, 'error') and existing_curation.error:
-            logger.error(f"Error checking existing curation: {existing_curation.error}")
-            raise HTTPException(status_code=500, detail="Error checking existing curation")
+        # A curation still waiting in the write buffer needs no lookup
+        key = (user_id, curation.item_id, curation.item_type)
+        queued = curation_buffer.get(key) if curation_buffer.enabled else None
+        existing_curation = None
+        if queued is None:
+            # Check if curation already exists
+            existing_curation = supabase.table("user_curations").select("id").eq("user_id", user_id).eq("curated_item_id", curation.item_id).eq("item_type", curation.item_type).execute()
+            
+            if hasattr(existing_curation, 'error') and existing_curation.error:
+                logger.error(f"Error checking existing curation: {existing_curation.error}")
+                raise HTTPException(status_code=500, detail="Error checking existing curation")
         
         curation_data = {
             "user_id": user_id,
@@ -195,21 +363,40 @@ async def curate_item(curation: CurationSubmission, user_id: str = Depends(get_u
             "updated_at": "now()"
         }
         
-        if existing_curation.data:
-            # Update existing curation
-            curation_id = existing_curation.data[0]["id"]
-            response = supabase.table("user_curations").update(curation_data).eq("id", curation_id).execute()
-            message = "Curation updated successfully"
+        if curation_buffer.enabled:
+            # Write behind: the latest value per key is upserted when the buffer flushes
+            if queued is not None:
+                curation_id = queued["id"]
+                message = "Curation updated successfully"
+            elif existing_curation.data:
+                curation_id = existing_curation.data[0]["id"]
+                message = "Curation updated successfully"
+            else:
+                curation_id = _curation_id(user_id, curation.item_id, curation.item_type)
+                message = "Curation created successfully"
+            row = {"id": curation_id, **curation_data}
+            curation_buffer.put(key, row)
+            # Searchable right away in this worker, like the overlay in get_user_curations
+            _index_comments([row])
         else:
-            # Create new curation
-            response = supabase.table("user_curations").insert(curation_data).execute()
-            message = "Curation created successfully"
-        
-        if hasattr(response, 'error') and response.error:
-            logger.error(f"Error saving curation: {response.error}")
-            raise HTTPException(status_code=500, detail="Error saving curation")
-        
-        curation_id = response.data[0]["id"]
+            if existing_curation.data:
+                # Update existing curation
+                curation_id = existing_curation.data[0]["id"]
+                response = supabase.table("user_curations").update(curation_data).eq("id", curation_id).execute()
+                message = "Curation updated successfully"
+            else:
+                # Create new curation, merging with one another worker created meanwhile
+                response = supabase.table("user_curations").upsert(curation_data, on_conflict=CURATION_KEY).execute()
+                message = "Curation created successfully"
+            
+            if hasattr(response, 'error') and response.error:
+                logger.error(f"Error saving curation: {response.error}")
+                raise HTTPException(status_code=500, detail="Error saving curation")
+            
+            curation_id = response.data[0]["id"]
+            _announce_curations(response.data)
+        
+        track("curation_saved", user_id=user_id, item_id=curation.item_id, item_type=curation.item_type, rating=curation.rating)
         
         return CurationResponse(
             id=curation_id,
@@ -232,23 +419,79 @@ async def curate_item(curation: CurationSubmission, user_id: str = Depends(get_u
         raise HTTPException(status_code=500, detail=f"Failed to create curation: {str(e)}")
 
 @router.get("/curations", response_model=List[CurationItem])
-async def get_user_curations(user_id: str = Depends(get_user_id)):
+async def get_user_curations(request: Request, user_id: str = Depends(get_user_id)):
     """
     Get all curations for the authenticated user
     """
+    supabase = get_supabase_client()
+
     try:
         logger.info(f"Getting curations for user: {user_id}")
         
-        response = supabase.table("user_curations").select("*").eq("user_id", user_id).execute()
+        response = supabase.table("user_curations").select(columns(CurationRow)).eq("user_id", user_id).execute()
         
         if hasattr(response, 'error') and response.error:
             logger.error(f"Error getting curations: {response.error}")
             raise HTTPException(status_code=500, detail="Error getting curations")
         
-        return [CurationItem(**curation) for curation in response.data]
+        rows = response.data
+        queued = curation_buffer.rows(lambda row: row["user_id"] == user_id) if curation_buffer.enabled else []
+        if queued:
+            # Read-your-writes: overlay curations still waiting in the write buffer
+            merged = {row["id"]: row for row in rows}
+            for row in queued:
+                merged[row["id"]] = pick(CurationRow, row)
+            rows = list(merged.values())
+        
+        # Trusted rows: serialize the projection without re-validating each one
+        curations = project(CurationRow, rows)
+        return conditional_response(request, curations, cache_control=PRIVATE_CACHE_CONTROL, private=True)
         
     except HTTPException:
         raise
     except Exception as e:
         logger.error(f"Error getting curations: {str(e)}")
         raise HTTPException(status_code=500, detail=f"Failed to get curations: {str(e)}")
+
+@router.get("/curations/{curation_id}/similar", response_model=List[dict])
+async def get_similar_comments(
+    curation_id: str,
+    scope: str = "item",
+    limit: int = Query(10, ge=1, le=50),
+    user_id: str = Depends(get_user_id)
+):
+    """
+    Get other users' comments similar to a curation's comment, on the same item or any item
+    """
+    if scope not in ("item", "global"):
+        raise HTTPException(status_code=400, detail="Invalid scope. Must be 'item' or 'global'")
+    if not COMMENT_SIMILARITY_ENABLED:
+        raise HTTPException(status_code=503, detail="Comment similarity is disabled")
+
+    try:
+        index = await get_comment_similarity().get()
+    except RuntimeError as e:
+        logger.error(f"Error loading comment similarity: {str(e)}")
+        raise HTTPException(status_code=503, detail="Comment similarity is temporarily unavailable")
+
+    matches = index.similar(curation_id, same_item=scope == "item", limit=limit)
+    if matches is None:
+        raise HTTPException(status_code=404, detail="Curation not found or has no comment")
+
+    try:
+        if matches:
+            supabase = get_supabase_client()
+            response = supabase.table("profiles").select("id, username").in_("id", list({m["user_id"] for m in matches})).execute()
+            if hasattr(response, 'error') and response.error:
+                logger.error(f"Error getting profiles: {response.error}")
+                raise HTTPException(status_code=500, detail="Error getting profiles")
+            usernames = {row["id"]: row["username"] for row in response.data}
+            for match in matches:
+                match["username"] = usernames.get(match["user_id"])
+        return FastJSONResponse(matches)
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        logger.error(f"Error getting similar comments: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Failed to get similar comments: {str(e)}")
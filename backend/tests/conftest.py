@@ -0,0 +1,65 @@
+"""
+Shared fixtures for the backend tests
+The app runs against the in-memory Supabase stand-in in TEST_MODE, seeded once per
+session with a small synthetic workload.
+
+Run from backend/:
+    python -m pytest -q tests
+"""
+import os
+import sys
+
+# Configure the app before anything imports it
+os.environ.setdefault("SUPABASE_BACKEND", "memory")
+os.environ.setdefault("TEST_MODE", "true")
+os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import logging
+
+import pytest
+from fastapi.testclient import TestClient
+
+logging.disable(logging.INFO)
+
+@pytest.fixture(scope="session")
+def workload():
+    from benchmarks.workload import WorkloadConfig, generate
+    from utils.memory_supabase import get_memory_client
+
+    return generate(get_memory_client(), WorkloadConfig(artists=10, users=20))
+
+@pytest.fixture(scope="session")
+def app():
+    from main import app
+
+    return app
+
+@pytest.fixture
+def client(app, workload):
+    """Client without the lifespan, so no background tasks run between assertions"""
+    return TestClient(app)
+
+@pytest.fixture
+def auth(workload):
+    return {"Authorization": f"Bearer {workload.tokens[0]}"}
+
+@pytest.fixture
+def stub(monkeypatch):
+    """Start an LLM stub server and point utils.llm at it; yields a function to start one"""
+    import utils.llm as llm
+    from benchmarks.llm_stub import StubConfig, StubServer
+
+    servers = []
+
+    def start(**config):
+        server = StubServer(StubConfig(**{"ttft_ms": 50, "tokens_per_second": 500, "completion_tokens": 10, **config})).start()
+        servers.append(server)
+        monkeypatch.setattr(llm, "OPENAI_BASE_URL", server.base_url)
+        monkeypatch.setattr(llm, "_openai_client", None)
+        monkeypatch.setattr(llm, "_async_openai_client", None)
+        return server
+
+    yield start
+    for server in servers:
+        server.stop()
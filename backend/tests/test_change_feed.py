@@ -0,0 +1,49 @@
+"""Tests for change feed paging"""
+import asyncio
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+
+from utils.change_feed import ChangeFeed
+from utils.memory_supabase import MemorySupabaseClient
+
+def test_rows_sharing_a_timestamp_span_pages():
+    client = MemorySupabaseClient()
+    table = client.get_table("artists")
+    start = datetime.now(timezone.utc)
+    # More rows on one timestamp than fit in a batch, with later rows after them
+    shared = (start + timedelta(seconds=1)).isoformat()
+    for i in range(7):
+        table.insert({"id": str(uuid.uuid4()), "name": f"a{i}", "updated_at": shared})
+    for i in range(2):
+        table.insert({"id": str(uuid.uuid4()), "name": f"b{i}", "updated_at": (start + timedelta(seconds=2 + i)).isoformat()})
+
+    feed = ChangeFeed(client_factory=lambda: client, lookback=0, batch=3)
+    seen = []
+    feed.subscribe("artists", seen.extend, columns="name")
+    feed._feeds["artists"].watermark = start
+
+    assert asyncio.run(feed.poll()) == 9
+    assert sorted(row["name"] for row in seen) == [f"a{i}" for i in range(7)] + ["b0", "b1"]
+    # Nothing is delivered twice on the next poll
+    assert asyncio.run(feed.poll()) == 0
+
+def test_late_row_behind_the_watermark_is_picked_up():
+    client = MemorySupabaseClient()
+    table = client.get_table("artists")
+    start = datetime.now(timezone.utc)
+    table.insert({"id": str(uuid.uuid4()), "name": "first", "updated_at": start.isoformat()})
+
+    feed = ChangeFeed(client_factory=lambda: client, lookback=0.2, batch=10)
+    seen = []
+    feed.subscribe("artists", seen.extend, columns="name")
+    feed._feeds["artists"].watermark = start - timedelta(seconds=1)
+    assert asyncio.run(feed.poll()) == 1
+
+    # Longer than the lookback after the watermark last moved, a transaction commits a
+    # row stamped just before it
+    time.sleep(0.3)
+    table.insert({"id": str(uuid.uuid4()), "name": "late", "updated_at": (start - timedelta(seconds=0.1)).isoformat()})
+    assert asyncio.run(feed.poll()) == 1
+    assert [row["name"] for row in seen] == ["first", "late"]
+    assert asyncio.run(feed.poll()) == 0
@@ -0,0 +1,119 @@
+"""Tests for the chat routes: who a turn is stored and grounded for, and the WebSocket channel"""
+import asyncio
+import json
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+import routes.chat as chat
+
+@pytest.fixture
+def enqueued(monkeypatch):
+    jobs = []
+    monkeypatch.setattr(chat, "enqueue_job", lambda name, payload: jobs.append((name, payload)))
+    return jobs
+
+def test_chat_requires_a_valid_token(client, enqueued):
+    assert client.post("/api/chat/", json={"message": "hi"}).status_code == 401
+    response = client.post("/api/chat/", json={"message": "hi"}, headers={"Authorization": "Bearer forged"})
+    assert response.status_code == 401
+    assert enqueued == []
+
+def test_chat_turn_is_stored_for_the_token_user(client, workload, stub, enqueued, monkeypatch):
+    stub()
+    loaded = []
+    digests = chat.get_taste_digests()
+    original = digests.load
+
+    async def load(user_id, profile):
+        loaded.append(user_id)
+        return await original(user_id, profile)
+
+    monkeypatch.setattr(digests, "load", load)
+    headers = {"Authorization": f"Bearer {workload.tokens[0]}"}
+    # A user_id in the body is not trusted
+    response = client.post("/api/chat/", json={"message": "hi", "user_id": workload.user_ids[1]}, headers=headers)
+    assert response.status_code == 200
+    assert [payload["user_id"] for name, payload in enqueued if name == "chat.persist"] == [workload.user_ids[0]]
+    assert loaded == [workload.user_ids[0]]
+
+def test_chat_init_is_anonymous_without_a_token(client, stub):
+    stub()
+    assert client.post("/api/chat/init", json={"user_id": "someone-else"}).status_code == 200
+
+def authenticate(ws, token):
+    ws.send_json({"type": "auth", "token": token})
+    return ws.receive_json()
+
+def test_websocket_rejects_a_bad_token(client):
+    with client.websocket_connect("/api/chat/ws") as ws:
+        ws.send_json({"type": "auth", "token": "forged"})
+        with pytest.raises(WebSocketDisconnect) as closed:
+            ws.receive_json()
+    assert closed.value.code == 1008
+
+def test_websocket_streams_a_turn(client, workload, stub, enqueued):
+    stub()
+    with client.websocket_connect("/api/chat/ws") as ws:
+        ready = authenticate(ws, workload.tokens[0])
+        assert ready["type"] == "ready"
+        assert ready["user_id"] == workload.user_ids[0]
+
+        ws.send_json({"type": "message", "content": "recommend something"})
+        frames = []
+        while not frames or frames[-1]["type"] != "done":
+            frames.append(ws.receive_json())
+    tokens = [frame["delta"] for frame in frames if frame["type"] == "token"]
+    assert tokens
+    assert "".join(tokens).strip()
+    assert [payload["user_id"] for name, payload in enqueued if name == "chat.persist"] == [workload.user_ids[0]]
+
+def test_websocket_closes_idle_connections(client, workload, monkeypatch):
+    monkeypatch.setattr(chat, "WS_HEARTBEAT_INTERVAL", 0.05)
+    monkeypatch.setattr(chat, "WS_IDLE_TIMEOUT", 0.12)
+    with client.websocket_connect("/api/chat/ws") as ws:
+        assert authenticate(ws, workload.tokens[0])["type"] == "ready"
+        # The client never answers, so after a ping or two the server gives up
+        with pytest.raises(WebSocketDisconnect) as closed:
+            while True:
+                assert ws.receive_json()["type"] == "ping"
+    assert closed.value.code == 1001
+
+class SlowSocket:
+    """Holds every send until released"""
+    def __init__(self):
+        self.sent = []
+        self.released = asyncio.Event()
+
+    async def send_text(self, text):
+        await self.released.wait()
+        self.sent.append(json.loads(text))
+
+def test_session_outbox_applies_backpressure(monkeypatch):
+    monkeypatch.setattr(chat, "WS_SEND_QUEUE", 3)
+
+    async def main():
+        socket = SlowSocket()
+        session = chat.ChatSession(socket, "user", None, "conversation")
+        sender = asyncio.create_task(session.sender())
+        await session.send({"type": "ready"})
+        await asyncio.sleep(0)
+        # The sender is stuck on the first frame; three more fill the queue
+        for delta in "abc":
+            await session.send({"type": "token", "delta": delta})
+        # A streaming turn now waits for the client, and control frames are dropped
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(session.send({"type": "token", "delta": "d"}), 0.05)
+        session.send_nowait({"type": "ping"})
+        assert session.outbox.qsize() == 3
+
+        socket.released.set()
+        await session.send({"type": "done"})
+        while session.outbox.qsize():
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.01)
+        sender.cancel()
+        return socket.sent
+
+    # The queued token frames go out as one merged frame
+    assert asyncio.run(main()) == [{"type": "ready"}, {"type": "token", "delta": "abc"}, {"type": "done"}]
@@ -0,0 +1,14 @@
+"""Startup budget regression test: importing the app must stay fast and lean"""
+import statistics
+
+from benchmarks.cold_start import DEFAULT_BUDGET_MS, DEFERRED_MODULES, profile_import
+
+def test_import_within_budget_and_deferred_modules_not_loaded():
+    totals = []
+    for _ in range(3):
+        total_ms, _, modules = profile_import()
+        totals.append(total_ms)
+        eager = [name for name in DEFERRED_MODULES if name in modules]
+        assert not eager, f"imported at startup: {', '.join(eager)}"
+    median_ms = statistics.median(totals)
+    assert median_ms <= DEFAULT_BUDGET_MS, f"import main took {median_ms:.0f} ms (budget {DEFAULT_BUDGET_MS:.0f} ms)"
@@ -0,0 +1,71 @@
+"""Tests for ETags, conditional GETs and the validator cache"""
+import time
+
+from routes.music import albums_cache, discography_cache
+from utils.http_cache import ValidatorCache
+from utils.memory_supabase import get_memory_client
+
+def test_etag_then_304(client, auth, workload):
+    url = f"/api/music/artists/{workload.artist_ids[0]}/discography"
+    first = client.get(url, headers=auth)
+    assert first.status_code == 200
+    etag = first.headers["ETag"]
+    assert first.headers["Cache-Control"].startswith("public")
+
+    second = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert second.status_code == 304
+    assert second.content == b""
+    assert second.headers["ETag"] == etag
+
+def test_weak_and_listed_etags_match(client, auth, workload):
+    url = f"/api/music/artists/{workload.artist_ids[1]}/albums"
+    etag = client.get(url, headers=auth).headers["ETag"]
+    assert client.get(url, headers={**auth, "If-None-Match": f'"other", W/{etag}'}).status_code == 304
+
+def test_stale_etag_gets_body(client, auth, workload):
+    url = f"/api/music/artists/{workload.artist_ids[0]}/discography"
+    response = client.get(url, headers={**auth, "If-None-Match": '"stale"'})
+    assert response.status_code == 200
+    assert response.json()["id"] == workload.artist_ids[0]
+
+def test_invalidation_changes_etag(client, auth, workload):
+    artist_id = workload.artist_ids[2]
+    url = f"/api/music/artists/{artist_id}/discography"
+    etag = client.get(url, headers=auth).headers["ETag"]
+    get_memory_client().table("artists").update({"name": "Renamed"}).eq("id", artist_id).execute()
+    discography_cache.invalidate(artist_id)
+    response = client.get(url, headers={**auth, "If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["ETag"] != etag
+
+def test_private_curations_vary_by_authorization(client, auth):
+    response = client.get("/api/music/curations", headers=auth)
+    assert response.headers["Cache-Control"] == "private, no-cache"
+    assert "Authorization" in response.headers["Vary"]
+    assert client.get("/api/music/curations", headers={**auth, "If-None-Match": response.headers["ETag"]}).status_code == 304
+
+def test_unknown_ids_are_not_cached(client, auth):
+    before = len(albums_cache)
+    for i in range(20):
+        response = client.get(f"/api/music/artists/made-up-{i}/albums", headers=auth)
+        assert response.status_code == 200
+        assert response.json() == []
+    assert len(albums_cache) == before
+
+def test_cache_evicts_least_recently_used():
+    cache = ValidatorCache("test", ttl=60, max_entries=3)
+    for key in "abc":
+        cache.set(key, [key])
+    assert cache.get("a") is not None
+    cache.set("d", ["d"])
+    assert len(cache) == 3
+    assert cache.get("b") is None
+    assert cache.get("a") is not None
+
+def test_cache_sweeps_expired_entries():
+    cache = ValidatorCache("test", ttl=0.05, max_entries=100)
+    for i in range(10):
+        cache.set(str(i), [i])
+    time.sleep(0.06)
+    cache.set("fresh", [])
+    assert len(cache) == 1
@@ -0,0 +1,67 @@
+"""Tests for the search and comment similarity indexes keyed by interned ids"""
+import uuid
+
+from utils.comment_similarity import CommentSimilarityIndex
+from utils.search_index import SearchIndex
+
+def new_id() -> str:
+    return str(uuid.uuid4())
+
+def test_search_results_carry_uuids():
+    artist, album, song, user, curation = (new_id() for _ in range(5))
+    index = SearchIndex()
+    index.apply("artists", [{"id": artist, "name": "Quartzline"}])
+    index.apply("albums", [{"id": album, "title": "Glass Harbor", "artist_id": artist}])
+    index.apply("songs", [{"id": song, "title": "Lantern Tide", "album_id": album}])
+    index.apply("user_curations", [{
+        "id": curation, "user_id": user, "curated_item_id": song,
+        "item_type": "song", "rating": 4, "comment": "lantern tide glows"
+    }])
+
+    result = index.search("lantern", kinds=["song"])[0]
+    assert result["id"] == song
+    assert result["album_id"] == album
+    assert result["artist_id"] == artist
+    assert result["artist_name"] == "Quartzline"
+
+    comment = index.search("glows", kinds=["comment"])[0]
+    assert comment["id"] == curation
+    assert comment["user_id"] == user
+    assert comment["item_id"] == song
+    assert comment["item_title"] == "Lantern Tide"
+
+def test_search_rename_and_remove():
+    artist, album = new_id(), new_id()
+    index = SearchIndex()
+    index.upsert("artist", artist, "Quartzline")
+    index.upsert("album", album, "Glass Harbor", artist)
+    index.upsert("artist", artist, "Basaltine")
+    assert index.search("basaltine harbor", kinds=["album"])[0]["artist_name"] == "Basaltine"
+
+    index.remove("album", album)
+    assert index.search("harbor", kinds=["album"]) == []
+    # Removing an id that was never indexed is a no-op
+    index.remove("album", new_id())
+
+def test_similarity_results_carry_uuids():
+    item, first, second = new_id(), new_id(), new_id()
+    users = [new_id(), new_id()]
+    index = CommentSimilarityIndex(threshold=0.5)
+    index.apply("user_curations", [
+        {"id": first, "user_id": users[0], "curated_item_id": item, "item_type": "song", "comment": "the bridge at the end is perfect"},
+        {"id": second, "user_id": users[1], "curated_item_id": item, "item_type": "song", "comment": "the bridge at the end is perfect!"},
+    ])
+
+    match = index.similar(first)[0]
+    assert match["curation_id"] == second
+    assert match["user_id"] == users[1]
+    assert match["item_id"] == item
+    assert index.similar(new_id()) is None
+
+    # A row clearing its comment drops it; rows never indexed are skipped
+    index.apply("user_curations", [
+        {"id": second, "user_id": users[1], "curated_item_id": item, "item_type": "song", "comment": None},
+        {"id": new_id(), "user_id": users[1], "curated_item_id": item, "item_type": "song", "comment": None},
+    ])
+    assert index.similar(first) == []
+    assert len(index) == 1
@@ -0,0 +1,19 @@
+"""Tests for UUID interning shared between workers through the ID file"""
+import uuid
+
+from utils.interning import RECORD_SIZE, IdInterner
+
+def test_torn_record_is_replaced(tmp_path):
+    path = str(tmp_path / "users.ids")
+    first = str(uuid.uuid4())
+    assert IdInterner(path).intern(first) == 0
+    # A worker died halfway through appending a record
+    with open(path, "ab") as f:
+        f.write(uuid.uuid4().bytes[:7])
+
+    second = str(uuid.uuid4())
+    assert IdInterner(path).intern_list([first, second]) == [0, 1]
+    with open(path, "rb") as f:
+        assert len(f.read()) == 2 * RECORD_SIZE
+    # A fresh worker reads the same assignments back
+    assert IdInterner(path).lookup_many([0, 1]) == [first, second]
@@ -0,0 +1,99 @@
+"""Tests for job store leases and the queue size across retries and drain"""
+import asyncio
+import sqlite3
+import time
+
+from utils.jobs import Job, JobQueue, SQLiteJobStore, register_job
+
+def test_live_lease_is_not_claimed(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = SQLiteJobStore(path, lease=0.2), SQLiteJobStore(path, lease=0.2)
+    first.add(Job("test.noop", {"n": 1}))
+    assert second.claim() == []
+
+    # The owner died: once its lease runs out exactly one other worker takes the job
+    time.sleep(0.25)
+    claimed = second.claim()
+    assert [job.payload for job in claimed] == [{"n": 1}]
+    assert SQLiteJobStore(path).claim() == []
+
+def test_renew_keeps_jobs_and_release_hands_them_over(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    first, second = SQLiteJobStore(path, lease=0.2), SQLiteJobStore(path, lease=0.2)
+    first.add(Job("test.noop", {"n": 1}))
+    time.sleep(0.15)
+    first.renew()
+    time.sleep(0.1)
+    assert second.claim() == []
+
+    first.release()
+    assert len(second.claim()) == 1
+
+def test_store_from_before_leases_is_claimable(tmp_path):
+    path = str(tmp_path / "jobs.db")
+    db = sqlite3.connect(path)
+    db.execute(
+        "CREATE TABLE jobs (id TEXT PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, "
+        "attempts INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'pending', created_at REAL NOT NULL)"
+    )
+    db.execute("INSERT INTO jobs (id, name, payload, created_at) VALUES ('old', 'test.noop', '{}', 0)")
+    db.commit()
+    db.close()
+    assert [job.id for job in SQLiteJobStore(path).claim()] == ["old"]
+
+def test_retry_after_drain_keeps_size_at_zero(tmp_path, monkeypatch):
+    monkeypatch.setattr("utils.jobs.RETRY_BASE_DELAY", 0.05)
+    calls = []
+
+    def failing(payloads):
+        calls.append(payloads)
+        raise RuntimeError("down")
+
+    register_job("test.failing", failing, max_attempts=3)
+    store = SQLiteJobStore(str(tmp_path / "jobs.db"))
+
+    async def main():
+        queue = JobQueue(workers=1, store=store)
+        await queue.start()
+        queue.enqueue("test.failing", {"n": 1})
+        # The first attempt fails and schedules a retry, which the drain times out on
+        await asyncio.sleep(0.01)
+        assert await queue.drain(timeout=0.01) is False
+        await asyncio.sleep(0.1)
+        return queue
+
+    queue = asyncio.run(main())
+    assert queue.size == 0
+    assert len(calls) == 1
+    # The unfinished job was released for the next worker
+    assert [job.attempts for job in SQLiteJobStore(store.path).claim()] == [1]
+
+def test_enqueue_does_not_wait_for_a_locked_store(tmp_path):
+    ran = []
+    register_job("test.locked", ran.extend)
+    path = str(tmp_path / "jobs.db")
+    store = SQLiteJobStore(path)
+    # Another worker holds the write lock, as during its claim
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+
+    async def main():
+        queue = JobQueue(workers=1, store=store)
+        start = time.perf_counter()
+        queue.enqueue("test.locked", {"n": 1})
+        enqueued_in = time.perf_counter() - start
+        # The loop keeps running while the writer thread waits on the lock
+        ticks = 0
+        while time.perf_counter() - start < 0.3:
+            await asyncio.sleep(0.01)
+            ticks += 1
+        other.execute("COMMIT")
+        assert await queue.drain(timeout=5) is True
+        return enqueued_in, ticks
+
+    enqueued_in, ticks = asyncio.run(main())
+    assert enqueued_in < 0.05
+    assert ticks >= 20
+    # The job ran, and its row was written and deleted once the lock was released
+    assert ran == [{"n": 1}]
+    assert sqlite3.connect(path).execute("SELECT COUNT(*) FROM jobs").fetchone() == (0,)
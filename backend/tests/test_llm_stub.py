@@ -0,0 +1,63 @@
+"""Tests for the real OpenAI client paths against the local stub server"""
+import asyncio
+import time
+
+import httpx
+
+import utils.llm as llm
+
+def test_generate_response_uses_stub(stub):
+    stub()
+    response = llm.generate_response("tell me about albums")
+    assert response.message
+    assert response.message != llm.FALLBACK_MESSAGE
+
+def test_agenerate_response_matches_sync_path(stub):
+    stub()
+    sync = llm.generate_response("same prompt")
+    result = asyncio.run(llm.agenerate_response("same prompt"))
+    assert result.message == sync.message
+
+def test_stream_yields_deltas_and_full_response(stub):
+    stub(completion_tokens=20)
+
+    async def collect():
+        stream = llm.LLMStream("stream this")
+        deltas = [delta async for delta in stream]
+        return deltas, stream.response
+
+    deltas, response = asyncio.run(collect())
+    assert len(deltas) > 1
+    assert "".join(deltas) == response.message
+
+def test_stub_errors_fall_back(stub, monkeypatch):
+    stub(error_rate=1.0)
+    # Skip the SDK's retry backoff
+    monkeypatch.setattr(llm, "_async_openai_client", llm.get_async_openai_client().with_options(max_retries=0))
+    assert asyncio.run(llm.agenerate_response("hello")).message == llm.FALLBACK_MESSAGE
+
+def test_stub_rate_limits_fall_back(stub, monkeypatch):
+    stub(rate_limit_rate=1.0)
+    monkeypatch.setattr(llm, "_openai_client", llm.get_openai_client().with_options(max_retries=0))
+    assert llm.generate_response("hello").message == llm.FALLBACK_MESSAGE
+
+def test_chat_route_does_not_block_the_loop(stub, app, workload):
+    """Concurrent chat requests overlap instead of running one completion at a time"""
+    stub(ttft_ms=300, completion_tokens=5)
+
+    async def run():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test", timeout=30) as client:
+            async def chat(i):
+                response = await client.post("/api/chat/", json={"message": f"hi {i}"}, headers={"Authorization": f"Bearer {workload.tokens[i]}"})
+                assert response.status_code == 200
+                return response.json()["message"]
+
+            start = time.perf_counter()
+            messages = await asyncio.gather(*(chat(i) for i in range(5)))
+            return messages, time.perf_counter() - start
+
+    messages, elapsed = asyncio.run(run())
+    assert all(message != llm.FALLBACK_MESSAGE for message in messages)
+    # Serialized, five completions take at least 1.5s
+    assert elapsed < 1.0
@@ -0,0 +1,40 @@
+"""Tests for failing requests that block the event loop"""
+import asyncio
+import time
+
+import pytest
+
+from utils.loop_monitor import BlockingCallError, BlockingCallMiddleware, LoopLagMonitor
+
+def blocking_app(seconds: float):
+    async def app(scope, receive, send):
+        time.sleep(seconds)
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b""})
+    return app
+
+def serve(seconds: float) -> LoopLagMonitor:
+    """Serve one request that blocks for `seconds` with a 20ms log and 150ms fail threshold"""
+    monitor = LoopLagMonitor(interval=0.005, block_threshold=0.02)
+    middleware = BlockingCallMiddleware(blocking_app(seconds), monitor=monitor, fail_after=0.15)
+
+    async def send(message):
+        pass
+
+    async def main():
+        try:
+            await middleware({"type": "http", "path": "/blocking", "headers": []}, None, send)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(main())
+    return monitor
+
+def test_stall_under_fail_threshold_is_logged_not_raised():
+    monitor = serve(0.05)
+    assert [event.route for event in monitor.events] == ["/blocking"]
+
+def test_stall_over_fail_threshold_raises():
+    with pytest.raises(BlockingCallError) as error:
+        serve(0.2)
+    assert [event.duration >= 0.15 for event in error.value.events] == [True]
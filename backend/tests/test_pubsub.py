@@ -0,0 +1,33 @@
+"""Tests for pub/sub delivery before and after the hub starts"""
+import asyncio
+
+from utils.pubsub import PubSub
+
+def test_unstarted_hub_only_delivers_on_the_loop():
+    hub = PubSub()
+
+    async def main():
+        subscription = hub.subscribe(["user:1"])
+        # A recovered background job publishing from a worker thread
+        await asyncio.to_thread(hub.publish, "user:1", {"n": 1})
+        hub.publish("user:1", {"n": 2})
+        payload = await asyncio.wait_for(subscription.get(), 1)
+        return payload, subscription._queue
+
+    payload, remaining = asyncio.run(main())
+    assert '"n":2' in payload.replace(" ", "")
+    assert not remaining
+
+def test_started_hub_delivers_thread_publishes_on_the_loop():
+    hub = PubSub()
+
+    async def main():
+        await hub.start()
+        subscription = hub.subscribe(["user:1"])
+        await asyncio.to_thread(hub.publish, "user:1", {"n": 1})
+        try:
+            return await asyncio.wait_for(subscription.get(), 1)
+        finally:
+            await hub.stop()
+
+    assert '"n":1' in asyncio.run(main()).replace(" ", "")
@@ -0,0 +1,63 @@
+"""Tests for rate limit keys: validated users, trusted client IPs and the per-IP bucket"""
+import asyncio
+
+from utils.rate_limit import RATE_LIMIT_IP_FACTOR, MemoryBucketStore, RateLimitMiddleware, TokenUsers, _client_ip
+
+RATE, BURST = 0.001, 2
+
+async def ok_app(scope, receive, send):
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+    await send({"type": "http.response.body", "body": b""})
+
+def make_middleware(monkeypatch) -> RateLimitMiddleware:
+    monkeypatch.setattr("utils.rate_limit.RATE_LIMITS", {"/api/limited": (RATE, BURST)})
+    middleware = RateLimitMiddleware(ok_app, store=MemoryBucketStore(), enabled=True, token_users=TokenUsers())
+    # Each request runs in its own event loop, which the lag monitor can't outlive
+    monkeypatch.setattr(middleware.loop_monitor, "start", lambda: None)
+    return middleware
+
+def request(middleware, token=None, forwarded=None, peer="10.0.0.1") -> int:
+    headers = []
+    if token:
+        headers.append((b"authorization", b"Bearer " + token.encode()))
+    if forwarded:
+        headers.append((b"x-forwarded-for", forwarded.encode()))
+    scope = {"type": "http", "path": "/api/limited", "headers": headers, "client": (peer, 1234)}
+    statuses = []
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            statuses.append(message["status"])
+
+    asyncio.run(middleware(scope, None, send))
+    return statuses[0]
+
+def test_client_ip_uses_trusted_hops():
+    scope = {"headers": [(b"x-forwarded-for", b"6.6.6.6, 1.2.3.4"), (b"x-forwarded-for", b"10.1.1.1")], "client": ("10.0.0.1", 1)}
+    assert _client_ip(scope, hops=1) == "10.1.1.1"
+    assert _client_ip(scope, hops=2) == "1.2.3.4"
+    # More hops than entries: every entry was written by a trusted proxy
+    assert _client_ip(scope, hops=5) == "6.6.6.6"
+    assert _client_ip(scope, hops=0) == "10.0.0.1"
+    assert _client_ip({"headers": [], "client": ("10.0.0.2", 1)}) == "10.0.0.2"
+
+def test_forged_forwarded_for_shares_the_ip_bucket(monkeypatch):
+    middleware = make_middleware(monkeypatch)
+    limit = int(BURST * RATE_LIMIT_IP_FACTOR)
+    statuses = [request(middleware, forwarded=f"203.0.113.{i}, 198.51.100.7") for i in range(limit + 1)]
+    assert statuses == [200] * limit + [429]
+
+def test_made_up_tokens_only_get_the_ip_bucket(monkeypatch, workload):
+    middleware = make_middleware(monkeypatch)
+    limit = int(BURST * RATE_LIMIT_IP_FACTOR)
+    statuses = [request(middleware, token=f"forged-{i}") for i in range(limit + 1)]
+    assert statuses == [200] * limit + [429]
+    assert len(middleware.token_users._users) == 0
+
+def test_validated_user_bucket_follows_them_across_ips(monkeypatch, workload):
+    middleware = make_middleware(monkeypatch)
+    token = workload.tokens[0]
+    statuses = [request(middleware, token=token, peer=f"10.0.1.{i}") for i in range(BURST + 1)]
+    assert statuses == [200] * BURST + [429]
+    # Another user on the first user's address still has their own budget
+    assert request(middleware, token=workload.tokens[1], peer="10.0.1.0") == 200
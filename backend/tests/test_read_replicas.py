@@ -0,0 +1,125 @@
+"""Tests for replica read routing and read-your-writes, with fake primary and replica clients"""
+import pytest
+
+from utils.metrics import REPLICA_READS, render_metrics
+from utils.read_replicas import MemoryWatermarkStore, ReadReplicaClient, _request_user, bind_user, parse_lsn
+
+USER = "11111111-1111-1111-1111-111111111111"
+
+class FakeResponse:
+    def __init__(self, data):
+        self.data = data
+        self.error = None
+
+class FakeQuery:
+    def __init__(self, db: "FakeDatabase", table: str):
+        self.db = db
+        self.table = table
+        self.rows = None
+
+    def select(self, *args, **kwargs):
+        return self
+
+    def eq(self, *args, **kwargs):
+        return self
+
+    def insert(self, rows, **kwargs):
+        self.rows = rows if isinstance(rows, list) else [rows]
+        return self
+
+    def execute(self):
+        if self.db.broken:
+            raise ConnectionError(f"{self.db.name} is down")
+        if self.rows is not None:
+            self.db.position += len(self.rows)
+            return FakeResponse(self.rows)
+        self.db.reads += 1
+        return FakeResponse([{"served_by": self.db.name}])
+
+class FakeRpc:
+    def __init__(self, db: "FakeDatabase"):
+        self.db = db
+
+    def execute(self):
+        if self.db.rpc_error is not None:
+            raise self.db.rpc_error
+        return FakeResponse(f"0/{self.db.position:X}")
+
+class FakeDatabase:
+    """Primary or replica: a WAL position, a read counter and failure switches"""
+    def __init__(self, name: str, position: int = 0):
+        self.name = name
+        self.position = position
+        self.reads = 0
+        self.broken = False
+        self.rpc_error = None
+
+    def table(self, name: str) -> FakeQuery:
+        return FakeQuery(self, name)
+
+    def rpc(self, fn: str, params=None) -> FakeRpc:
+        return FakeRpc(self)
+
+class MissingFunction(Exception):
+    code = "PGRST202"
+
+@pytest.fixture
+def databases():
+    primary, replica = FakeDatabase("primary", 100), FakeDatabase("replica", 100)
+    router = ReadReplicaClient(primary, [replica], store=MemoryWatermarkStore(), position_ttl=0)
+    yield router, primary, replica
+    _request_user.set(None)
+
+def write_then_read(router) -> str:
+    bind_user(USER)
+    router.table("user_curations").insert({"user_id": USER, "rating": 5}).execute()
+    bind_user(USER)
+    return router.table("user_curations").select("*").eq("user_id", USER).execute().data[0]["served_by"]
+
+def test_parse_lsn():
+    assert parse_lsn("16/B374D848") == (0x16 << 32) | 0xB374D848
+
+def test_lagging_replica_sends_the_writer_to_the_primary(databases):
+    router, primary, replica = databases
+    before = REPLICA_READS.value("primary", "watermark")
+    assert write_then_read(router) == "primary"
+    assert REPLICA_READS.value("primary", "watermark") == before + 1
+    # Someone who hasn't written still reads from the replica
+    bind_user("22222222-2222-2222-2222-222222222222")
+    assert router.table("songs").select("*").execute().data[0]["served_by"] == "replica"
+
+def test_caught_up_replica_serves_the_writer(databases):
+    router, primary, replica = databases
+    assert write_then_read(router) == "primary"
+    replica.position = primary.position
+    bind_user(USER)
+    assert router.table("user_curations").select("*").execute().data[0]["served_by"] == "replica"
+
+def test_failing_replica_fails_over(databases):
+    router, primary, replica = databases
+    replica.broken = True
+    before = REPLICA_READS.value("primary", "failover")
+    assert router.table("songs").select("*").execute().data[0]["served_by"] == "primary"
+    assert REPLICA_READS.value("primary", "failover") == before + 1
+    # The replica sits out its retry period
+    assert router.table("songs").select("*").execute().data[0]["served_by"] == "primary"
+    assert replica.reads == 0
+
+def test_position_error_pins_the_writer_to_the_primary(databases):
+    router, primary, replica = databases
+    primary.rpc_error = TimeoutError("statement timeout")
+    replica.position = 10 ** 6
+    assert write_then_read(router) == "primary"
+    # Routing stays on for everyone else
+    assert router.replicas
+    bind_user("22222222-2222-2222-2222-222222222222")
+    assert router.table("songs").select("*").execute().data[0]["served_by"] == "replica"
+
+def test_missing_position_function_disables_routing(databases):
+    router, primary, replica = databases
+    primary.rpc_error = MissingFunction("Could not find the function public.wal_lsn without parameters in the schema cache")
+    assert write_then_read(router) == "primary"
+    assert router.replicas == []
+
+def test_replica_reads_are_exported():
+    assert "db_reads_total" in render_metrics()
@@ -0,0 +1,74 @@
+"""Tests for taste digest rendering and keeping cached digests current"""
+import utils.taste_digest as taste_digest
+from utils.taste_digest import TasteDigest, TasteDigestCache, estimate_tokens
+
+def curation(item_id, item_type="song", rating=4, comment=None, user_id="user"):
+    return {
+        "user_id": user_id, "curated_item_id": item_id, "item_type": item_type,
+        "rating": rating, "comment": comment, "weighted_rank_percentage": 50
+    }
+
+def cached_digest(cache, user_id="user", artist_id="artist") -> TasteDigest:
+    digest = TasteDigest(user_id=user_id, artist_id=artist_id, artist_name="Quartzline")
+    digest.apply(("song", "s1"), curation("s1", rating=5, comment="On repeat"), "Lantern Tide")
+    digest.apply(("album", "a1"), curation("a1", item_type="album", rating=3), "Glass Harbor")
+    cache._digests[user_id] = digest
+    return digest
+
+def test_render_keeps_whole_lines_within_the_budget():
+    digest = cached_digest(TasteDigestCache())
+    full = digest.render(budget=1000)
+    assert full.splitlines() == [
+        "Primary artist: Quartzline",
+        "Top albums: Glass Harbor (3/5)",
+        "Top songs: Lantern Tide (5/5)",
+        'Recent comment on Lantern Tide: "On repeat"'
+    ]
+    # Each line costs its tokens plus one for the newline
+    budget = sum(estimate_tokens(line) + 1 for line in full.splitlines()[:2])
+    assert digest.render(budget=budget).splitlines() == full.splitlines()[:2]
+    assert digest.render(budget=budget - 1).splitlines() == full.splitlines()[:1]
+    assert digest.render(budget=0) == ""
+
+def test_known_items_are_updated_in_place(monkeypatch):
+    jobs = []
+    monkeypatch.setattr(taste_digest, "enqueue_job", lambda name, payload: jobs.append((name, payload)))
+    cache = TasteDigestCache()
+    cached_digest(cache)
+    assert "Glass Harbor (3/5)" in cache.get("user")
+
+    cache.apply_curations([
+        curation("a1", item_type="album", rating=5),
+        curation("s2"),
+        curation("s3", user_id="uncached")
+    ])
+    text = cache.get("user")
+    assert "Glass Harbor (5/5)" in text
+    # The album is now the most recent curation
+    assert list(cache._digests["user"].items)[-1] == ("album", "a1")
+    # Only the new item of a cached user needs a title lookup
+    assert [(name, payload["curated_item_id"]) for name, payload in jobs] == [("taste_digest.update", "s2")]
+
+def test_renames_refresh_cached_text():
+    cache = TasteDigestCache()
+    cached_digest(cache)
+    cached_digest(cache, user_id="other", artist_id="another")
+    assert "Lantern Tide" in cache.get("user")
+
+    cache.on_titles_changed("song", [{"id": "s1", "title": "Lantern Tide (Live)"}])
+    # An album with the same id is a different item
+    cache.on_titles_changed("album", [{"id": "s1", "title": "Unrelated"}])
+    assert "Top songs: Lantern Tide (Live) (5/5)" in cache.get("user")
+    assert "Unrelated" not in cache.get("user")
+
+    cache.on_artists_changed([{"id": "artist", "name": "Quartzline & Co"}])
+    assert cache.get("user").startswith("Primary artist: Quartzline & Co")
+    assert cache.get("other").startswith("Primary artist: Quartzline\n")
+
+def test_primary_artist_change_drops_the_digest():
+    cache = TasteDigestCache()
+    cached_digest(cache)
+    cache.on_profiles_changed([{"id": "user", "primary_artist_id": "artist"}])
+    assert cache.get("user") is not None
+    cache.on_profiles_changed([{"id": "user", "primary_artist_id": "another"}])
+    assert cache.get("user") is None
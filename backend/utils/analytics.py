@@ -0,0 +1,28 @@
+"""
+Product analytics events for The Music Besties API
+Events are enqueued as background jobs and written in batches as JSON lines to the
+"analytics" logger, so tracking never adds latency to the request that caused it.
+"""
+import json
+import logging
+import time
+from typing import Any, Dict, List
+
+from utils.jobs import enqueue_job, register_job
+
+analytics_logger = logging.getLogger("analytics")
+
+def _write_events(events: List[Dict[str, Any]]) -> None:
+    analytics_logger.info("\n".join(json.dumps(event, default=str) for event in events))
+
+register_job("analytics.event", _write_events, batch_size=200)
+
+def track(event: str, **properties: Any) -> None:
+    """
+    Record an analytics event after the response
+
+    Args:
+        event: Event name, e.g. "curation_saved"
+        **properties: Event properties
+    """
+    enqueue_job("analytics.event", {"event": event, "ts": time.time(), **properties})
@@ -0,0 +1,211 @@
+"""
+Change feed for cache invalidation in The Music Besties API
+Every worker polls the tables its caches are built from (profiles, the catalog tables
+and user_curations) for rows whose updated_at has moved past the last one it saw, and
+hands the changed rows to the handlers that own caches over those tables. Each worker invalidates its own in-process caches, so a change
+written through any worker (or directly in the database) reaches all of them.
+
+The application only talks to PostgREST, so this polls updated_at watermarks instead of
+holding a LISTEN/NOTIFY or realtime connection. database/schema-change-feed.sql adds the
+updated_at triggers and indexes the catalog tables need; the in-memory Supabase
+stand-in maintains updated_at the same way.
+
+Staleness: a change is picked up at most CHANGE_FEED_INTERVAL plus one poll after it
+commits. The delay between a row's updated_at and its handlers running is exported as
+change_feed_lag_seconds. Deleted rows produce no change; caches over them still expire
+by TTL. With read replicas, polls read from a replica, so a change is seen once it has
+replicated and CHANGE_FEED_LOOKBACK has to cover the replica lag.
+
+Usage:
+    get_change_feed().subscribe("albums", on_albums, columns="artist_id")
+"""
+import asyncio
+import logging
+import os
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from utils.metrics import CHANGE_FEED_LAG, CHANGE_FEED_ROWS
+from utils.supabase_client import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+CHANGE_FEED_ENABLED = os.getenv("CHANGE_FEED_ENABLED", "true").lower() == "true"
+CHANGE_FEED_INTERVAL = float(os.getenv("CHANGE_FEED_INTERVAL", "2"))
+# Re-read this far behind the watermark: updated_at is set when a transaction starts, so
+# a long transaction can commit rows older than ones already seen
+CHANGE_FEED_LOOKBACK = float(os.getenv("CHANGE_FEED_LOOKBACK", "5"))
+CHANGE_FEED_BATCH = int(os.getenv("CHANGE_FEED_BATCH", "500"))
+
+Handler = Callable[[List[Dict[str, Any]]], None]
+
+def _parse_timestamp(value: str) -> datetime:
+    return datetime.fromisoformat(value.replace("Z", "+00:00"))
+
+@dataclass
+class _TableFeed:
+    """Watermark and subscribers for one table"""
+    table: str
+    columns: List[str] = field(default_factory=lambda: ["id", "updated_at"])
+    handlers: List[Handler] = field(default_factory=list)
+    watermark: Optional[datetime] = None
+    # (id, updated_at) already delivered inside the lookback window
+    seen: Dict[Tuple[str, str], datetime] = field(default_factory=dict)
+
+class ChangeFeed:
+    """
+    Polls updated_at watermarks and dispatches changed rows to subscribers
+
+    Args:
+        client_factory: Returns the Supabase client to poll with
+        interval: Seconds between polls
+        lookback: Seconds re-read behind the watermark on every poll
+        batch: Maximum rows read per table per poll
+    """
+    def __init__(
+        self,
+        client_factory: Callable[[], Any] = get_supabase_client,
+        interval: float = CHANGE_FEED_INTERVAL,
+        lookback: float = CHANGE_FEED_LOOKBACK,
+        batch: int = CHANGE_FEED_BATCH
+    ):
+        self.client_factory = client_factory
+        self.interval = interval
+        self.lookback = timedelta(seconds=lookback)
+        self.batch = batch
+        self._feeds: Dict[str, _TableFeed] = {}
+        self._task: Optional[asyncio.Task] = None
+
+    def subscribe(self, table: str, handler: Handler, columns: str = "") -> None:
+        """
+        Call handler with the rows of a table that changed
+
+        Args:
+            table: Table to watch
+            handler: Called on the event loop with the changed rows; must not block
+            columns: Extra columns (PostgREST select syntax) the handler needs besides
+                id and updated_at
+        """
+        feed = self._feeds.get(table)
+        if feed is None:
+            feed = self._feeds[table] = _TableFeed(table)
+        for column in (c.strip() for c in columns.split(",")):
+            if column and column not in feed.columns:
+                feed.columns.append(column)
+        feed.handlers.append(handler)
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def start(self) -> None:
+        """Start watching from the newest row of each table"""
+        if self.running or not self._feeds:
+            return
+        for feed in self._feeds.values():
+            if feed.watermark is None:
+                try:
+                    feed.watermark = await asyncio.to_thread(self._latest, feed.table)
+                except Exception as e:
+                    logger.error(f"Could not read the {feed.table} watermark, starting from now: {e}")
+                    feed.watermark = datetime.now(timezone.utc)
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                await self.poll()
+            except Exception as e:
+                logger.error(f"Change feed poll failed: {e}")
+            await asyncio.sleep(self.interval)
+
+    def _latest(self, table: str) -> datetime:
+        """Database time of the newest row, so app clock skew can't skip changes"""
+        response = self.client_factory().table(table).select("updated_at").order("updated_at", desc=True).limit(1).execute()
+        if response.data and response.data[0].get("updated_at"):
+            return _parse_timestamp(response.data[0]["updated_at"])
+        return datetime.now(timezone.utc)
+
+    def _fetch(self, feed: _TableFeed, since: datetime, after: Optional[Tuple[str, str]] = None) -> List[Dict[str, Any]]:
+        """
+        Read one page of changed rows in (updated_at, id) order
+
+        Args:
+            since: First page: rows updated at or after this time
+            after: Later pages: (updated_at, id) of the last row read, so rows sharing a
+                timestamp are paged through instead of being cut off at the batch size
+        """
+        query = self.client_factory().table(feed.table).select(", ".join(feed.columns))
+        if after is None:
+            query = query.gte("updated_at", since.isoformat())
+        else:
+            updated_at, row_id = after
+            query = query.or_(f'updated_at.gt."{updated_at}",and(updated_at.eq."{updated_at}",id.gt."{row_id}")')
+        response = query.order("updated_at").order("id").limit(self.batch).execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error polling {feed.table}: {response.error}")
+        return response.data
+
+    async def poll(self) -> int:
+        """
+        Read every table up to date and dispatch new changes
+
+        Returns:
+            int: Changed rows dispatched
+        """
+        total = 0
+        for feed in list(self._feeds.values()):
+            # A transaction that commits late can carry an updated_at behind the watermark,
+            # so the lookback is re-read on every poll; seen filters out repeats
+            since = feed.watermark - self.lookback
+            after = None
+            while True:
+                rows = await asyncio.to_thread(self._fetch, feed, since, after)
+                changed = []
+                for row in rows:
+                    key = (row["id"], row["updated_at"])
+                    if key in feed.seen:
+                        continue
+                    updated_at = _parse_timestamp(row["updated_at"])
+                    feed.seen[key] = updated_at
+                    if updated_at > feed.watermark:
+                        feed.watermark = updated_at
+                    changed.append(row)
+                if changed:
+                    self._dispatch(feed, changed)
+                    total += len(changed)
+                # A full batch may hide newer rows; page on from the last row read
+                if len(rows) < self.batch:
+                    break
+                after = (rows[-1]["updated_at"], rows[-1]["id"])
+            cutoff = feed.watermark - self.lookback
+            feed.seen = {key: at for key, at in feed.seen.items() if at >= cutoff}
+        return total
+
+    def _dispatch(self, feed: _TableFeed, rows: List[Dict[str, Any]]) -> None:
+        for handler in feed.handlers:
+            try:
+                handler(rows)
+            except Exception as e:
+                logger.error(f"Change feed handler for {feed.table} failed: {e}")
+        now = datetime.now(timezone.utc)
+        for row in rows:
+            CHANGE_FEED_LAG.observe(max(0.0, (now - _parse_timestamp(row["updated_at"])).total_seconds()), feed.table)
+        CHANGE_FEED_ROWS.inc(feed.table, amount=len(rows))
+
+# Process-wide feed
+_feed: Optional[ChangeFeed] = None
+
+def get_change_feed() -> ChangeFeed:
+    """Get the process-wide change feed"""
+    global _feed
+    if _feed is None:
+        _feed = ChangeFeed()
+    return _feed
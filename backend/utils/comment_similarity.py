@@ -0,0 +1,278 @@
+"""
+Near-duplicate curation comments for The Music Besties API
+Finds comments similar to a given one, on the same item or across the catalog, without
+comparing every pair. Each distinct comment text gets a MinHash signature over its
+character shingles; the signature is split into LSH bands, and comments that share a
+band bucket become candidates. Candidates are then kept only if the signatures agree on
+at least COMMENT_SIMILARITY_THRESHOLD of their positions, which estimates the Jaccard
+similarity of the shingle sets.
+
+With 32 bands of 4 rows, a pair at Jaccard similarity s shares a bucket with
+probability 1 - (1 - s^4)^32: about 0.88 at s = 0.5 and above 0.99 from s = 0.6. See
+benchmarks/comment_similarity.py for measured precision and recall.
+
+Identical texts (after normalization) share one signature, so the thousands of "On
+repeat" comments cost one entry in the buckets. Curation, user and item ids are held as
+dense ints from utils.interning and turned back into UUIDs only in results. The index is built with the search
+index's machinery (utils.search_index.RebuildingIndex) and updated from the same
+curation writes and change feed rows.
+"""
+import logging
+import os
+import zlib
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from utils.change_feed import get_change_feed
+from utils.interning import get_interner
+from utils.search_index import RebuildingIndex, scan_table, tokenize
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+COMMENT_SIMILARITY_ENABLED = os.getenv("COMMENT_SIMILARITY_ENABLED", "true").lower() == "true"
+COMMENT_SIMILARITY_THRESHOLD = float(os.getenv("COMMENT_SIMILARITY_THRESHOLD", "0.5"))
+MINHASH_PERMUTATIONS = int(os.getenv("COMMENT_MINHASH_PERMUTATIONS", "128"))
+LSH_BANDS = int(os.getenv("COMMENT_LSH_BANDS", "32"))
+
+SHINGLE_SIZE = 4
+
+COMMENT_COLUMNS = "id, user_id, curated_item_id, item_type, comment"
+
+# (item_type, item_id)
+ItemKey = Tuple[str, str]
+# (item_type, interned item id)
+_ItemCode = Tuple[str, int]
+
+def normalize(comment: Optional[str]) -> str:
+    """Lowercase, accent-folded words joined by single spaces"""
+    return " ".join(tokenize(comment))
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> Set[str]:
+    """Character shingles of normalized text; shorter texts are one shingle"""
+    if len(text) <= size:
+        return {text}
+    return {text[i:i + size] for i in range(len(text) - size + 1)}
+
+class MinHasher:
+    """
+    MinHash signatures from a fixed, seeded family of hash functions
+
+    The seed is fixed so every worker computes the same signature for the same text.
+
+    Args:
+        permutations: Signature length
+        seed: Seed for the hash coefficients
+    """
+    def __init__(self, permutations: int = MINHASH_PERMUTATIONS, seed: int = 1):
+        # numpy is imported on first use: it adds ~140ms to cold start
+        import numpy as np
+
+        rng = np.random.default_rng(seed)
+        self.a = rng.integers(0, 1 << 63, size=permutations, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+        self.b = rng.integers(0, 1 << 63, size=permutations, dtype=np.uint64)
+
+    def signature(self, text: str) -> "np.ndarray":
+        import numpy as np
+
+        hashes = np.fromiter((zlib.crc32(s.encode("utf-8")) for s in shingles(text)), dtype=np.uint64)
+        # Multiply-add-shift: (a * x + b) mod 2^64, top 32 bits; uint64 arithmetic wraps
+        permuted = (np.outer(hashes, self.a) + self.b) >> np.uint64(32)
+        return permuted.min(axis=0).astype(np.uint32)
+
+@dataclass
+class _Text:
+    """One distinct normalized comment and the curations that use it"""
+    signature: "np.ndarray"
+    members: Dict[_ItemCode, Set[int]] = field(default_factory=dict)
+
+@dataclass
+class _Comment:
+    """An indexed comment; user_id and the item id are interned"""
+    user_id: int
+    item: _ItemCode
+    text: str
+    comment: str
+
+class CommentSimilarityIndex:
+    """
+    MinHash/LSH index over curation comments
+
+    Not thread-safe: build it in one thread, then read and update it from the event loop.
+
+    Args:
+        bands: LSH bands; the signature length must be a multiple of it
+        threshold: Minimum estimated Jaccard similarity of a match
+        hasher: Signature function
+    """
+    def __init__(self, bands: int = LSH_BANDS, threshold: float = COMMENT_SIMILARITY_THRESHOLD, hasher: Optional[MinHasher] = None):
+        self.hasher = hasher or MinHasher()
+        permutations = len(self.hasher.a)
+        if permutations % bands:
+            raise ValueError(f"{permutations} permutations can't be split into {bands} bands")
+        self.bands = bands
+        self.rows = permutations // bands
+        self.threshold = threshold
+        self._curations = get_interner("curations")
+        self._users = get_interner("users")
+        self._items = get_interner("items")
+        self._comments: Dict[int, _Comment] = {}
+        self._texts: Dict[str, _Text] = {}
+        # One bucket table per band: band bytes -> normalized texts
+        self._buckets: List[Dict[bytes, Set[str]]] = [{} for _ in range(bands)]
+
+    def __len__(self) -> int:
+        return len(self._comments)
+
+    @property
+    def distinct_texts(self) -> int:
+        return len(self._texts)
+
+    def _band_keys(self, signature: "np.ndarray") -> List[bytes]:
+        return [signature[i * self.rows:(i + 1) * self.rows].tobytes() for i in range(self.bands)]
+
+    def add(self, curation_id: str, user_id: str, item: ItemKey, comment: Optional[str]) -> None:
+        """Index a curation's comment, replacing its previous one; empty comments are removed"""
+        self._add(self._curations.intern(curation_id), self._users.intern(user_id), (item[0], self._items.intern(item[1])), comment)
+
+    def _add(self, curation: int, user: int, item: _ItemCode, comment: Optional[str]) -> None:
+        text = normalize(comment)
+        current = self._comments.get(curation)
+        if current is not None:
+            if current.text == text and current.item == item:
+                current.comment = comment
+                return
+            self._remove(curation)
+        if not text:
+            return
+        entry = self._texts.get(text)
+        if entry is None:
+            entry = self._texts[text] = _Text(self.hasher.signature(text))
+            for band, key in enumerate(self._band_keys(entry.signature)):
+                self._buckets[band].setdefault(key, set()).add(text)
+        entry.members.setdefault(item, set()).add(curation)
+        self._comments[curation] = _Comment(user, item, text, comment)
+
+    def remove(self, curation_id: str) -> None:
+        curation = self._curations.get(curation_id)
+        if curation is not None:
+            self._remove(curation)
+
+    def _remove(self, curation: int) -> None:
+        current = self._comments.pop(curation, None)
+        if current is None:
+            return
+        entry = self._texts[current.text]
+        members = entry.members[current.item]
+        members.discard(curation)
+        if not members:
+            del entry.members[current.item]
+        if not entry.members:
+            del self._texts[current.text]
+            for band, key in enumerate(self._band_keys(entry.signature)):
+                bucket = self._buckets[band][key]
+                bucket.discard(current.text)
+                if not bucket:
+                    del self._buckets[band][key]
+
+    def apply(self, table: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Index changed user_curations rows"""
+        # Rows without a comment only matter if they clear one that is indexed
+        rows = [row for row in rows if row.get("comment") or self._indexed(row["id"])]
+        # Intern each column in one batch: one lock and file append per namespace
+        curations = self._curations.intern_list([row["id"] for row in rows])
+        users = self._users.intern_list([row["user_id"] for row in rows])
+        items = self._items.intern_list([row["curated_item_id"] for row in rows])
+        for row, curation, user, item in zip(rows, curations, users, items):
+            self._add(curation, user, (row["item_type"], item), row.get("comment"))
+
+    def _indexed(self, curation_id: str) -> bool:
+        curation = self._curations.get(curation_id, sync=False)
+        return curation is not None and curation in self._comments
+
+    def similar_texts(self, text: str) -> List[Tuple[str, float]]:
+        """
+        Distinct texts similar to a normalized text, including itself if indexed
+
+        Returns:
+            List[Tuple[str, float]]: (text, estimated Jaccard similarity), most similar first
+        """
+        import numpy as np
+
+        entry = self._texts.get(text)
+        signature = entry.signature if entry is not None else self.hasher.signature(text)
+        candidates: Set[str] = set()
+        for band, key in enumerate(self._band_keys(signature)):
+            candidates.update(self._buckets[band].get(key, ()))
+        if not candidates:
+            return []
+        candidates = list(candidates)
+        matrix = np.stack([self._texts[candidate].signature for candidate in candidates])
+        similarity = (matrix == signature).mean(axis=1)
+        matches = [(candidates[i], float(similarity[i])) for i in np.flatnonzero(similarity >= self.threshold)]
+        return sorted(matches, key=lambda match: match[1], reverse=True)
+
+    def similar(self, curation_id: str, same_item: bool = True, limit: int = 20) -> Optional[List[Dict[str, Any]]]:
+        """
+        Other users' comments similar to a curation's comment
+
+        Args:
+            curation_id: Curation whose comment to match
+            same_item: Only comments on the same album or song; otherwise any item
+            limit: Maximum results
+
+        Returns:
+            Matches with curation_id, user_id, item_type, item_id, comment and similarity,
+            most similar first, or None if the curation has no indexed comment
+        """
+        try:
+            curation = self._curations.get(curation_id)
+        except ValueError:
+            return None
+        query = self._comments.get(curation)
+        if query is None:
+            return None
+        results = []
+        for text, similarity in self.similar_texts(query.text):
+            members = self._texts[text].members
+            items = [query.item] if same_item else list(members)
+            for item in items:
+                for other_id in members.get(item, ()):
+                    other = self._comments[other_id]
+                    if other.user_id == query.user_id:
+                        continue
+                    results.append({
+                        "curation_id": self._curations.lookup(other_id),
+                        "user_id": self._users.lookup(other.user_id),
+                        "item_type": item[0],
+                        "item_id": self._items.lookup(item[1]),
+                        "comment": other.comment,
+                        "similarity": round(similarity, 3)
+                    })
+                    if len(results) >= limit:
+                        return results
+        return results
+
+def build_similarity_index(client) -> CommentSimilarityIndex:
+    """Build the index from every commented curation (blocking; run in a thread)"""
+    index = CommentSimilarityIndex()
+    index.apply("user_curations", (row for row in scan_table(client, "user_curations", COMMENT_COLUMNS) if row.get("comment")))
+    return index
+
+# Process-wide index
+_similarity: Optional[RebuildingIndex] = None
+
+def get_comment_similarity() -> RebuildingIndex:
+    """Get the process-wide comment similarity index"""
+    global _similarity
+    if _similarity is None:
+        _similarity = RebuildingIndex("comment similarity", build_similarity_index)
+    return _similarity
+
+get_change_feed().subscribe(
+    "user_curations",
+    lambda rows: get_comment_similarity().apply("user_curations", rows),
+    columns=COMMENT_COLUMNS.replace("id, ", "", 1)
+)
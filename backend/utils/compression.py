@@ -0,0 +1,164 @@
+"""
+Response compression for The Music Besties API
+Negotiates gzip or brotli from Accept-Encoding and compresses JSON responses above a
+size threshold. Cacheable catalog bodies are compressed once when they are cached (see
+utils.http_cache) and replayed as-is; CompressionMiddleware covers every other
+single-body response. Streaming responses are passed through untouched, since
+buffering them would delay every chunk until the end.
+
+Brotli is used when the optional brotli package is installed; otherwise only gzip is
+offered.
+"""
+import asyncio
+import gzip
+import os
+from typing import Dict, Optional
+
+COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "true").lower() == "true"
+# Bodies smaller than this are sent uncompressed; the saving doesn't cover the CPU
+COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "1024"))
+# Our JSON is dominated by UUIDs, so higher levels cost far more CPU than they save in
+# bytes (see benchmarks/compression.py); cached bodies use the same settings
+GZIP_LEVEL = int(os.getenv("GZIP_LEVEL", "6"))
+BROTLI_QUALITY = int(os.getenv("BROTLI_QUALITY", "4"))
+# Larger bodies are compressed in a worker thread (zlib and brotli release the GIL)
+# rather than holding the event loop for milliseconds
+COMPRESSION_THREAD_MIN_SIZE = int(os.getenv("COMPRESSION_THREAD_MIN_SIZE", "65536"))
+
+COMPRESSIBLE_TYPES = (b"application/json", b"text/")
+
+try:
+    import brotli
+except ImportError:  # Optional dependency
+    brotli = None
+
+# Preferred first
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+def negotiate_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """
+    Pick the best supported content coding the client accepts
+
+    Args:
+        accept_encoding: Accept-Encoding request header
+
+    Returns:
+        "br", "gzip" or None for identity
+    """
+    if not accept_encoding or not COMPRESSION_ENABLED:
+        return None
+    accepted: Dict[str, float] = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get("*", 0.0)
+    best, best_quality = None, 0.0
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, wildcard)
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """
+    Compress a body with a negotiated content coding
+
+    Args:
+        body: Response body
+        encoding: "br" or "gzip"
+    """
+    if encoding == "br":
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    # mtime=0 keeps the output identical for identical bodies
+    return gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+
+def _header(headers, name: bytes) -> Optional[bytes]:
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+def add_vary(headers: list, value: bytes = b"Accept-Encoding") -> list:
+    """Return headers with a value merged into Vary"""
+    for i, (key, existing) in enumerate(headers):
+        if key.lower() == b"vary":
+            if value.lower() not in existing.lower():
+                headers[i] = (key, existing + b", " + value)
+            return headers
+    return headers + [(b"vary", value)]
+
+class CompressionMiddleware:
+    """
+    ASGI middleware compressing single-body responses above COMPRESSION_MIN_SIZE
+
+    Responses that already carry Content-Encoding (precompressed cache hits) and
+    streaming responses (more than one body message) are passed through unchanged.
+    """
+    def __init__(self, app, min_size: int = COMPRESSION_MIN_SIZE):
+        self.app = app
+        self.min_size = min_size
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not COMPRESSION_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        encoding = None
+        for key, value in scope["headers"]:
+            if key == b"accept-encoding":
+                encoding = negotiate_encoding(value.decode("latin-1"))
+                break
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        passthrough = False
+
+        async def send_compressed(message):
+            nonlocal start_message, passthrough
+            if passthrough:
+                await send(message)
+                return
+            if message["type"] == "http.response.start":
+                headers = message.get("headers", [])
+                content_type = _header(headers, b"content-type") or b""
+                if _header(headers, b"content-encoding") is not None or not content_type.startswith(COMPRESSIBLE_TYPES):
+                    passthrough = True
+                    await send(message)
+                else:
+                    # Hold the headers until the body shows whether it is worth compressing
+                    start_message = message
+                return
+            if message["type"] != "http.response.body":
+                await send(message)
+                return
+
+            body = message.get("body", b"")
+            passthrough = True
+            if message.get("more_body", False):
+                # Streaming: send as-is rather than buffering the whole stream
+                await send(start_message)
+                await send(message)
+                return
+            headers = list(start_message.get("headers", []))
+            if len(body) >= self.min_size:
+                if len(body) >= COMPRESSION_THREAD_MIN_SIZE:
+                    body = await asyncio.to_thread(compress, body, encoding)
+                else:
+                    body = compress(body, encoding)
+                headers = [(k, v) for k, v in headers if k.lower() != b"content-length"]
+                headers += [(b"content-encoding", encoding.encode("latin-1")), (b"content-length", str(len(body)).encode("latin-1"))]
+                # The coded bytes differ from the ones a strong ETag was computed from
+                headers = [(k, b"W/" + v if k.lower() == b"etag" and not v.startswith(b"W/") else v) for k, v in headers]
+                headers = add_vary(headers)
+            await send({**start_message, "headers": headers})
+            await send({**message, "body": body})
+
+        await self.app(scope, receive, send_compressed)
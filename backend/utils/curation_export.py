@@ -0,0 +1,307 @@
+"""
+Bulk curation export/import for The Music Besties
+Streams user_curations out of the database in keyset-paginated chunks into a columnar
+directory of NumPy .npy files (one per column) that analytics jobs can memory-map,
+and loads such a directory back into the database in batches.
+
+Layout of an export directory:
+    meta.json            row count, format version, column descriptions
+    id.npy               S36     curation ids
+    user_code.npy        int32   index into users.npy
+    item_code.npy        int32   index into items.npy
+    users.npy / items.npy S36    dictionaries of user and curated item ids
+    item_type.npy        uint8   0 = album, 1 = song
+    rating.npy           int8    1-5, 0 = null
+    weighted_rank.npy    int8    0-100, -1 = null
+    updated_at.npy       int64   microseconds since the epoch, INT64_MIN = null
+    comment_data.npy     uint8   UTF-8 bytes of all comments, concatenated
+    comment_offsets.npy  int64   N+1 offsets into comment_data
+    comment_valid.npy    bool    False where comment is null
+
+Usage:
+    python -m utils.curation_export export <directory> [--user-id ID] [--chunk-size N]
+    python -m utils.curation_export import <directory> [--batch-size N]
+"""
+import argparse
+import json
+import logging
+import os
+from array import array
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+ITEM_TYPES = ("album", "song")
+NULL_TIMESTAMP = np.iinfo(np.int64).min
+CURATION_KEY = "user_id,curated_item_id,item_type"
+EXPORT_COLUMNS = "id, user_id, curated_item_id, item_type, rating, comment, weighted_rank_percentage, updated_at"
+
+class _Dictionary:
+    """Assigns dense int32 codes to string values in first-seen order"""
+    def __init__(self):
+        self.codes: Dict[str, int] = {}
+        self.values: List[str] = []
+
+    def encode(self, value: str) -> int:
+        code = self.codes.get(value)
+        if code is None:
+            code = self.codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+def _to_micros(value: Optional[str]) -> int:
+    if not value:
+        return NULL_TIMESTAMP
+    parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    return int(parsed.timestamp() * 1_000_000)
+
+def iter_curation_chunks(client: Any, chunk_size: int = 1000, user_id: Optional[str] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yield user_curations rows in chunks using keyset pagination on id
+
+    Args:
+        client: Supabase client
+        chunk_size: Rows per query
+        user_id: Only export this user's curations
+
+    Yields:
+        Lists of curation rows ordered by id
+    """
+    last_id = None
+    while True:
+        query = client.table("user_curations").select(EXPORT_COLUMNS)
+        if user_id:
+            query = query.eq("user_id", user_id)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = query.order("id").limit(chunk_size).execute()
+
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error exporting curations: {response.error}")
+
+        rows = response.data
+        if not rows:
+            return
+        yield rows
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1]["id"]
+
+class _ColumnWriter:
+    """
+    Appends one column to a .npy file chunk by chunk
+
+    Space for the header is reserved up front and the header is written on close, once
+    the row count is known.
+    """
+    HEADER_SIZE = 128
+
+    def __init__(self, path: str, dtype: str):
+        self.dtype = np.dtype(dtype)
+        self.count = 0
+        self._file = open(path, "wb")
+        self._file.write(b"\0" * self.HEADER_SIZE)
+
+    def write(self, values: Any) -> None:
+        data = np.asarray(values, dtype=self.dtype)
+        self._file.write(data.tobytes())
+        self.count += len(data)
+
+    def close(self) -> None:
+        prefix = np.lib.format.magic(1, 0)
+        header = repr({"descr": np.lib.format.dtype_to_descr(self.dtype), "fortran_order": False, "shape": (self.count,)})
+        # Pad with spaces so the data starts where it was written
+        header = header.ljust(self.HEADER_SIZE - len(prefix) - 3) + "\n"
+        self._file.seek(0)
+        self._file.write(prefix + len(header).to_bytes(2, "little") + header.encode("latin1"))
+        self._file.close()
+
+# Row-aligned columns, written as each chunk arrives
+STREAMED_COLUMNS = {
+    "id": "S36",
+    "user_code": "int32",
+    "item_code": "int32",
+    "item_type": "uint8",
+    "rating": "int8",
+    "weighted_rank": "int8",
+    "updated_at": "int64",
+    "comment_valid": "bool",
+}
+
+def export_curations(client: Any, directory: str, chunk_size: int = 1000, user_id: Optional[str] = None) -> int:
+    """
+    Export curations to a columnar directory
+
+    Each chunk is encoded and appended to the column files before the next one is
+    fetched, so memory stays proportional to the chunk size plus the user and item
+    dictionaries.
+
+    Returns:
+        int: Number of rows exported
+    """
+    os.makedirs(directory, exist_ok=True)
+    users, items = _Dictionary(), _Dictionary()
+    writers = {name: _ColumnWriter(os.path.join(directory, f"{name}.npy"), dtype) for name, dtype in STREAMED_COLUMNS.items()}
+    writers["comment_data"] = _ColumnWriter(os.path.join(directory, "comment_data.npy"), "uint8")
+    writers["comment_offsets"] = _ColumnWriter(os.path.join(directory, "comment_offsets.npy"), "int64")
+    writers["comment_offsets"].write([0])
+    comment_size = 0
+
+    try:
+        for rows in iter_curation_chunks(client, chunk_size, user_id):
+            comments = [row.get("comment") for row in rows]
+            encoded = [comment.encode("utf-8") if comment else b"" for comment in comments]
+            offsets = array("q")
+            for data in encoded:
+                comment_size += len(data)
+                offsets.append(comment_size)
+
+            writers["id"].write([row["id"].encode("ascii") for row in rows])
+            writers["user_code"].write([users.encode(row["user_id"]) for row in rows])
+            writers["item_code"].write([items.encode(row["curated_item_id"]) for row in rows])
+            writers["item_type"].write([ITEM_TYPES.index(row["item_type"]) for row in rows])
+            writers["rating"].write([row.get("rating") or 0 for row in rows])
+            writers["weighted_rank"].write([-1 if row.get("weighted_rank_percentage") is None else row["weighted_rank_percentage"] for row in rows])
+            writers["updated_at"].write([_to_micros(row.get("updated_at")) for row in rows])
+            writers["comment_valid"].write([comment is not None for comment in comments])
+            writers["comment_data"].write(np.frombuffer(b"".join(encoded), dtype=np.uint8))
+            writers["comment_offsets"].write(offsets)
+            logger.info(f"Exported {writers['id'].count} curations")
+    finally:
+        for writer in writers.values():
+            writer.close()
+
+    count = writers["id"].count
+    columns = sorted([*writers, "users", "items"])
+    np.save(os.path.join(directory, "users.npy"), np.array(users.values, dtype="S36"))
+    np.save(os.path.join(directory, "items.npy"), np.array(items.values, dtype="S36"))
+
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump({
+            "format_version": FORMAT_VERSION,
+            "rows": count,
+            "users": len(users.values),
+            "items": len(items.values),
+            "item_types": list(ITEM_TYPES),
+            "columns": columns
+        }, f, indent=2)
+
+    return count
+
+class CurationColumns:
+    """
+    Memory-mapped view of an export directory
+
+    Attributes are the column arrays, e.g. columns.user_code or columns.rating.
+    """
+    def __init__(self, directory: str, mmap: bool = True):
+        with open(os.path.join(directory, "meta.json")) as f:
+            self.meta = json.load(f)
+        if self.meta["format_version"] != FORMAT_VERSION:
+            raise ValueError(f"Unsupported curation export format: {self.meta['format_version']}")
+        mode = "r" if mmap else None
+        for name in self.meta["columns"]:
+            setattr(self, name, np.load(os.path.join(directory, f"{name}.npy"), mmap_mode=mode))
+
+    def __len__(self) -> int:
+        return self.meta["rows"]
+
+    def interned_codes(self, column: str = "users") -> np.ndarray:
+        """
+        Map this file's dictionary codes to process-wide interned IDs
+
+        Index the result with user_code (column="users") or item_code (column="items")
+        to join the export against other int-keyed structures.
+        """
+        from utils.interning import get_interner
+
+        values = [value.decode("ascii") for value in getattr(self, column)]
+        return get_interner(column).intern_many(values)
+
+    def comment(self, index: int) -> Optional[str]:
+        """Decode one comment"""
+        if not self.comment_valid[index]:
+            return None
+        start, end = self.comment_offsets[index], self.comment_offsets[index + 1]
+        return bytes(self.comment_data[start:end]).decode("utf-8")
+
+    def row(self, index: int) -> Dict[str, Any]:
+        """Rebuild one curation row"""
+        rating = int(self.rating[index])
+        rank = int(self.weighted_rank[index])
+        micros = int(self.updated_at[index])
+        return {
+            "id": self.id[index].decode("ascii").strip(),
+            "user_id": self.users[self.user_code[index]].decode("ascii"),
+            "curated_item_id": self.items[self.item_code[index]].decode("ascii"),
+            "item_type": ITEM_TYPES[self.item_type[index]],
+            "rating": rating or None,
+            "comment": self.comment(index),
+            "weighted_rank_percentage": None if rank < 0 else rank,
+            "updated_at": None if micros == NULL_TIMESTAMP else datetime.fromtimestamp(micros / 1_000_000, tz=timezone.utc).isoformat()
+        }
+
+def load_curations(directory: str, mmap: bool = True) -> CurationColumns:
+    """
+    Open an export directory, memory-mapping its columns by default
+
+    Args:
+        directory: Path written by export_curations
+        mmap: Map the files instead of reading them into memory
+
+    Returns:
+        CurationColumns
+    """
+    return CurationColumns(directory, mmap=mmap)
+
+def import_curations(client: Any, directory: str, batch_size: int = 500) -> int:
+    """
+    Upsert every curation in an export directory into user_curations
+
+    Returns:
+        int: Number of rows imported
+    """
+    columns = load_curations(directory)
+    total = len(columns)
+    for start in range(0, total, batch_size):
+        batch = [columns.row(index) for index in range(start, min(start + batch_size, total))]
+        # Merge on the natural key, as the API does, so re-importing into a database that
+        # already holds a curation under another id updates it instead of duplicating it
+        response = client.table("user_curations").upsert(batch, on_conflict=CURATION_KEY).execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error importing curations: {response.error}")
+        logger.info(f"Imported {start + len(batch)}/{total} curations")
+    return total
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    export_parser = subparsers.add_parser("export")
+    export_parser.add_argument("directory")
+    export_parser.add_argument("--user-id")
+    export_parser.add_argument("--chunk-size", type=int, default=1000)
+    import_parser = subparsers.add_parser("import")
+    import_parser.add_argument("directory")
+    import_parser.add_argument("--batch-size", type=int, default=500)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+    from utils.supabase_client import get_supabase_client
+    client = get_supabase_client()
+    if client is None:
+        raise SystemExit("Supabase is not configured")
+
+    if args.command == "export":
+        count = export_curations(client, args.directory, args.chunk_size, args.user_id)
+        print(f"Exported {count} curations to {args.directory}")
+    else:
+        count = import_curations(client, args.directory, args.batch_size)
+        print(f"Imported {count} curations from {args.directory}")
+
+if __name__ == "__main__":
+    main()
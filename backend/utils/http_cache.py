@@ -0,0 +1,218 @@
+"""
+HTTP caching helpers for The Music Besties read endpoints
+Provides strong ETags, Cache-Control policies, conditional GET (304) handling and
+precompressed cached bodies
+"""
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from fastapi import Request, Response
+
+from utils.compression import COMPRESSION_ENABLED, COMPRESSION_MIN_SIZE, compress, negotiate_encoding
+from utils.metrics import record_cache_lookup
+from utils.serialization import dumps
+
+# Cache-Control policies
+# Shared catalog data (artists, albums, songs) can be cached by browsers and the Vercel edge
+CATALOG_CACHE_CONTROL = os.getenv(
+    "CATALOG_CACHE_CONTROL",
+    "public, max-age=60, s-maxage=300, stale-while-revalidate=600"
+)
+# User-private data (curations) must only be stored by the user's browser and always revalidated
+PRIVATE_CACHE_CONTROL = "private, no-cache"
+
+# How long a cached validator is trusted before the route goes back to the database
+DEFAULT_VALIDATOR_TTL = float(os.getenv("HTTP_CACHE_TTL", "60"))
+# Entries kept per cache; the least recently used are evicted beyond this
+DEFAULT_VALIDATOR_MAX_ENTRIES = int(os.getenv("HTTP_CACHE_MAX_ENTRIES", "5000"))
+
+def compute_etag(body: bytes) -> str:
+    """
+    Compute a strong ETag from an encoded response body
+
+    Args:
+        body: Serialized JSON response body
+
+    Returns:
+        str: Quoted strong ETag
+    """
+    return '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+def encoded_etag(etag: str, encoding: str) -> str:
+    """ETag of a content-coded representation, distinct from the identity ETag"""
+    return f'{etag[:-1]}-{encoding}"'
+
+def etag_matches(request: Request, etag: str) -> bool:
+    """
+    Check the request's If-None-Match header against an ETag
+
+    A tag for any content-coded representation of the same body also matches, so a
+    client that cached the gzip response still revalidates after switching to br.
+
+    Args:
+        request: Incoming request
+        etag: Current ETag of the resource
+
+    Returns:
+        bool: True if the client's cached copy is still current
+    """
+    if_none_match = request.headers.get("If-None-Match")
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+
+    # If-None-Match uses weak comparison, so W/"x" matches "x"
+    candidates = [tag.strip() for tag in if_none_match.split(",")]
+    prefix = etag[:-1]
+    return any(
+        tag == etag or (tag.startswith(prefix) and tag[len(prefix):len(prefix) + 1] == "-")
+        for tag in (candidate.removeprefix("W/") for candidate in candidates)
+    )
+
+def _cache_headers(etag: str, cache_control: str, private: bool, varies_by_encoding: bool = False) -> Dict[str, str]:
+    """Build the validator and policy headers for a response"""
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    vary = []
+    if private:
+        # Responses differ per user, so shared caches must key on the credentials
+        vary.append("Authorization")
+    if varies_by_encoding:
+        vary.append("Accept-Encoding")
+    if vary:
+        headers["Vary"] = ", ".join(vary)
+    return headers
+
+class CachedBody:
+    """
+    A serialized response body with its ETag and lazily built compressed copies
+
+    Each content coding is compressed once, on the first request that negotiates it,
+    and replayed from memory afterwards.
+    """
+    __slots__ = ("etag", "body", "_encoded")
+
+    def __init__(self, body: bytes, etag: Optional[str] = None):
+        self.body = body
+        self.etag = etag or compute_etag(body)
+        self._encoded: Dict[str, bytes] = {}
+
+    @property
+    def compressible(self) -> bool:
+        return COMPRESSION_ENABLED and len(self.body) >= COMPRESSION_MIN_SIZE
+
+    def encoded(self, encoding: str) -> bytes:
+        """The body in a content coding, compressing it on first use"""
+        data = self._encoded.get(encoding)
+        if data is None:
+            data = self._encoded[encoding] = compress(self.body, encoding)
+        return data
+
+def conditional_response(
+    request: Request,
+    payload: Any = None,
+    cache_control: str = CATALOG_CACHE_CONTROL,
+    private: bool = False,
+    cached: Optional[CachedBody] = None
+) -> Response:
+    """
+    Return a 304 if the client's ETag is current, otherwise the JSON body with validators
+
+    The payload is serialized exactly once and the ETag is hashed from those bytes.
+    A cached body is sent in the client's preferred content coding, compressed at most
+    once per coding; uncached bodies are left to CompressionMiddleware.
+
+    Args:
+        request: Incoming request
+        payload: JSON-serializable response data (ignored if cached is given)
+        cache_control: Cache-Control policy for the route
+        private: Whether the response is specific to the authenticated user
+        cached: Serialized body from a ValidatorCache
+
+    Returns:
+        Response: 304 Not Modified or a JSON response with ETag and Cache-Control
+    """
+    if cached is None:
+        body = dumps(payload)
+        etag = compute_etag(body)
+        encoding = None
+        compressible = False
+    else:
+        body, etag = cached.body, cached.etag
+        compressible = cached.compressible
+        encoding = negotiate_encoding(request.headers.get("Accept-Encoding")) if compressible else None
+        if encoding is not None:
+            body = cached.encoded(encoding)
+            etag = encoded_etag(etag, encoding)
+    headers = _cache_headers(etag, cache_control, private, varies_by_encoding=compressible)
+
+    if etag_matches(request, cached.etag if cached is not None else etag):
+        return Response(status_code=304, headers=headers)
+
+    if encoding is not None:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, media_type="application/json", headers=headers)
+
+class ValidatorCache:
+    """
+    In-process cache of recently served response bodies and their ETags
+
+    Lets a route answer a matching If-None-Match with a 304, or replay the cached
+    bytes (already compressed, after the first request per content coding) without
+    touching the database or re-serializing while the entry is fresh.
+
+    Bounded: at most max_entries are kept, least recently used first out, and expired
+    entries are swept once per TTL.
+    """
+    def __init__(self, name: str, ttl: float = DEFAULT_VALIDATOR_TTL, max_entries: int = DEFAULT_VALIDATOR_MAX_ENTRIES):
+        self.name = name
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, CachedBody]]" = OrderedDict()
+        self._next_sweep = time.monotonic() + ttl
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> Optional[CachedBody]:
+        """Return the body of a fresh entry, or None"""
+        entry = self._entries.get(key)
+        if entry is None:
+            record_cache_lookup(self.name, hit=False)
+            return None
+        expires_at, cached = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            record_cache_lookup(self.name, hit=False)
+            return None
+        self._entries.move_to_end(key)
+        record_cache_lookup(self.name, hit=True)
+        return cached
+
+    def set(self, key: str, payload: Any) -> CachedBody:
+        """Serialize and store a payload"""
+        cached = CachedBody(dumps(payload))
+        now = time.monotonic()
+        self._entries[key] = (now + self.ttl, cached)
+        self._entries.move_to_end(key)
+        if now >= self._next_sweep:
+            self._sweep(now)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return cached
+
+    def _sweep(self, now: float) -> None:
+        """Drop every expired entry"""
+        self._next_sweep = now + self.ttl
+        for key in [key for key, (expires_at, _) in self._entries.items() if expires_at <= now]:
+            del self._entries[key]
+
+    def invalidate(self, key: Optional[str] = None) -> None:
+        """Drop one entry, or every entry if no key is given"""
+        if key is None:
+            self._entries.clear()
+        else:
+            self._entries.pop(key, None)
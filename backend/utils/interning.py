@@ -0,0 +1,203 @@
+"""
+Dense integer ID interning for The Music Besties backend
+Maps UUID keys (users, catalog items, artists) to dense int32 IDs so in-process
+structures can use arrays and small ints instead of 36-character strings. IDs are only
+converted back to UUID strings at the API boundary.
+
+When INTERN_DIR is set, each namespace is persisted as an append-only file of 16-byte
+UUID records where the record position is the ID. Workers share a namespace by reading
+the same file and appending under an exclusive file lock, so every worker assigns the
+same ID to the same UUID.
+"""
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - Windows development machines
+    fcntl = None
+
+RECORD_SIZE = 16
+
+INTERN_DIR = os.getenv("INTERN_DIR")
+
+def uuid_bytes(value: str) -> bytes:
+    """
+    Convert a UUID string to its 16-byte form
+
+    Raises:
+        ValueError: If the value is not a UUID
+    """
+    raw = bytes.fromhex(value.replace("-", ""))
+    if len(raw) != RECORD_SIZE:
+        raise ValueError(f"Not a UUID: {value!r}")
+    return raw
+
+def uuid_string(raw: bytes) -> str:
+    """Format 16 UUID bytes as the canonical 36-character string"""
+    h = raw.hex()
+    return f"{h[:8]}-{h[8:12]}-{h[12:16]}-{h[16:20]}-{h[20:]}"
+
+class IdInterner:
+    """
+    Bidirectional UUID <-> dense int32 mapping for one namespace
+
+    Args:
+        path: Append-only file shared by workers, or None for a per-process mapping
+    """
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self._ids: Dict[bytes, int] = {}
+        self._table = bytearray()
+        self._lock = threading.Lock()
+        if path:
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+            with self._lock:
+                self._sync()
+
+    def __len__(self) -> int:
+        return len(self._table) // RECORD_SIZE
+
+    def _sync(self) -> None:
+        """Load records appended by other workers since the last sync"""
+        if not self.path or not os.path.exists(self.path):
+            return
+        with open(self.path, "rb") as f:
+            f.seek(len(self._table))
+            data = f.read()
+        # Ignore a torn trailing record; it will be complete on the next sync
+        data = data[:len(data) - len(data) % RECORD_SIZE]
+        start = len(self)
+        for offset in range(0, len(data), RECORD_SIZE):
+            self._ids[data[offset:offset + RECORD_SIZE]] = start + offset // RECORD_SIZE
+        self._table += data
+
+    def get(self, value: str, sync: bool = True) -> Optional[int]:
+        """
+        Return the ID for a UUID without assigning a new one
+
+        Args:
+            value: UUID string
+            sync: On a miss, load IDs other workers assigned before giving up
+        """
+        key = uuid_bytes(value)
+        found = self._ids.get(key)
+        if found is None and sync and self.path:
+            with self._lock:
+                self._sync()
+                found = self._ids.get(key)
+        return found
+
+    def intern(self, value: str) -> int:
+        """Return the ID for a UUID, assigning the next free ID if it is new"""
+        found = self._ids.get(uuid_bytes(value))
+        if found is not None:
+            return found
+        return self.intern_list([value])[0]
+
+    def intern_many(self, values: Iterable[str]) -> "np.ndarray":
+        """
+        Intern a batch of UUIDs under a single lock acquisition
+
+        Returns:
+            np.ndarray: int32 IDs in input order
+        """
+        # numpy is imported on first use to keep it off the cold-start path
+        import numpy as np
+
+        return np.array(self.intern_list(values), dtype=np.int32)
+
+    def intern_list(self, values: Iterable[str]) -> List[int]:
+        """
+        Intern a batch of UUIDs under a single lock acquisition
+
+        Returns:
+            List[int]: IDs in input order
+        """
+        keys = [uuid_bytes(value) for value in values]
+        result: List[int] = [0] * len(keys)
+        missing = []
+        for i, key in enumerate(keys):
+            found = self._ids.get(key)
+            if found is None:
+                missing.append(i)
+            else:
+                result[i] = found
+        if not missing:
+            return result
+
+        with self._lock:
+            if self.path:
+                with open(self.path, "ab") as f:
+                    if fcntl is not None:
+                        fcntl.flock(f, fcntl.LOCK_EX)
+                    try:
+                        # Another worker may have assigned some of these while we waited
+                        self._sync()
+                        # Under the lock every complete record is loaded, so anything past
+                        # them is a record torn by a worker that died mid-write; drop it so
+                        # new records stay aligned
+                        f.truncate(len(self._table))
+                        appended = self._assign(keys, missing, result)
+                        f.write(appended)
+                        f.flush()
+                    finally:
+                        if fcntl is not None:
+                            fcntl.flock(f, fcntl.LOCK_UN)
+            else:
+                self._assign(keys, missing, result)
+        return result
+
+    def _assign(self, keys: List[bytes], missing: List[int], result: List[int]) -> bytes:
+        """Assign IDs to keys still unknown after a sync; returns the new records"""
+        appended = bytearray()
+        for i in missing:
+            key = keys[i]
+            found = self._ids.get(key)
+            if found is None:
+                found = self._ids[key] = len(self)
+                self._table += key
+                appended += key
+            result[i] = found
+        return bytes(appended)
+
+    def lookup(self, interned_id: int) -> str:
+        """Convert an ID back to its UUID string"""
+        if interned_id >= len(self) and self.path:
+            with self._lock:
+                self._sync()
+        if not 0 <= interned_id < len(self):
+            raise KeyError(interned_id)
+        offset = interned_id * RECORD_SIZE
+        return uuid_string(bytes(self._table[offset:offset + RECORD_SIZE]))
+
+    def lookup_many(self, interned_ids: Iterable[int]) -> List[str]:
+        """Convert a batch of IDs back to UUID strings"""
+        return [self.lookup(int(interned_id)) for interned_id in interned_ids]
+
+# One interner per namespace ("users", "items", "artists", "curations") per process
+_interners: Dict[str, IdInterner] = {}
+_interners_lock = threading.Lock()
+
+def get_interner(namespace: str) -> IdInterner:
+    """
+    Get the interner for a namespace, persisted under INTERN_DIR when it is set
+
+    Args:
+        namespace: Key space: "users", "items" (albums and songs), "artists" or "curations"
+
+    Returns:
+        IdInterner
+    """
+    interner = _interners.get(namespace)
+    if interner is None:
+        with _interners_lock:
+            interner = _interners.get(namespace)
+            if interner is None:
+                path = os.path.join(INTERN_DIR, f"{namespace}.ids") if INTERN_DIR else None
+                interner = _interners[namespace] = IdInterner(path)
+    return interner
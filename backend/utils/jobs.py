@@ -0,0 +1,434 @@
+"""
+Background job queue for The Music Besties API
+Post-response work (profile creation after signup, chat persistence, analytics) is
+enqueued by handlers and run by a bounded pool of async workers, so requests return as
+soon as their primary write has committed.
+
+Jobs of the same type are batched, failed batches are retried with exponential backoff,
+and the queue drains on shutdown. With JOB_STORE_PATH set, jobs are also written to a
+SQLite file and deleted once they succeed, so jobs still pending when a worker dies are
+picked up again. Store access runs on one writer thread per queue, in the order it was
+requested, so a store locked by another worker's claim never stalls the event loop; a
+hard crash can lose the few jobs enqueued in the last milliseconds before their rows
+were written.
+
+Workers sharing a store file each own the jobs they enqueue under a lease that they
+renew every JOB_LEASE_SECONDS / 3. A worker only takes over jobs that are unowned
+(released by a drain) or whose owner's lease has expired, so live workers never run each
+other's in-flight jobs, and a dead worker's jobs are claimed by the next worker to look
+once its lease runs out.
+
+Usage:
+    register_job("profiles.create", create_profiles, batch_size=50)
+    get_job_queue().enqueue("profiles.create", {"id": user_id, "username": username})
+"""
+import asyncio
+import inspect
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Deque, Dict, List, Optional
+
+from utils.metrics import JOB_LATENCY, JOBS
+
+logger = logging.getLogger(__name__)
+
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "10000"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "5"))
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH")
+JOB_DRAIN_TIMEOUT = float(os.getenv("JOB_DRAIN_TIMEOUT", "10"))
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+
+# First retry delay in seconds, doubled on each further attempt
+RETRY_BASE_DELAY = 0.5
+
+class JobQueueFull(Exception):
+    """Raised when the queue is at capacity"""
+    pass
+
+@dataclass
+class Job:
+    """One unit of background work"""
+    name: str
+    payload: Dict[str, Any]
+    id: str = field(default_factory=lambda: str(uuid.uuid4()))
+    attempts: int = 0
+
+@dataclass
+class JobType:
+    """
+    Registered handler for one job name
+
+    Attributes:
+        handler: Called with a list of payloads; sync handlers run in a worker thread
+        batch_size: Maximum payloads passed to one handler call
+        max_attempts: Attempts before a job is dropped as dead
+    """
+    handler: Callable[[List[Dict[str, Any]]], Any]
+    batch_size: int = 1
+    max_attempts: int = JOB_MAX_ATTEMPTS
+
+# Job name -> handler
+_job_types: Dict[str, JobType] = {}
+
+def register_job(name: str, handler: Callable[[List[Dict[str, Any]]], Any], batch_size: int = 1, max_attempts: int = JOB_MAX_ATTEMPTS) -> None:
+    """
+    Register the handler for a job name
+
+    Args:
+        name: Job name, e.g. "profiles.create"
+        handler: Function taking a list of payloads; raising fails the whole batch
+        batch_size: Maximum payloads per handler call
+        max_attempts: Attempts before a job is given up on
+    """
+    _job_types[name] = JobType(handler, batch_size, max_attempts)
+
+class SQLiteJobStore:
+    """
+    Durable job log in a local SQLite file, shared by the workers on a host
+
+    Writes are small single-row transactions in WAL mode, cheap enough to run on the
+    request path. Each store instance is one owner: jobs it adds are leased to it, and
+    claim() only takes jobs no live owner holds.
+
+    Args:
+        path: SQLite file
+        lease: Seconds an owner's jobs stay reserved without a renew()
+    """
+    def __init__(self, path: str, lease: float = JOB_LEASE_SECONDS):
+        self.path = path
+        self.lease = lease
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        # Wait for another worker's claim instead of failing with "database is locked"
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, name TEXT NOT NULL, payload TEXT NOT NULL, "
+            "attempts INTEGER NOT NULL DEFAULT 0, status TEXT NOT NULL DEFAULT 'pending', "
+            "created_at REAL NOT NULL, owner TEXT, lease_until REAL)"
+        )
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        # Stores created before leases: existing rows are unowned and claimable
+        if "owner" not in columns:
+            self._db.execute("ALTER TABLE jobs ADD COLUMN owner TEXT")
+            self._db.execute("ALTER TABLE jobs ADD COLUMN lease_until REAL")
+
+    def add(self, job: Job) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO jobs (id, name, payload, attempts, created_at, owner, lease_until) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (job.id, job.name, json.dumps(job.payload, default=str), job.attempts, time.time(), self.owner, time.time() + self.lease)
+            )
+
+    def complete(self, jobs: List[Job]) -> None:
+        with self._lock:
+            self._db.executemany("DELETE FROM jobs WHERE id = ?", [(job.id,) for job in jobs])
+
+    def retry(self, jobs: List[Job]) -> None:
+        with self._lock:
+            self._db.executemany("UPDATE jobs SET attempts = ? WHERE id = ?", [(job.attempts, job.id) for job in jobs])
+
+    def dead(self, jobs: List[Job]) -> None:
+        with self._lock:
+            self._db.executemany("UPDATE jobs SET status = 'dead', attempts = ? WHERE id = ?", [(job.attempts, job.id) for job in jobs])
+
+    def claim(self) -> List[Job]:
+        """
+        Take over pending jobs that are unowned or whose owner's lease has expired
+
+        Returns:
+            List[Job]: The claimed jobs, oldest first
+        """
+        now = time.time()
+        with self._lock:
+            # IMMEDIATE takes the write lock up front, so two workers can't claim the same rows
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self._db.execute(
+                    "SELECT id, name, payload, attempts FROM jobs WHERE status = 'pending' "
+                    "AND (owner IS NULL OR lease_until < ?) ORDER BY created_at",
+                    (now,)
+                ).fetchall()
+                self._db.executemany(
+                    "UPDATE jobs SET owner = ?, lease_until = ? WHERE id = ?",
+                    [(self.owner, now + self.lease, row[0]) for row in rows]
+                )
+                self._db.execute("COMMIT")
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+        return [Job(name=name, payload=json.loads(payload), id=job_id, attempts=attempts) for job_id, name, payload, attempts in rows]
+
+    def renew(self) -> None:
+        """Extend the lease on every pending job this store owns"""
+        with self._lock:
+            self._db.execute(
+                "UPDATE jobs SET lease_until = ? WHERE owner = ? AND status = 'pending'",
+                (time.time() + self.lease, self.owner)
+            )
+
+    def release(self) -> None:
+        """Give up this store's pending jobs so the next worker claims them immediately"""
+        with self._lock:
+            self._db.execute("UPDATE jobs SET owner = NULL, lease_until = NULL WHERE owner = ? AND status = 'pending'", (self.owner,))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+class JobQueue:
+    """
+    In-process async job queue with bounded workers
+
+    Jobs are buffered per name; a worker takes up to batch_size jobs of one name at a
+    time, so a burst of signups becomes a single bulk insert.
+
+    Args:
+        workers: Concurrent handler calls
+        max_size: Maximum jobs waiting (including scheduled retries)
+        store: Optional durable store
+    """
+    def __init__(self, workers: int = JOB_WORKERS, max_size: int = JOB_QUEUE_SIZE, store: Optional[SQLiteJobStore] = None):
+        self.workers = workers
+        self.max_size = max_size
+        self.store = store
+        # Serializes store access off the event loop: SQLite waits up to busy_timeout on a lock
+        self._writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix="job-store") if store is not None else None
+        self.size = 0
+        self._buffers: Dict[str, Deque[Job]] = {}
+        self._ready: Optional[asyncio.Queue] = None
+        self._tasks: List[asyncio.Task] = []
+        self._lease_task: Optional[asyncio.Task] = None
+        # Scheduled retries, cancelled on drain (their jobs stay in the store)
+        self._retries: Dict[str, asyncio.TimerHandle] = {}
+        self._active = 0
+        self._idle: Optional[asyncio.Event] = None
+        self._accepting = True
+
+    @property
+    def running(self) -> bool:
+        return bool(self._tasks)
+
+    async def start(self) -> None:
+        """Start the workers and claim jobs left unfinished by workers that are gone"""
+        self._start_workers()
+        if self.store is not None:
+            await self._claim()
+            if self._lease_task is None:
+                self._lease_task = asyncio.get_running_loop().create_task(self._keep_lease())
+
+    def _persist(self, write: Callable[..., Any], *args: Any) -> "asyncio.Future":
+        """Run a store call on the writer thread, after every call requested before it"""
+        future = asyncio.get_running_loop().run_in_executor(self._writer, write, *args)
+        future.add_done_callback(self._log_store_error)
+        return future
+
+    @staticmethod
+    def _log_store_error(future: "asyncio.Future") -> None:
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(f"Job store write failed: {future.exception()}")
+
+    async def _claim(self) -> None:
+        recovered = await self._persist(self.store.claim)
+        for job in recovered:
+            self._push(job)
+        if recovered:
+            logger.info(f"Recovered {len(recovered)} pending background jobs")
+
+    async def _keep_lease(self) -> None:
+        """Renew this worker's lease and pick up jobs whose owner's lease has run out"""
+        while True:
+            await asyncio.sleep(self.store.lease / 3)
+            try:
+                await self._persist(self.store.renew)
+                if self._accepting:
+                    await self._claim()
+            except Exception as e:
+                logger.error(f"Could not renew the job store lease: {e}")
+
+    def _start_workers(self) -> None:
+        if self._tasks:
+            return
+        loop = asyncio.get_running_loop()
+        self._accepting = True
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        self._tasks = [loop.create_task(self._worker()) for _ in range(self.workers)]
+        # Re-signal anything buffered before the workers existed
+        for name, buffer in self._buffers.items():
+            if buffer:
+                self._ready.put_nowait(name)
+
+    def enqueue(self, name: str, payload: Dict[str, Any]) -> Job:
+        """
+        Add a job; returns once it is buffered (and queued for the store, with one)
+
+        Raises:
+            KeyError: If no handler is registered for the name
+            JobQueueFull: If the queue is at capacity or draining
+        """
+        if name not in _job_types:
+            raise KeyError(f"No handler registered for job {name!r}")
+        if not self._accepting or self.size >= self.max_size:
+            JOBS.inc(name, "rejected")
+            raise JobQueueFull(f"Job queue is {'draining' if not self._accepting else 'full'}")
+        job = Job(name=name, payload=payload)
+        if self.store is not None:
+            self._persist(self.store.add, job)
+        self._start_workers()
+        self._push(job)
+        return job
+
+    def _push(self, job: Job) -> None:
+        buffer = self._buffers.get(job.name)
+        if buffer is None:
+            buffer = self._buffers[job.name] = deque()
+        buffer.append(job)
+        self.size += 1
+        self._idle.clear()
+        if len(buffer) == 1:
+            self._ready.put_nowait(job.name)
+
+    async def _worker(self) -> None:
+        while True:
+            name = await self._ready.get()
+            buffer = self._buffers[name]
+            if not buffer:
+                continue
+            job_type = _job_types[name]
+            batch = [buffer.popleft() for _ in range(min(job_type.batch_size, len(buffer)))]
+            # Let another worker start on the rest while this batch runs
+            if buffer:
+                self._ready.put_nowait(name)
+            self._active += 1
+            try:
+                await self._run(job_type, batch)
+            finally:
+                self._active -= 1
+                self.size -= len(batch)
+                if self.size == 0 and self._active == 0:
+                    self._idle.set()
+
+    async def _run(self, job_type: JobType, batch: List[Job]) -> None:
+        name = batch[0].name
+        start = time.perf_counter()
+        try:
+            payloads = [job.payload for job in batch]
+            if inspect.iscoroutinefunction(job_type.handler):
+                await job_type.handler(payloads)
+            else:
+                # Supabase calls are synchronous; keep them off the event loop
+                await asyncio.to_thread(job_type.handler, payloads)
+        except Exception as e:
+            JOB_LATENCY.observe(time.perf_counter() - start, name)
+            self._fail(job_type, batch, e)
+            return
+        JOB_LATENCY.observe(time.perf_counter() - start, name)
+        JOBS.inc(name, "ok", amount=len(batch))
+        if self.store is not None:
+            self._persist(self.store.complete, batch)
+
+    def _fail(self, job_type: JobType, batch: List[Job], error: Exception) -> None:
+        name = batch[0].name
+        for job in batch:
+            job.attempts += 1
+        retry = [job for job in batch if job.attempts < job_type.max_attempts]
+        dead = [job for job in batch if job.attempts >= job_type.max_attempts]
+
+        if dead:
+            logger.error(f"Giving up on {len(dead)} {name} job(s) after {job_type.max_attempts} attempts: {error}")
+            JOBS.inc(name, "dead", amount=len(dead))
+            if self.store is not None:
+                self._persist(self.store.dead, dead)
+        if retry:
+            delay = RETRY_BASE_DELAY * 2 ** (retry[0].attempts - 1)
+            logger.warning(f"Retrying {len(retry)} {name} job(s) in {delay:.1f}s: {error}")
+            JOBS.inc(name, "retry", amount=len(retry))
+            if self.store is not None:
+                self._persist(self.store.retry, retry)
+            # Scheduled retries still count towards the queue size until they run
+            self.size += len(retry)
+            loop = asyncio.get_running_loop()
+            for job in retry:
+                self._retries[job.id] = loop.call_later(delay, self._requeue, job)
+
+    def _requeue(self, job: Job) -> None:
+        self._retries.pop(job.id, None)
+        # drain() resets the size; never let a late retry take it below zero
+        self.size = max(0, self.size - 1)
+        if self._tasks:
+            self._push(job)
+
+    async def drain(self, timeout: float = JOB_DRAIN_TIMEOUT) -> bool:
+        """
+        Stop accepting jobs, wait for queued ones to finish and stop the workers
+
+        Jobs still queued after the timeout stay in the durable store, if any, for
+        the next start.
+
+        Returns:
+            bool: True if every job finished
+        """
+        if not self._tasks:
+            return self.size == 0
+        self._accepting = False
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            drained = True
+        except asyncio.TimeoutError:
+            logger.warning(f"Job queue drain timed out with {self.size} job(s) left")
+            drained = False
+        for handle in self._retries.values():
+            handle.cancel()
+        self._retries.clear()
+        tasks = self._tasks + ([self._lease_task] if self._lease_task is not None else [])
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+        self._lease_task = None
+        self._buffers.clear()
+        self.size = 0
+        if self.store is not None:
+            # Runs after every write queued before it
+            await self._persist(self.store.release)
+        return drained
+
+# Process-wide queue
+_queue: Optional[JobQueue] = None
+
+def get_job_queue() -> JobQueue:
+    """Get the process-wide job queue, durable when JOB_STORE_PATH is set"""
+    global _queue
+    if _queue is None:
+        store = SQLiteJobStore(JOB_STORE_PATH) if JOB_STORE_PATH else None
+        _queue = JobQueue(store=store)
+    return _queue
+
+def enqueue_job(name: str, payload: Dict[str, Any]) -> Optional[Job]:
+    """
+    Enqueue a job from a request handler, logging instead of failing the request when
+    the queue is full
+
+    Returns:
+        Job or None if it was rejected
+    """
+    try:
+        return get_job_queue().enqueue(name, payload)
+    except JobQueueFull as e:
+        logger.error(f"Dropping {name} job: {e}")
+        return None
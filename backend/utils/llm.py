@@ -2,8 +2,8 @@
 LLM integration module for The Music Besties chat functionality
 """
 import os
-from typing import Dict, Any, List, Optional
-import openai
+import time
+from typing import AsyncIterator, Dict, Any, List, Optional
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -11,9 +11,19 @@ load_dotenv()
 
 # Get OpenAI API key from environment variables
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
+# Optional OpenAI-compatible endpoint, e.g. the local stub in benchmarks/llm_stub.py
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")
 
 # Check if we're in test mode
 from utils.test_config import TEST_MODE
+from utils.metrics import record_llm_call
+
+# Chat completion model
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-3.5-turbo")
+
+# OpenAI clients, created on first use
+_openai_client = None
+_async_openai_client = None
 
 class LLMResponse:
     """Response from LLM with message and additional data"""
@@ -21,95 +31,250 @@ class LLMResponse:
                  message: str, 
                  suggested_actions: Optional[List[Dict[str, Any]]] = None,
                  context_modules: Optional[List[Dict[str, Any]]] = None,
-                 sideboard_content: Optional[Dict[str, Any]] = None):
+                 sideboard_content: Optional[Dict[str, Any]] = None,
+                 component_trigger: Optional[Dict[str, Any]] = None):
         self.message = message
         self.suggested_actions = suggested_actions or []
         self.context_modules = context_modules or []
         self.sideboard_content = sideboard_content
+        self.component_trigger = component_trigger
 
 def get_openai_client():
     """
-    Get the OpenAI client
+    Get the OpenAI client, creating it on first call
     
     Returns:
         OpenAI client instance
     """
+    global _openai_client
+    
+    if _openai_client is not None:
+        return _openai_client
+    
+    if not OPENAI_API_KEY and not TEST_MODE:
+        raise ValueError("OpenAI API Key must be set in environment variables")
+    
+    # Imported here because the openai package dominates API cold-start import time
+    import openai
+    
+    # The SDK requires a key even for keyless OpenAI-compatible endpoints
+    _openai_client = openai.OpenAI(
+        api_key=OPENAI_API_KEY or "test-mode",
+        base_url=OPENAI_BASE_URL or None
+    )
+    return _openai_client
+
+def get_async_openai_client():
+    """
+    Get the asyncio OpenAI client used for streaming, creating it on first call
+    
+    Returns:
+        AsyncOpenAI client instance
+    """
+    global _async_openai_client
+    
+    if _async_openai_client is not None:
+        return _async_openai_client
+    
     if not OPENAI_API_KEY and not TEST_MODE:
         raise ValueError("OpenAI API Key must be set in environment variables")
     
-    # Configure OpenAI with API key
-    openai.api_key = OPENAI_API_KEY
-    return openai
+    import openai
+    
+    _async_openai_client = openai.AsyncOpenAI(
+        api_key=OPENAI_API_KEY or "test-mode",
+        base_url=OPENAI_BASE_URL or None
+    )
+    return _async_openai_client
+
+def _build_messages(
+    message: str,
+    user_profile: Optional[Dict[str, Any]],
+    conversation_history: Optional[List[Dict[str, Any]]],
+    taste_digest: Optional[str] = None
+) -> List[Dict[str, str]]:
+    """Build the chat completion messages: system context, history, then the new message"""
+    return [
+        {"role": "system", "content": _create_system_message(user_profile, taste_digest)},
+        *_format_conversation_history(conversation_history),
+        {"role": "user", "content": message}
+    ]
+
+# Completion parameters shared by every call
+COMPLETION_PARAMS: Dict[str, Any] = {
+    "temperature": 0.7,
+    "max_tokens": 500,
+    "top_p": 1.0,
+    "frequency_penalty": 0.0,
+    "presence_penalty": 0.0
+}
+
+FALLBACK_MESSAGE = "I'm having trouble connecting to my brain right now. Can you try again in a moment?"
+
+def _completion_response(response: Any, elapsed: float) -> LLMResponse:
+    """Record a finished completion and parse it into an LLMResponse"""
+    usage = getattr(response, "usage", None)
+    record_llm_call(
+        OPENAI_MODEL,
+        elapsed,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0
+    )
+    
+    # Extract the response text
+    response_text = response.choices[0].message.content
+    
+    # Parse for any special actions or content
+    # This is a simplified version - you might want to implement a more robust parser
+    suggested_actions, context_modules, sideboard_content = _parse_special_content(response_text)
+    
+    return LLMResponse(
+        message=response_text,
+        suggested_actions=suggested_actions,
+        context_modules=context_modules,
+        sideboard_content=sideboard_content
+    )
 
 def generate_response(
     message: str, 
     user_profile: Optional[Dict[str, Any]] = None,
-    conversation_history: Optional[List[Dict[str, Any]]] = None
+    conversation_history: Optional[List[Dict[str, Any]]] = None,
+    taste_digest: Optional[str] = None
 ) -> LLMResponse:
     """
     Generate a response using OpenAI's GPT model
     
+    Blocks until the completion arrives; async handlers use agenerate_response.
+    
     Args:
         message: User's message
         user_profile: User profile data from Supabase
         conversation_history: Previous messages in the conversation
+        taste_digest: Summary of the user's taste from utils.taste_digest
         
     Returns:
         LLMResponse: Response from the LLM
     """
-    # In test mode, use a mock response
-    if TEST_MODE:
+    # In test mode, use a mock response unless an OpenAI-compatible endpoint is configured
+    if TEST_MODE and not OPENAI_BASE_URL:
         return _generate_test_response(message, user_profile)
     
     try:
-        # Create system message with context about the app and user
-        system_message = _create_system_message(user_profile)
-        
-        # Format conversation history
-        formatted_history = _format_conversation_history(conversation_history)
-        
-        # Add the current user message
-        messages = [
-            {"role": "system", "content": system_message},
-            *formatted_history,
-            {"role": "user", "content": message}
-        ]
-        
-        # Get OpenAI client
+        # System context about the app and user, the history, then the current message
+        messages = _build_messages(message, user_profile, conversation_history, taste_digest)
         client = get_openai_client()
+        start = time.perf_counter()
+        response = client.chat.completions.create(model=OPENAI_MODEL, messages=messages, **COMPLETION_PARAMS)
+        return _completion_response(response, time.perf_counter() - start)
+    except Exception as e:
+        print(f"Error generating LLM response: {e}")
+        # Fallback to a simple response
+        return LLMResponse(message=FALLBACK_MESSAGE)
+
+async def agenerate_response(
+    message: str, 
+    user_profile: Optional[Dict[str, Any]] = None,
+    conversation_history: Optional[List[Dict[str, Any]]] = None,
+    taste_digest: Optional[str] = None
+) -> LLMResponse:
+    """
+    Generate a response using OpenAI's GPT model without blocking the event loop
+    
+    Args:
+        message: User's message
+        user_profile: User profile data from Supabase
+        conversation_history: Previous messages in the conversation
+        taste_digest: Summary of the user's taste from utils.taste_digest
         
-        # Call OpenAI API
-        response = client.chat.completions.create(
-            model="gpt-3.5-turbo",  # You can change to a different model if needed
-            messages=messages,
-            temperature=0.7,
-            max_tokens=500,
-            top_p=1.0,
-            frequency_penalty=0.0,
-            presence_penalty=0.0
-        )
+    Returns:
+        LLMResponse: Response from the LLM
+    """
+    if TEST_MODE and not OPENAI_BASE_URL:
+        return _generate_test_response(message, user_profile)
+    
+    try:
+        messages = _build_messages(message, user_profile, conversation_history, taste_digest)
+        client = get_async_openai_client()
+        start = time.perf_counter()
+        response = await client.chat.completions.create(model=OPENAI_MODEL, messages=messages, **COMPLETION_PARAMS)
+        return _completion_response(response, time.perf_counter() - start)
+    except Exception as e:
+        print(f"Error generating LLM response: {e}")
+        return LLMResponse(message=FALLBACK_MESSAGE)
+
+class LLMStream:
+    """
+    Streams a response from OpenAI's GPT model without blocking the event loop
+    
+    Iterate to receive the reply text in deltas as it is generated; once the
+    iteration finishes, `response` holds the complete LLMResponse.
+    
+    Args:
+        message: User's message
+        user_profile: User profile data from Supabase
+        conversation_history: Previous messages in the conversation
+        taste_digest: Summary of the user's taste from utils.taste_digest
+    """
+    def __init__(
+        self,
+        message: str,
+        user_profile: Optional[Dict[str, Any]] = None,
+        conversation_history: Optional[List[Dict[str, Any]]] = None,
+        taste_digest: Optional[str] = None
+    ):
+        self.message = message
+        self.user_profile = user_profile
+        self.conversation_history = conversation_history
+        self.taste_digest = taste_digest
+        self.response: Optional[LLMResponse] = None
+    
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._generate()
+    
+    async def _generate(self) -> AsyncIterator[str]:
+        # In test mode, stream the mock response word by word
+        if TEST_MODE and not OPENAI_BASE_URL:
+            self.response = _generate_test_response(self.message, self.user_profile)
+            words = self.response.message.split(" ")
+            for i, word in enumerate(words):
+                yield word if i == len(words) - 1 else word + " "
+            return
         
-        # Extract the response text
-        response_text = response.choices[0].message.content
+        parts = []
+        try:
+            client = get_async_openai_client()
+            start = time.perf_counter()
+            stream = await client.chat.completions.create(
+                model=OPENAI_MODEL,
+                messages=_build_messages(self.message, self.user_profile, self.conversation_history, self.taste_digest),
+                stream=True,
+                **COMPLETION_PARAMS
+            )
+            async for chunk in stream:
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    parts.append(delta)
+                    yield delta
+            # Streaming responses carry no usage; count content chunks as completion tokens
+            record_llm_call(OPENAI_MODEL, time.perf_counter() - start, completion_tokens=len(parts))
+        except Exception as e:
+            print(f"Error streaming LLM response: {e}")
+            if not parts:
+                parts.append(FALLBACK_MESSAGE)
+                yield FALLBACK_MESSAGE
         
-        # Parse for any special actions or content
-        # This is a simplified version - you might want to implement a more robust parser
+        response_text = "".join(parts)
         suggested_actions, context_modules, sideboard_content = _parse_special_content(response_text)
-        
-        return LLMResponse(
+        self.response = LLMResponse(
             message=response_text,
             suggested_actions=suggested_actions,
             context_modules=context_modules,
             sideboard_content=sideboard_content
         )
-    except Exception as e:
-        print(f"Error generating LLM response: {e}")
-        # Fallback to a simple response
-        return LLMResponse(
-            message="I'm having trouble connecting to my brain right now. Can you try again in a moment?"
-        )
 
-def _create_system_message(user_profile: Optional[Dict[str, Any]]) -> str:
+def _create_system_message(user_profile: Optional[Dict[str, Any]], taste_digest: Optional[str] = None) -> str:
     """Create a system message with context about the app and user"""
     system_message = """
     You are the AI assistant for Music Besties, an app that helps users curate their music obsessions.
@@ -125,7 +290,9 @@ def _create_system_message(user_profile: Optional[Dict[str, Any]]) -> str:
         
         system_message += f"\n\nYou are speaking with {username}."
         
-        if primary_artist_id:
+        if taste_digest:
+            system_message += f"\n\nWhat you know about their taste:\n{taste_digest}"
+        elif primary_artist_id:
             system_message += f" Their primary music obsession is associated with artist ID: {primary_artist_id}."
     
     return system_message
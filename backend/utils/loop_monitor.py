@@ -0,0 +1,258 @@
+"""
+Event-loop lag monitoring and blocking-call detection for The Music Besties API
+A watchdog thread repeatedly schedules a heartbeat callback on the event loop and times
+how long it waits to run; that delay is the loop lag. When a heartbeat is still pending
+after the blocking threshold, the loop thread is stuck in a callback (typically a sync
+Supabase or OpenAI call inside an async handler), so the watchdog captures that thread's
+stack and the route being served while it is still blocked.
+
+Lag samples and stalls are exported through /metrics. For tests, set LOOP_BLOCK_FAIL_MS
+(or wrap code in assert_no_blocking) to turn any stall over that many milliseconds into
+a BlockingCallError.
+"""
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from collections import deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Deque, List, Optional
+
+from utils.metrics import LOOP_BLOCKS, LOOP_LAG
+
+logger = logging.getLogger(__name__)
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_LAG_INTERVAL = float(os.getenv("LOOP_LAG_INTERVAL_MS", "50")) / 1000
+LOOP_BLOCK_THRESHOLD = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100")) / 1000
+# Test-mode switch: fail requests (and tests) that block the loop longer than this
+LOOP_BLOCK_FAIL = float(os.getenv("LOOP_BLOCK_FAIL_MS", "0")) / 1000 or None
+
+# Stalls kept for inspection
+MAX_RECENT_EVENTS = 100
+
+class BlockingCallError(AssertionError):
+    """Raised in test mode when a handler blocked the event loop"""
+    def __init__(self, events: List["BlockingEvent"]):
+        self.events = events
+        details = "\n\n".join(event.describe() for event in events)
+        super().__init__(f"Event loop blocked {len(events)} time(s):\n\n{details}")
+
+@dataclass
+class BlockingEvent:
+    """
+    One event-loop stall over the blocking threshold
+
+    Attributes:
+        route: Route template (or raw path) being served when the stall was caught
+        stack: Formatted stack of the loop thread while it was blocked
+        duration: Total stall in seconds, or the time blocked so far while still ongoing
+        scope_id: id() of the ASGI scope being served, to attribute the stall to a request
+    """
+    route: str
+    stack: List[str]
+    duration: float
+    scope_id: Optional[int] = None
+
+    def describe(self) -> str:
+        return f"{self.route} blocked the event loop for {self.duration * 1000:.0f}ms at:\n" + "".join(self.stack)
+
+def _find_scope(frame) -> Optional[dict]:
+    """Return the outermost ASGI scope among the locals of a stack of frames"""
+    found = None
+    while frame is not None:
+        scope = frame.f_locals.get("scope")
+        if isinstance(scope, dict) and scope.get("type") in ("http", "websocket"):
+            found = scope
+        frame = frame.f_back
+    return found
+
+class LoopLagMonitor:
+    """
+    Samples event-loop lag and captures the stack of callbacks that block the loop
+
+    Args:
+        interval: Seconds between heartbeats
+        block_threshold: Heartbeat delay in seconds at which the loop counts as blocked
+
+    Attributes:
+        lag: Most recent lag sample in seconds
+        max_lag: Largest lag seen since start
+        events: Recent stalls, newest last
+    """
+    def __init__(self, interval: float = LOOP_LAG_INTERVAL, block_threshold: float = LOOP_BLOCK_THRESHOLD):
+        self.interval = interval
+        self.block_threshold = block_threshold
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.events: Deque[BlockingEvent] = deque(maxlen=MAX_RECENT_EVENTS)
+        # Stall captured while the loop is still blocked, before its duration is known
+        self.pending: Optional[BlockingEvent] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Start watching the current running loop (retargets an already running watchdog)"""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        if not self.running:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._watch, name="loop-lag-monitor", daemon=True)
+            self._thread.start()
+
+    async def stop(self) -> None:
+        if self._thread is not None:
+            self._stop.set()
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    def _watch(self) -> None:
+        while not self._stop.is_set():
+            loop = self._loop
+            if loop is None or loop.is_closed():
+                return
+            beat = threading.Event()
+            posted = time.perf_counter()
+            try:
+                loop.call_soon_threadsafe(beat.set)
+            except RuntimeError:
+                # Loop closed between the check and the call
+                return
+
+            if not beat.wait(self.block_threshold):
+                self.pending = self._capture(time.perf_counter() - posted)
+                while not beat.wait(self.interval):
+                    if self._stop.is_set():
+                        return
+            self.record(time.perf_counter() - posted)
+            self._stop.wait(self.interval)
+
+    def _capture(self, blocked_for: float) -> BlockingEvent:
+        """Snapshot the loop thread while it is blocked"""
+        frame = sys._current_frames().get(self._loop_thread)
+        if frame is None:
+            return BlockingEvent(route="unknown", stack=[], duration=blocked_for)
+        scope = _find_scope(frame)
+        route = "unknown"
+        if scope is not None:
+            route = getattr(scope.get("route"), "path", None) or scope.get("path", "unknown")
+        return BlockingEvent(
+            route=route,
+            stack=traceback.format_stack(frame),
+            duration=blocked_for,
+            scope_id=id(scope) if scope is not None else None
+        )
+
+    def record(self, lag: float) -> None:
+        """Record one lag sample, completing the pending stall if there is one"""
+        self.lag = lag
+        if lag > self.max_lag:
+            self.max_lag = lag
+        LOOP_LAG.observe(lag)
+
+        event, self.pending = self.pending, None
+        if event is not None:
+            event.duration = lag
+            self.events.append(event)
+            LOOP_BLOCKS.observe(lag, event.route)
+            logger.warning(event.describe())
+
+    def events_for(self, scope) -> List[BlockingEvent]:
+        """Stalls attributed to one request, including one still in progress"""
+        scope_id = id(scope)
+        # Read pending first: record() may move it into events in the meantime
+        pending = self.pending
+        found = [event for event in list(self.events) if event.scope_id == scope_id]
+        if pending is not None and pending.scope_id == scope_id and pending not in found:
+            found.append(pending)
+        return found
+
+# Process-wide monitor
+_monitor: Optional[LoopLagMonitor] = None
+
+def get_loop_monitor() -> LoopLagMonitor:
+    """Get the process-wide loop lag monitor"""
+    global _monitor
+    if _monitor is None:
+        threshold = LOOP_BLOCK_THRESHOLD if LOOP_BLOCK_FAIL is None else min(LOOP_BLOCK_THRESHOLD, LOOP_BLOCK_FAIL)
+        _monitor = LoopLagMonitor(block_threshold=threshold)
+    return _monitor
+
+class BlockingCallMiddleware:
+    """
+    Test-mode ASGI middleware that raises BlockingCallError from any request whose
+    handler blocked the event loop for longer than LOOP_BLOCK_FAIL_MS
+
+    Only installed when LOOP_BLOCK_FAIL_MS is set, so production pays nothing for it.
+    The monitor also logs stalls between LOOP_BLOCK_THRESHOLD_MS and the fail threshold;
+    those don't fail the request.
+
+    Args:
+        app: ASGI app to wrap
+        monitor: Loop lag monitor (defaults to the process-wide one)
+        fail_after: Stall in seconds that fails a request (defaults to LOOP_BLOCK_FAIL_MS)
+    """
+    # Heartbeats to wait for the watchdog to complete a stall it caught mid-way
+    SETTLE_BEATS = 10
+
+    def __init__(self, app, monitor: Optional[LoopLagMonitor] = None, fail_after: Optional[float] = LOOP_BLOCK_FAIL):
+        self.app = app
+        self.monitor = monitor or get_loop_monitor()
+        self.fail_after = fail_after if fail_after is not None else self.monitor.block_threshold
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket"):
+            await self.app(scope, receive, send)
+            return
+        self.monitor.start()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            events = await self._stalls(scope)
+        if events:
+            raise BlockingCallError(events)
+
+    async def _stalls(self, scope) -> List[BlockingEvent]:
+        """This request's stalls of at least fail_after, once their durations are final"""
+        events = self.monitor.events_for(scope)
+        # A pending stall holds the time blocked when it was caught; the loop is free
+        # again now, so the watchdog records its full duration on its next beat
+        for _ in range(self.SETTLE_BEATS):
+            if not any(event is self.monitor.pending for event in events):
+                break
+            await asyncio.sleep(self.monitor.interval)
+            events = self.monitor.events_for(scope)
+        return [event for event in events if event.duration >= self.fail_after]
+
+@asynccontextmanager
+async def assert_no_blocking(threshold_ms: float = 50):
+    """
+    Fail if the event loop is blocked for more than threshold_ms inside the block
+
+    Usage:
+        async with assert_no_blocking(20):
+            await client.get("/api/music/artists")
+    """
+    monitor = LoopLagMonitor(interval=threshold_ms / 4000, block_threshold=threshold_ms / 1000)
+    monitor.start()
+    try:
+        yield monitor
+        # Let a stall that ended on the last callback be recorded
+        await asyncio.sleep(monitor.interval * 2)
+    finally:
+        await monitor.stop()
+    events = list(monitor.events)
+    if monitor.pending is not None:
+        events.append(monitor.pending)
+    if events:
+        raise BlockingCallError(events)
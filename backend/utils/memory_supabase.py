@@ -0,0 +1,697 @@
+"""
+In-memory Supabase stand-in for The Music Besties backend
+Implements the PostgREST query-builder chains the routes use (select with embedded
+resources, eq/ilike filters, order, limit, insert, upsert, update, delete) over indexed
+in-memory tables, with optional injected latency so the real route code can be
+load-tested offline. Enable it with SUPABASE_BACKEND=memory.
+
+Read replicas are separate in-memory databases that replay the primary's writes after a
+fixed lag, so replica routing and its consistency can be exercised without Postgres.
+"""
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# Foreign keys used for embedding: (parent table, child table) -> child column referencing parent.id
+RELATIONSHIPS: Dict[Tuple[str, str], str] = {
+    ("artists", "albums"): "artist_id",
+    ("albums", "songs"): "album_id",
+    ("profiles", "user_curations"): "user_id",
+}
+
+# Columns indexed by default, mirroring database/schema-phase1.sql
+DEFAULT_INDEXES: Dict[str, Tuple[str, ...]] = {
+    "albums": ("artist_id",),
+    "songs": ("album_id",),
+    "user_curations": ("user_id", "item_type", "curated_item_id"),
+}
+
+class MemoryResponse:
+    """Response object shaped like postgrest's APIResponse"""
+    def __init__(self, data: List[Dict[str, Any]], count: Optional[int] = None):
+        self.data = data
+        self.count = count
+        self.error = None
+
+class MemoryTable:
+    """Rows of one table plus hash indexes on selected columns"""
+    def __init__(self, name: str):
+        self.name = name
+        self.rows: Dict[str, Dict[str, Any]] = {}
+        self.indexes: Dict[str, Dict[Any, Set[str]]] = {}
+
+    def create_index(self, column: str) -> None:
+        """Build a hash index on a column"""
+        index: Dict[Any, Set[str]] = {}
+        for row_id, row in self.rows.items():
+            index.setdefault(row.get(column), set()).add(row_id)
+        self.indexes[column] = index
+
+    def _index_add(self, row: Dict[str, Any]) -> None:
+        for column, index in self.indexes.items():
+            index.setdefault(row.get(column), set()).add(row["id"])
+
+    def _index_remove(self, row: Dict[str, Any]) -> None:
+        for column, index in self.indexes.items():
+            ids = index.get(row.get(column))
+            if ids is not None:
+                ids.discard(row["id"])
+                if not ids:
+                    del index[row.get(column)]
+
+    def insert(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        now = _now()
+        stored = {"created_at": now, "updated_at": now, **row}
+        stored.setdefault("id", str(uuid.uuid4()))
+        if stored["id"] in self.rows:
+            raise ValueError(f"duplicate key value violates unique constraint \"{self.name}_pkey\"")
+        self.rows[stored["id"]] = stored
+        self._index_add(stored)
+        return stored
+
+    def update(self, row: Dict[str, Any], values: Dict[str, Any]) -> Dict[str, Any]:
+        self._index_remove(row)
+        row.update(values)
+        # Mirrors the update_modified_column trigger
+        row["updated_at"] = _now()
+        self._index_add(row)
+        return row
+
+    def delete(self, row: Dict[str, Any]) -> None:
+        self._index_remove(row)
+        del self.rows[row["id"]]
+
+    def candidates(self, filters: List[Tuple[str, str, Any]]) -> Iterable[Dict[str, Any]]:
+        """Return rows to scan, narrowed through an index when an eq filter allows it"""
+        best: Optional[Set[str]] = None
+        for op, column, value in filters:
+            if op == "in" and column == "id":
+                # Primary key lookups, as Postgres would do for id = ANY(...)
+                return [self.rows[row_id] for row_id in value if row_id in self.rows]
+            if op != "eq":
+                continue
+            if column == "id":
+                row = self.rows.get(value)
+                return [row] if row is not None else []
+            index = self.indexes.get(column)
+            if index is not None:
+                ids = index.get(value, set())
+                if best is None or len(ids) < len(best):
+                    best = ids
+        if best is None:
+            return list(self.rows.values())
+        return [self.rows[row_id] for row_id in best]
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+def _ilike_regex(pattern: str) -> "re.Pattern[str]":
+    """Translate a SQL ILIKE pattern into a compiled regex"""
+    parts = []
+    for char in pattern:
+        if char == "%":
+            parts.append(".*")
+        elif char == "_":
+            parts.append(".")
+        else:
+            parts.append(re.escape(char))
+    return re.compile("^" + "".join(parts) + "$", re.IGNORECASE | re.DOTALL)
+
+def _split_top_level(clause: str) -> List[str]:
+    """Split a select clause on commas that aren't inside parentheses"""
+    parts, depth, current = [], 0, []
+    for char in clause:
+        if char == "," and depth == 0:
+            parts.append("".join(current).strip())
+            current = []
+            continue
+        if char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        current.append(char)
+    if "".join(current).strip():
+        parts.append("".join(current).strip())
+    return parts
+
+def _parse_select(clause: str) -> List[Tuple[str, str, Optional[List[Any]]]]:
+    """
+    Parse a PostgREST select clause
+
+    Returns:
+        List of (output name, source column or table, nested spec or None)
+    """
+    spec = []
+    for part in _split_top_level(clause or "*"):
+        nested = None
+        if "(" in part:
+            head, inner = part.split("(", 1)
+            nested = _parse_select(inner.rsplit(")", 1)[0])
+            part = head.strip()
+        alias, _, source = part.partition(":")
+        if not source:
+            alias = source = part
+        spec.append((alias.strip(), source.strip(), nested))
+    return spec
+
+class MemoryQuery:
+    """PostgREST-style query builder over a MemoryTable"""
+    def __init__(self, client: "MemorySupabaseClient", table: str):
+        self._client = client
+        self._table = table
+        self._operation = "select"
+        self._select = "*"
+        self._values: Any = None
+        self._on_conflict = ("id",)
+        self._filters: List[Tuple[str, str, Any]] = []
+        self._order: List[Tuple[str, bool]] = []
+        self._limit: Optional[int] = None
+
+    # Operations
+    def select(self, *columns: str, count: Optional[str] = None) -> "MemoryQuery":
+        self._operation = "select"
+        self._select = ",".join(columns) if columns else "*"
+        return self
+
+    def insert(self, values: Any, **kwargs) -> "MemoryQuery":
+        self._operation = "insert"
+        self._values = values
+        return self
+
+    def upsert(self, values: Any, on_conflict: str = "id", **kwargs) -> "MemoryQuery":
+        self._operation = "upsert"
+        self._values = values
+        self._on_conflict = tuple(column.strip() for column in on_conflict.split(","))
+        return self
+
+    def update(self, values: Dict[str, Any], **kwargs) -> "MemoryQuery":
+        self._operation = "update"
+        self._values = values
+        return self
+
+    def delete(self, **kwargs) -> "MemoryQuery":
+        self._operation = "delete"
+        return self
+
+    def _conflicting(self, table: MemoryTable, row: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """The row an upsert merges into: same values in every on_conflict column"""
+        if self._on_conflict == ("id",):
+            return table.rows.get(row.get("id"))
+        if any(row.get(column) is None for column in self._on_conflict):
+            return None
+        filters = [("eq", column, row[column]) for column in self._on_conflict]
+        for candidate in table.candidates(filters):
+            if all(candidate.get(column) == row[column] for column in self._on_conflict):
+                return candidate
+        return None
+
+    # Filters and modifiers
+    def eq(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append(("eq", column, value))
+        return self
+
+    def neq(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append(("neq", column, value))
+        return self
+
+    def in_(self, column: str, values: Iterable[Any]) -> "MemoryQuery":
+        self._filters.append(("in", column, set(values)))
+        return self
+
+    def gt(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append(("gt", column, value))
+        return self
+
+    def gte(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append(("gte", column, value))
+        return self
+
+    def lt(self, column: str, value: Any) -> "MemoryQuery":
+        self._filters.append(("lt", column, value))
+        return self
+
+    def ilike(self, column: str, pattern: str) -> "MemoryQuery":
+        self._filters.append(("ilike", column, _ilike_regex(pattern)))
+        return self
+
+    def or_(self, filters: str, **kwargs) -> "MemoryQuery":
+        """PostgREST logic tree, e.g. 'updated_at.gt."t",and(updated_at.eq."t",id.gt."i")'"""
+        self._filters.append(("or", "", _parse_logic(filters)))
+        return self
+
+    def order(self, column: str, desc: bool = False, **kwargs) -> "MemoryQuery":
+        self._order.append((column, desc))
+        return self
+
+    def limit(self, size: int, **kwargs) -> "MemoryQuery":
+        self._limit = size
+        return self
+
+    def execute(self) -> MemoryResponse:
+        self._client.simulate_latency()
+        self._client.replay()
+        if self._operation != "select" and self._client.read_only:
+            raise RuntimeError("cannot execute INSERT, UPDATE or DELETE in a read-only transaction")
+        with self._client.lock:
+            table = self._client.get_table(self._table)
+            if self._operation == "insert":
+                rows = self._values if isinstance(self._values, list) else [self._values]
+                saved = [dict(table.insert(_resolve_now(row))) for row in rows]
+                self._client.log_writes(self._table, "put", saved)
+                return MemoryResponse(saved)
+            if self._operation == "upsert":
+                rows = self._values if isinstance(self._values, list) else [self._values]
+                saved, replaced = [], []
+                for row in rows:
+                    row = _resolve_now(row)
+                    existing = self._conflicting(table, row)
+                    if existing is not None and row.get("id", existing["id"]) != existing["id"]:
+                        # ON CONFLICT DO UPDATE sets the payload's id too: re-key the row
+                        table.delete(existing)
+                        replaced.append(dict(existing))
+                        existing = None
+                        row = {**replaced[-1], **row, "updated_at": _now()}
+                    saved.append(dict(table.update(existing, row) if existing else table.insert(row)))
+                if replaced:
+                    self._client.log_writes(self._table, "delete", replaced)
+                self._client.log_writes(self._table, "put", saved)
+                return MemoryResponse(saved)
+
+            matched = self._match(table)
+            if self._operation == "update":
+                values = _resolve_now(self._values)
+                saved = [dict(table.update(row, values)) for row in matched]
+                self._client.log_writes(self._table, "put", saved)
+                return MemoryResponse(saved)
+            if self._operation == "delete":
+                for row in matched:
+                    table.delete(row)
+                deleted = [dict(row) for row in matched]
+                self._client.log_writes(self._table, "delete", deleted)
+                return MemoryResponse(deleted)
+
+            spec = _parse_select(self._select)
+            data = [self._client.project(self._table, row, spec) for row in matched]
+            return MemoryResponse(data, count=len(data))
+
+    def _match(self, table: MemoryTable) -> List[Dict[str, Any]]:
+        rows = [row for row in table.candidates(self._filters) if _matches(row, self._filters)]
+        # Apply sort keys last-to-first so the first order() call is the primary key
+        for column, desc in reversed(self._order):
+            # PostgREST puts NULLs last for ascending and first for descending order
+            rows.sort(key=lambda row: (row.get(column) is None, row.get(column) if row.get(column) is not None else 0), reverse=desc)
+        if self._limit is not None:
+            rows = rows[:self._limit]
+        return rows
+
+def _split_logic(text: str) -> List[str]:
+    """Split a logic tree's conditions on commas outside parentheses and quotes"""
+    parts, depth, quoted, start = [], 0, False, 0
+    for i, char in enumerate(text):
+        if char == '"':
+            quoted = not quoted
+        elif not quoted and char == "(":
+            depth += 1
+        elif not quoted and char == ")":
+            depth -= 1
+        elif not quoted and depth == 0 and char == ",":
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [part.strip() for part in parts if part.strip()]
+
+def _parse_logic(text: str) -> List[Tuple[str, str, Any]]:
+    """Parse the conditions of an or=(...) / and=(...) PostgREST filter"""
+    conditions = []
+    for part in _split_logic(text):
+        for group in ("and", "or"):
+            if part.startswith(group + "(") and part.endswith(")"):
+                conditions.append((group, "", _parse_logic(part[len(group) + 1:-1])))
+                break
+        else:
+            column, op, value = part.split(".", 2)
+            if value.startswith('"') and value.endswith('"'):
+                value = value[1:-1]
+            conditions.append((op, column, value))
+    return conditions
+
+def _matches(row: Dict[str, Any], filters: List[Tuple[str, str, Any]]) -> bool:
+    for op, column, value in filters:
+        if op == "or":
+            if not any(_matches(row, [condition]) for condition in value):
+                return False
+            continue
+        if op == "and":
+            if not _matches(row, value):
+                return False
+            continue
+        current = row.get(column)
+        if op == "eq" and current != value:
+            return False
+        if op == "neq" and current == value:
+            return False
+        if op == "in" and current not in value:
+            return False
+        if op == "ilike" and (current is None or not value.match(str(current))):
+            return False
+        if op in ("gt", "gte", "lt") and current is None:
+            return False
+        if op == "gt" and not current > value:
+            return False
+        if op == "gte" and not current >= value:
+            return False
+        if op == "lt" and not current < value:
+            return False
+    return True
+
+def _resolve_now(values: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace the "now()" literal the routes send with a timestamp"""
+    return {key: (_now() if value == "now()" else value) for key, value in values.items()}
+
+class _User:
+    def __init__(self, user_id: str, email: Optional[str] = None):
+        self.id = user_id
+        self.email = email
+
+class _UserResponse:
+    def __init__(self, user: _User, session: Any = None):
+        self.user = user
+        self.session = session
+        self.error = None
+
+class _Session:
+    def __init__(self, access_token: str):
+        self.access_token = access_token
+        self.refresh_token = f"refresh-{access_token}"
+
+class MemoryAuth:
+    """Token-to-user auth stand-in; tokens are registered with add_user"""
+    def __init__(self):
+        self.tokens: Dict[str, _User] = {}
+        self._passwords: Dict[str, Tuple[str, _User]] = {}
+
+    def add_user(self, user_id: str, token: Optional[str] = None, email: Optional[str] = None, password: Optional[str] = None) -> str:
+        """Register a user and return their bearer token"""
+        user = _User(user_id, email)
+        token = token or f"token-{user_id}"
+        self.tokens[token] = user
+        if email and password:
+            self._passwords[email] = (password, user)
+        return token
+
+    def get_user(self, jwt: str) -> _UserResponse:
+        user = self.tokens.get(jwt)
+        if user is None:
+            raise ValueError("Invalid JWT token")
+        return _UserResponse(user)
+
+    def sign_up(self, credentials: Dict[str, Any]) -> _UserResponse:
+        user_id = str(uuid.uuid4())
+        token = self.add_user(user_id, email=credentials["email"], password=credentials["password"])
+        return _UserResponse(self.tokens[token], _Session(token))
+
+    def sign_in_with_password(self, credentials: Dict[str, Any]) -> _UserResponse:
+        password, user = self._passwords.get(credentials["email"], (None, None))
+        if user is None or password != credentials["password"]:
+            raise ValueError("Invalid login credentials")
+        token = next(token for token, known in self.tokens.items() if known is user)
+        return _UserResponse(user, _Session(token))
+
+    def sign_out(self, jwt: Optional[str] = None) -> None:
+        return None
+
+def _format_lsn(lsn: int) -> str:
+    """Format a log position like Postgres's pg_lsn ("16/B374D848")"""
+    return f"{lsn >> 32:X}/{lsn & 0xFFFFFFFF:X}"
+
+class _RpcCall:
+    def __init__(self, client: "MemorySupabaseClient", fn: str):
+        self._client = client
+        self._fn = fn
+
+    def execute(self) -> MemoryResponse:
+        self._client.simulate_latency()
+        if self._fn != "wal_lsn":
+            raise ValueError(f"Could not find the function public.{self._fn} in the schema cache")
+        self._client.replay()
+        return MemoryResponse(_format_lsn(self._client.lsn))
+
+class MemorySupabaseClient:
+    """
+    In-memory Supabase client
+
+    Args:
+        latency: Seconds of injected latency per query (blocks, like the real sync client)
+        jitter: Extra uniformly distributed latency in seconds
+    """
+    read_only = False
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0):
+        self.latency = latency
+        self.jitter = jitter
+        self.auth = MemoryAuth()
+        self.tables: Dict[str, MemoryTable] = {}
+        self.lock = threading.RLock()
+        # Replication log: (lsn, written at, table, "put" or "delete", row), kept only
+        # while replicas are attached and trimmed once every replica has replayed it
+        self.lsn = 0
+        self.replicas: List["MemoryReplica"] = []
+        self._log: deque = deque()
+
+    def table(self, table_name: str) -> MemoryQuery:
+        return MemoryQuery(self, table_name)
+
+    def rpc(self, fn: str, params: Optional[Dict[str, Any]] = None) -> _RpcCall:
+        """Call a database function; only wal_lsn (database/schema-replicas.sql) exists"""
+        return _RpcCall(self, fn)
+
+    def replay(self) -> None:
+        """Bring the database up to date before a query; only replicas lag"""
+
+    def log_writes(self, table: str, op: str, rows: List[Dict[str, Any]]) -> None:
+        """Advance the log position and record written rows for replicas (call with the lock held)"""
+        self.lsn += len(rows)
+        if not self.replicas:
+            return
+        now = time.monotonic()
+        lsn = self.lsn - len(rows)
+        for row in rows:
+            lsn += 1
+            self._log.append((lsn, now, table, op, dict(row)))
+
+    def log_since(self, lsn: int, written_before: float) -> List[Tuple[int, float, str, str, Dict[str, Any]]]:
+        """Log entries after a position written before a monotonic time, trimming replayed ones"""
+        with self.lock:
+            replayed = min(replica.lsn for replica in self.replicas)
+            while self._log and self._log[0][0] <= replayed:
+                self._log.popleft()
+            entries = []
+            # Entries are in position and time order
+            for entry in self._log:
+                if entry[1] > written_before:
+                    break
+                if entry[0] > lsn:
+                    entries.append(entry)
+            return entries
+
+    def add_replica(self, lag: float = 0.0, latency: Optional[float] = None) -> "MemoryReplica":
+        """
+        Attach a read replica, starting from a copy of the current data
+
+        Args:
+            lag: Seconds before a write on this client is visible on the replica
+            latency: Per-query latency of the replica (defaults to this client's)
+
+        Returns:
+            MemoryReplica: The replica
+        """
+        with self.lock:
+            replica = MemoryReplica(self, lag, self.latency if latency is None else latency, self.jitter)
+            for name, table in self.tables.items():
+                replica.seed(name, (dict(row) for row in table.rows.values()))
+            replica.lsn = self.lsn
+            self.replicas.append(replica)
+        return replica
+
+    def get_table(self, name: str) -> MemoryTable:
+        """Get a table, creating it with its default indexes on first use"""
+        table = self.tables.get(name)
+        if table is None:
+            table = self.tables[name] = MemoryTable(name)
+            for column in DEFAULT_INDEXES.get(name, ()):
+                table.create_index(column)
+        return table
+
+    def simulate_latency(self) -> None:
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            time.sleep(delay)
+
+    def project(self, table: str, row: Dict[str, Any], spec: List[Tuple[str, str, Optional[List[Any]]]]) -> Dict[str, Any]:
+        """Shape a row according to a parsed select clause, resolving embedded resources"""
+        result: Dict[str, Any] = {}
+        for alias, source, nested in spec:
+            if nested is None:
+                if source == "*":
+                    result.update(row)
+                else:
+                    result[alias] = row.get(source)
+                continue
+
+            child_fk = RELATIONSHIPS.get((table, source))
+            if child_fk is not None:
+                # One-to-many: embed child rows referencing this row
+                children = self.get_table(source).candidates([("eq", child_fk, row["id"])])
+                result[alias] = [
+                    self.project(source, child, nested)
+                    for child in children if child.get(child_fk) == row["id"]
+                ]
+                continue
+
+            parent_fk = RELATIONSHIPS.get((source, table))
+            if parent_fk is not None:
+                # Many-to-one: embed the referenced parent row
+                parent = self.get_table(source).rows.get(row.get(parent_fk))
+                result[alias] = self.project(source, parent, nested) if parent else None
+                continue
+
+            raise ValueError(f"Could not find a relationship between '{table}' and '{source}'")
+        return result
+
+    def seed(self, table: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """Bulk-load rows without latency"""
+        with self.lock:
+            target = self.get_table(table)
+            saved = [target.insert(row) for row in rows]
+            self.log_writes(table, "put", saved)
+
+class MemoryReplica(MemorySupabaseClient):
+    """
+    Read-only copy of a MemorySupabaseClient that replays its writes after a lag
+
+    Replay is lazy: each query first applies the primary's writes that are at least
+    `lag` seconds old, so a read can observe exactly what a lagging streaming replica
+    would. lsn is the last replayed position, which wal_lsn reports like
+    pg_last_wal_replay_lsn() on a Postgres standby.
+
+    Args:
+        primary: Client whose writes are replayed
+        lag: Replication delay in seconds
+        latency: Seconds of injected latency per query
+        jitter: Extra uniformly distributed latency in seconds
+    """
+    read_only = True
+
+    def __init__(self, primary: MemorySupabaseClient, lag: float, latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(latency, jitter)
+        self.primary = primary
+        self.lag = lag
+        self.auth = primary.auth
+
+    def replay(self) -> None:
+        entries = self.primary.log_since(self.lsn, time.monotonic() - self.lag)
+        if not entries:
+            return
+        with self.lock:
+            for lsn, _, name, op, row in entries:
+                if lsn <= self.lsn:
+                    continue
+                table = self.get_table(name)
+                existing = table.rows.get(row["id"])
+                if op == "delete":
+                    if existing is not None:
+                        table.delete(existing)
+                elif existing is not None:
+                    table._index_remove(existing)
+                    existing.clear()
+                    existing.update(row)
+                    table._index_add(existing)
+                else:
+                    table.insert(dict(row))
+                self.lsn = lsn
+
+def seed_synthetic(
+    client: MemorySupabaseClient,
+    artists: int = 20,
+    albums_per_artist: int = 8,
+    tracks_per_album: int = 12,
+    users: int = 100,
+    curations_per_user: int = 20,
+    seed: int = 0
+) -> Dict[str, List[str]]:
+    """
+    Fill a client with a synthetic catalog, profiles and curations
+
+    Returns:
+        Dict of generated ids per table plus "tokens" for the users
+    """
+    rng = random.Random(seed)
+    ids: Dict[str, List[str]] = {"artists": [], "albums": [], "songs": [], "profiles": [], "tokens": []}
+
+    for a in range(artists):
+        artist_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        ids["artists"].append(artist_id)
+        client.seed("artists", [{"id": artist_id, "name": f"Artist {a}", "genre": rng.choice(["Pop", "Rock", "Indie", "Folk"]), "image_url": None}])
+        for b in range(albums_per_artist):
+            album_id = str(uuid.UUID(int=rng.getrandbits(128)))
+            ids["albums"].append(album_id)
+            client.seed("albums", [{"id": album_id, "artist_id": artist_id, "title": f"Album {a}-{b}", "release_year": 2000 + b, "image_url": None}])
+            songs = []
+            for t in range(tracks_per_album):
+                song_id = str(uuid.UUID(int=rng.getrandbits(128)))
+                ids["songs"].append(song_id)
+                songs.append({"id": song_id, "album_id": album_id, "title": f"Track {a}-{b}-{t}", "duration": rng.randint(120, 420), "track_number": t + 1})
+            client.seed("songs", songs)
+
+    for u in range(users):
+        user_id = str(uuid.UUID(int=rng.getrandbits(128)))
+        ids["profiles"].append(user_id)
+        ids["tokens"].append(client.auth.add_user(user_id, email=f"user{u}@example.com"))
+        client.seed("profiles", [{"id": user_id, "username": f"user{u}", "avatar_url": None, "primary_artist_id": rng.choice(ids["artists"]) if ids["artists"] else None}])
+        # Sampled without replacement: a user curates each item at most once
+        songs = sum(rng.random() < 0.7 for _ in range(curations_per_user))
+        picks = [(song_id, "song") for song_id in rng.sample(ids["songs"], min(songs, len(ids["songs"])))]
+        picks += [(album_id, "album") for album_id in rng.sample(ids["albums"], min(curations_per_user - songs, len(ids["albums"])))]
+        client.seed("user_curations", [{
+            "user_id": user_id,
+            "curated_item_id": item_id,
+            "item_type": item_type,
+            "rating": rng.randint(1, 5),
+            "comment": None,
+            "weighted_rank_percentage": rng.randint(0, 100)
+        } for item_id, item_type in picks])
+
+    return ids
+
+# Shared instance used when SUPABASE_BACKEND=memory
+_memory_client: Optional[MemorySupabaseClient] = None
+_memory_lock = threading.Lock()
+
+def get_memory_client() -> MemorySupabaseClient:
+    """
+    Get the process-wide in-memory client, seeding it from the environment on first use
+
+    MEMORY_DB_LATENCY_MS and MEMORY_DB_JITTER_MS inject per-query latency;
+    MEMORY_DB_SEED=true loads the default synthetic fixtures. MEMORY_DB_REPLICAS
+    attaches that many read replicas, each MEMORY_DB_REPLICA_LAG_MS behind.
+    """
+    global _memory_client
+    if _memory_client is None:
+        with _memory_lock:
+            if _memory_client is None:
+                client = MemorySupabaseClient(
+                    latency=float(os.getenv("MEMORY_DB_LATENCY_MS", "0")) / 1000,
+                    jitter=float(os.getenv("MEMORY_DB_JITTER_MS", "0")) / 1000
+                )
+                for _ in range(int(os.getenv("MEMORY_DB_REPLICAS", "0"))):
+                    client.add_replica(lag=float(os.getenv("MEMORY_DB_REPLICA_LAG_MS", "200")) / 1000)
+                if os.getenv("MEMORY_DB_SEED", "false").lower() == "true":
+                    seed_synthetic(client)
+                _memory_client = client
+    return _memory_client
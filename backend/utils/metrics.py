@@ -0,0 +1,268 @@
+"""
+Request-scoped performance instrumentation for The Music Besties API
+Records per-route latency, database and LLM timings and cache hit rates, renders them
+in Prometheus text format for /metrics and adds a Server-Timing header to each response
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+# Latency buckets in seconds
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+class Histogram:
+    """Labelled histogram with fixed cumulative buckets"""
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str], buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self.buckets = tuple(buckets)
+        self._series: Dict[Tuple[str, ...], List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        """Record one observation for a label set"""
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                # One slot per bucket, then +Inf, count and sum
+                series = self._series[labels] = [0.0] * (len(self.buckets) + 3)
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        """Render the histogram in Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            snapshot = {labels: list(series) for labels, series in self._series.items()}
+        for labels, series in snapshot.items():
+            base = _format_labels(self.label_names, labels)
+            cumulative = 0.0
+            for bound, count in zip(self.buckets + (float("inf"),), series):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                le_label = 'le="' + le + '"'
+                lines.append(f"{self.name}_bucket{_join_labels(base, le_label)} {cumulative:g}")
+            lines.append(f"{self.name}_count{_join_labels(base)} {series[-2]:g}")
+            lines.append(f"{self.name}_sum{_join_labels(base)} {series[-1]}")
+        return lines
+
+class Counter:
+    """Labelled monotonically increasing counter"""
+    def __init__(self, name: str, help_text: str, label_names: Sequence[str]):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = tuple(label_names)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1) -> None:
+        """Increment the counter for a label set"""
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels: str) -> float:
+        """Current value for a label set"""
+        return self._values.get(labels, 0)
+
+    def render(self) -> List[str]:
+        """Render the counter in Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in snapshot.items():
+            lines.append(f"{self.name}{_join_labels(_format_labels(self.label_names, labels))} {value:g}")
+        return lines
+
+def _format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    """Format label pairs without braces"""
+    return ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+
+def _join_labels(*parts: str) -> str:
+    """Wrap non-empty label strings in braces"""
+    joined = ",".join(part for part in parts if part)
+    return f"{{{joined}}}" if joined else ""
+
+def _escape(value: Any) -> str:
+    """Escape a label value for the text exposition format"""
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+# Metric families
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "HTTP request latency by route", ("method", "route", "status"))
+DB_LATENCY = Histogram("db_query_duration_seconds", "Supabase query latency by table", ("table",))
+DB_QUERIES_PER_REQUEST = Histogram(
+    "db_queries_per_request", "Supabase queries issued per HTTP request", ("route",),
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50)
+)
+LLM_LATENCY = Histogram("llm_request_duration_seconds", "LLM completion latency by model", ("model",))
+LLM_TOKENS = Counter("llm_tokens_total", "LLM tokens consumed", ("model", "kind"))
+CACHE_REQUESTS = Counter("cache_requests_total", "Cache lookups by cache and result", ("cache", "result"))
+
+LOOP_LAG = Histogram(
+    "event_loop_lag_seconds", "Delay before a callback scheduled on the event loop runs", (),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+)
+LOOP_BLOCKS = Histogram("event_loop_block_duration_seconds", "Event loop stalls over the blocking threshold by route", ("route",))
+JOBS = Counter("background_jobs_total", "Background jobs by name and result", ("name", "result"))
+JOB_LATENCY = Histogram("background_job_duration_seconds", "Background job batch run time by name", ("name",))
+WRITE_BUFFER_ROWS = Counter("write_buffer_rows_total", "Rows put into and written from write buffers", ("table", "kind"))
+WRITE_BUFFER_FLUSHES = Counter("write_buffer_flushes_total", "Write buffer flushes by result", ("table", "result"))
+CHANGE_FEED_ROWS = Counter("change_feed_rows_total", "Changed rows dispatched by the change feed by table", ("table",))
+CHANGE_FEED_LAG = Histogram(
+    "change_feed_lag_seconds", "Delay from a row's updated_at to its cache invalidation by table", ("table",),
+    buckets=(0.1, 0.25, 0.5, 1.0, 2.0, 3.0, 5.0, 10.0, 30.0, 60.0)
+)
+REPLICA_READS = Counter("db_reads_total", "Database reads by where they were served and why", ("target", "reason"))
+PUBSUB_EVENTS = Counter("pubsub_events_total", "Notification deliveries by topic kind and result", ("topic_kind", "result"))
+
+REGISTRY = [
+    REQUEST_LATENCY, DB_LATENCY, DB_QUERIES_PER_REQUEST, LLM_LATENCY, LLM_TOKENS, CACHE_REQUESTS,
+    LOOP_LAG, LOOP_BLOCKS, JOBS, JOB_LATENCY, PUBSUB_EVENTS, WRITE_BUFFER_ROWS, WRITE_BUFFER_FLUSHES,
+    CHANGE_FEED_ROWS, CHANGE_FEED_LAG, REPLICA_READS
+]
+
+def render_metrics() -> str:
+    """Render every registered metric in Prometheus text format"""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+class RequestTimings:
+    """Per-request accumulator for Server-Timing"""
+    __slots__ = ("db_calls", "db_seconds", "llm_calls", "llm_seconds")
+
+    def __init__(self):
+        self.db_calls = 0
+        self.db_seconds = 0.0
+        self.llm_calls = 0
+        self.llm_seconds = 0.0
+
+_current_timings: ContextVar[Optional[RequestTimings]] = ContextVar("request_timings", default=None)
+
+def record_db_call(table: str, seconds: float) -> None:
+    """Record one Supabase query"""
+    DB_LATENCY.observe(seconds, table)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.db_calls += 1
+        timings.db_seconds += seconds
+
+def record_llm_call(model: str, seconds: float, prompt_tokens: int = 0, completion_tokens: int = 0) -> None:
+    """Record one LLM completion and its token usage"""
+    LLM_LATENCY.observe(seconds, model)
+    if prompt_tokens:
+        LLM_TOKENS.inc(model, "prompt", amount=prompt_tokens)
+    if completion_tokens:
+        LLM_TOKENS.inc(model, "completion", amount=completion_tokens)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.llm_calls += 1
+        timings.llm_seconds += seconds
+
+def record_cache_lookup(cache: str, hit: bool) -> None:
+    """Record a cache hit or miss"""
+    CACHE_REQUESTS.inc(cache, "hit" if hit else "miss")
+
+class _InstrumentedQuery:
+    """Wraps a PostgREST query builder so execute() is timed"""
+    __slots__ = ("_builder", "_table")
+
+    def __init__(self, builder: Any, table: str):
+        self._builder = builder
+        self._table = table
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._builder, name)
+        if not callable(attr):
+            return attr
+
+        def call(*args, **kwargs):
+            result = attr(*args, **kwargs)
+            # Keep wrapping the fluent chain until execute()
+            if hasattr(result, "execute"):
+                return _InstrumentedQuery(result, self._table)
+            return result
+        return call
+
+    def execute(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return self._builder.execute()
+        finally:
+            record_db_call(self._table, time.perf_counter() - start)
+
+class InstrumentedSupabaseClient:
+    """Supabase client proxy that records query counts and durations"""
+    def __init__(self, client: Any):
+        self._client = client
+
+    def table(self, table_name: str) -> _InstrumentedQuery:
+        return _InstrumentedQuery(self._client.table(table_name), table_name)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._client, name)
+
+def instrument_supabase(client: Any) -> Any:
+    """
+    Wrap a Supabase client so its queries are recorded
+
+    Args:
+        client: Real or mock Supabase client (None passes through)
+
+    Returns:
+        The instrumented client
+    """
+    if client is None or isinstance(client, InstrumentedSupabaseClient):
+        return client
+    return InstrumentedSupabaseClient(client)
+
+class MetricsMiddleware:
+    """
+    ASGI middleware recording per-route latency and adding a Server-Timing header
+
+    Implemented as raw ASGI rather than BaseHTTPMiddleware to keep per-request
+    overhead in the low microseconds.
+    """
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        timings = RequestTimings()
+        token = _current_timings.set(timings)
+        start = time.perf_counter()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                server_timing = (
+                    f"app;dur={elapsed_ms:.2f}, "
+                    f"db;dur={timings.db_seconds * 1000:.2f};desc=\"{timings.db_calls} queries\""
+                )
+                if timings.llm_calls:
+                    server_timing += f", llm;dur={timings.llm_seconds * 1000:.2f}"
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", server_timing.encode("latin-1"))]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = scope.get("route")
+            route_path = getattr(route, "path", None) or "unmatched"
+            REQUEST_LATENCY.observe(time.perf_counter() - start, scope["method"], route_path, str(status))
+            DB_QUERIES_PER_REQUEST.observe(timings.db_calls, route_path)
+            _current_timings.reset(token)
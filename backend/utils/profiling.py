@@ -0,0 +1,392 @@
+"""
+On-demand profiling for The Music Besties API
+Profiles one request, or every request on one worker for a few seconds, without a
+redeploy. Requires PROFILING_TOKEN; when it is unset neither the middleware nor the
+/debug routes are installed, so normal traffic pays nothing.
+
+Per request, send X-Profile: sample or X-Profile: trace with X-Profile-Token (or the
+_profile and _profile_token query parameters). The response is unchanged apart from an
+X-Profile header carrying the profile id; fetch the profile from GET /debug/profiles/{id}.
+
+    sample  A thread samples the event loop's stack every PROFILE_SAMPLE_INTERVAL_MS.
+            Samples are attributed to the request through its ASGI scope, so other
+            requests interleaving on the loop are left out. While the request is
+            suspended (awaiting the database, the LLM, a thread), its await chain is
+            recorded instead, so the profile covers wall time. Output is speedscope
+            JSON (https://www.speedscope.app).
+    trace   cProfile for the duration of the request: exact call counts, but every
+            coroutine step on the loop is included, so profile a quiet worker. Output
+            is the top functions by cumulative time.
+
+POST /debug/profile?seconds=N samples the loop of the worker that receives it for N
+seconds and returns one speedscope profile per route. Only one profile runs per worker
+at a time; a request asking for another gets X-Profile: busy.
+
+Profiles are kept in memory (the last PROFILE_KEEP) and, if PROFILE_DIR is set, written
+there so any worker sharing the directory can serve them.
+"""
+import asyncio
+import cProfile
+import hmac
+import json
+import logging
+import os
+import pstats
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs
+
+logger = logging.getLogger(__name__)
+
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN", "")
+PROFILING_ENABLED = bool(PROFILING_TOKEN)
+PROFILE_DIR = os.getenv("PROFILE_DIR")
+PROFILE_SAMPLE_INTERVAL = float(os.getenv("PROFILE_SAMPLE_INTERVAL_MS", "1")) / 1000
+PROFILE_SESSION_MAX_SECONDS = float(os.getenv("PROFILE_SESSION_MAX_SECONDS", "300"))
+PROFILE_KEEP = int(os.getenv("PROFILE_KEEP", "20"))
+
+PROFILE_MODES = ("sample", "trace")
+# Functions listed in a trace profile
+TRACE_TOP_FUNCTIONS = 100
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+def check_token(token: Optional[str]) -> bool:
+    """Constant-time check of a profiling token"""
+    return PROFILING_ENABLED and token is not None and hmac.compare_digest(token.encode("utf-8"), PROFILING_TOKEN.encode("utf-8"))
+
+def _route_label(scope: dict) -> str:
+    route = getattr(scope.get("route"), "path", None) or scope.get("path", "unknown")
+    return f"{scope.get('method', 'WS')} {route}"
+
+# Frame key: (qualified name, file, first line)
+FrameKey = Tuple[str, str, int]
+
+class StackSampler:
+    """
+    Samples one thread's Python stack from a background thread
+
+    Args:
+        thread_id: Thread to sample (the event loop's)
+        interval: Seconds between samples
+        scope: Request mode: keep only samples serving this ASGI scope
+        task: Request mode: task serving the scope, whose await chain is sampled while
+            it is suspended
+    """
+    def __init__(self, thread_id: int, interval: float = PROFILE_SAMPLE_INTERVAL, scope: Optional[dict] = None, task: Optional[asyncio.Task] = None):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.scope = scope
+        self.task = task
+        self.frames: List[Dict[str, Any]] = []
+        self._frame_index: Dict[FrameKey, int] = {}
+        # Samples and weights (ms) per profile name
+        self.profiles: Dict[str, Tuple[List[List[int]], List[float]]] = {}
+        # Code objects with a local named scope, so only those frames' locals are read
+        self._has_scope: Dict[Any, bool] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+        self._switch_interval: Optional[float] = None
+
+    def start(self) -> None:
+        # A busy loop thread only hands over the GIL every switch interval (5ms by
+        # default); shorten it while sampling so samples land on time
+        self._switch_interval = sys.getswitchinterval()
+        sys.setswitchinterval(min(self._switch_interval, self.interval / 2))
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+            self._thread = None
+        if self._switch_interval is not None:
+            sys.setswitchinterval(self._switch_interval)
+            self._switch_interval = None
+
+    def _run(self) -> None:
+        last = time.perf_counter()
+        while not self._stop.wait(self.interval):
+            now = time.perf_counter()
+            try:
+                self._sample((now - last) * 1000)
+            except Exception as e:  # Never let a racy read kill the sampler
+                logger.debug(f"Dropped profile sample: {e}")
+            last = now
+
+    def _frame(self, key: FrameKey) -> int:
+        index = self._frame_index.get(key)
+        if index is None:
+            index = self._frame_index[key] = len(self.frames)
+            name, file, line = key
+            self.frames.append({"name": name, "file": file, "line": line})
+        return index
+
+    def _code_frame(self, code) -> int:
+        return self._frame((code.co_qualname, code.co_filename, code.co_firstlineno))
+
+    def _record(self, name: str, stack: List[int], weight: float) -> None:
+        samples, weights = self.profiles.setdefault(name, ([], []))
+        samples.append(stack)
+        weights.append(weight)
+
+    def _sample(self, weight: float) -> None:
+        frame = sys._current_frames().get(self.thread_id)
+        stack: List[int] = []
+        scope = None
+        while frame is not None:
+            code = frame.f_code
+            stack.append(self._code_frame(code))
+            has_scope = self._has_scope.get(code)
+            if has_scope is None:
+                # Parameters captured by a closure are cell variables
+                has_scope = self._has_scope[code] = "scope" in code.co_varnames or "scope" in code.co_cellvars
+            if has_scope:
+                local = frame.f_locals.get("scope")
+                if isinstance(local, dict) and local.get("type") in ("http", "websocket"):
+                    # Outermost wins, as in the loop monitor
+                    scope = local
+            frame = frame.f_back
+        stack.reverse()
+
+        if self.scope is None:
+            self._record(_route_label(scope) if scope is not None else "(outside requests)", stack, weight)
+        elif scope is self.scope:
+            self._record("request", stack, weight)
+        elif self.task is not None and not self.task.done():
+            self._record("request", self._await_chain(), weight)
+
+    def _await_chain(self) -> List[int]:
+        """Where the request task is suspended, outermost coroutine first"""
+        stack = []
+        awaitable = self.task.get_coro()
+        while awaitable is not None:
+            frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+            if frame is None:
+                break
+            stack.append(self._code_frame(frame.f_code))
+            awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+        stack.append(self._frame(("(awaiting)", "", 0)))
+        return stack
+
+    def speedscope(self, name: str) -> Dict[str, Any]:
+        """The samples as a speedscope file, one sampled profile per name"""
+        profiles = []
+        for profile_name, (samples, weights) in sorted(self.profiles.items(), key=lambda item: -sum(item[1][1])):
+            total = sum(weights)
+            profiles.append({
+                "type": "sampled",
+                "name": profile_name,
+                "unit": "milliseconds",
+                "startValue": 0,
+                "endValue": total,
+                "samples": samples,
+                "weights": weights
+            })
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "the-music-besties",
+            "activeProfileIndex": 0,
+            "shared": {"frames": self.frames},
+            "profiles": profiles
+        }
+
+def trace_summary(profiler: cProfile.Profile, name: str, elapsed: float) -> Dict[str, Any]:
+    """Top functions of a cProfile run by cumulative time"""
+    stats = pstats.Stats(profiler).stats
+    rows = sorted(stats.items(), key=lambda item: item[1][3], reverse=True)[:TRACE_TOP_FUNCTIONS]
+    return {
+        "type": "trace",
+        "name": name,
+        "duration_ms": round(elapsed * 1000, 3),
+        "functions": [
+            {
+                "function": function,
+                "file": file,
+                "line": line,
+                "calls": calls,
+                "primitive_calls": primitive,
+                "self_ms": round(self_time * 1000, 3),
+                "cumulative_ms": round(cumulative * 1000, 3)
+            }
+            for (file, line, function), (primitive, calls, self_time, cumulative, _) in rows
+        ]
+    }
+
+class ProfileStore:
+    """
+    Recent profiles of this worker, optionally mirrored to PROFILE_DIR
+
+    Args:
+        keep: Profiles kept in memory
+        directory: Directory profiles are also written to
+    """
+    def __init__(self, keep: int = PROFILE_KEEP, directory: Optional[str] = PROFILE_DIR):
+        self.keep = keep
+        self.directory = directory
+        self._profiles: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+
+    def create(self, name: str, mode: str) -> str:
+        """Register a running profile and return its id"""
+        profile_id = uuid.uuid4().hex[:12]
+        self._profiles[profile_id] = {"id": profile_id, "name": name, "mode": mode, "status": "running", "created_at": time.time()}
+        while len(self._profiles) > self.keep:
+            self._profiles.popitem(last=False)
+        return profile_id
+
+    def finish(self, profile_id: str, profile: Dict[str, Any]) -> None:
+        entry = self._profiles.get(profile_id)
+        if entry is None:
+            return
+        entry["status"] = "done"
+        entry["profile"] = profile
+        if self.directory:
+            try:
+                with open(os.path.join(self.directory, f"{profile_id}.json"), "w") as f:
+                    json.dump(profile, f)
+            except OSError as e:
+                logger.error(f"Could not write profile {profile_id}: {e}")
+
+    def list(self) -> List[Dict[str, Any]]:
+        return [{key: value for key, value in entry.items() if key != "profile"} for entry in reversed(self._profiles.values())]
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """A profile entry by id, reading PROFILE_DIR for profiles from other workers"""
+        entry = self._profiles.get(profile_id)
+        if entry is not None:
+            return entry
+        if self.directory and profile_id.isalnum():
+            path = os.path.join(self.directory, f"{profile_id}.json")
+            if os.path.exists(path):
+                with open(path) as f:
+                    return {"id": profile_id, "status": "done", "profile": json.load(f)}
+        return None
+
+class Profiler:
+    """The worker's profiling state: one profile at a time, and the profile store"""
+    def __init__(self, store: Optional[ProfileStore] = None):
+        self.store = store or ProfileStore()
+        self.busy = False
+        self._session: Optional[asyncio.Task] = None
+
+    async def profile_request(self, mode: str, scope: dict, call) -> None:
+        """Run call() (the rest of the ASGI app) under a profiler"""
+        name = f"{scope.get('method')} {scope.get('path')} ({mode})"
+        profile_id = scope["profile_id"] = self.store.create(name, mode)
+        self.busy = True
+        try:
+            if mode == "trace":
+                profiler = cProfile.Profile()
+                start = time.perf_counter()
+                profiler.enable()
+                try:
+                    await call()
+                finally:
+                    profiler.disable()
+                    self.store.finish(profile_id, trace_summary(profiler, name, time.perf_counter() - start))
+            else:
+                sampler = StackSampler(threading.get_ident(), scope=scope, task=asyncio.current_task())
+                sampler.start()
+                try:
+                    await call()
+                finally:
+                    await sampler.stop()
+                    self.store.finish(profile_id, sampler.speedscope(name))
+        finally:
+            self.busy = False
+
+    def start_session(self, seconds: float, interval: float = PROFILE_SAMPLE_INTERVAL) -> str:
+        """
+        Sample every request on this worker for a while
+
+        Returns:
+            str: Profile id, ready once the session ends
+        """
+        seconds = min(seconds, PROFILE_SESSION_MAX_SECONDS)
+        name = f"worker {os.getpid()} ({seconds:g}s)"
+        profile_id = self.store.create(name, "session")
+        self.busy = True
+        sampler = StackSampler(threading.get_ident(), interval=interval)
+        sampler.start()
+
+        async def finish():
+            try:
+                await asyncio.sleep(seconds)
+            finally:
+                await sampler.stop()
+                self.store.finish(profile_id, sampler.speedscope(name))
+                self.busy = False
+        # Keep a reference so the session isn't garbage collected mid-run
+        self._session = asyncio.get_running_loop().create_task(finish())
+        return profile_id
+
+# Process-wide profiler
+_profiler: Optional[Profiler] = None
+
+def get_profiler() -> Profiler:
+    """Get the process-wide profiler"""
+    global _profiler
+    if _profiler is None:
+        _profiler = Profiler()
+    return _profiler
+
+def _requested(scope: dict) -> Tuple[Optional[str], Optional[str]]:
+    """Profile mode and token from the X-Profile headers or query parameters"""
+    mode = token = None
+    for key, value in scope["headers"]:
+        if key == b"x-profile":
+            mode = value.decode("latin-1").strip().lower()
+        elif key == b"x-profile-token":
+            token = value.decode("latin-1")
+    query = scope.get("query_string", b"")
+    if mode is None and b"_profile=" in query:
+        params = parse_qs(query.decode("latin-1"))
+        mode = params.get("_profile", [None])[0]
+        token = token or params.get("_profile_token", [None])[0]
+    return mode, token
+
+class ProfilingMiddleware:
+    """
+    ASGI middleware profiling requests that ask for it with a valid token
+
+    Only installed when PROFILING_TOKEN is set. The result is reported in an X-Profile
+    header (the profile id, or busy, denied or invalid).
+    """
+    def __init__(self, app, profiler: Optional[Profiler] = None):
+        self.app = app
+        self.profiler = profiler or get_profiler()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        mode, token = _requested(scope)
+        if mode is None:
+            await self.app(scope, receive, send)
+            return
+
+        if not check_token(token):
+            outcome = "denied"
+        elif mode not in PROFILE_MODES:
+            outcome = "invalid"
+        elif self.profiler.busy:
+            outcome = "busy"
+        else:
+            outcome = None
+
+        async def send_with_outcome(message):
+            if message["type"] == "http.response.start":
+                value = outcome or scope.get("profile_id", "")
+                message["headers"] = list(message.get("headers", [])) + [(b"x-profile", value.encode("latin-1"))]
+            await send(message)
+
+        if outcome is not None:
+            await self.app(scope, receive, send_with_outcome)
+            return
+        await self.profiler.profile_request(mode, scope, lambda: self.app(scope, receive, send_with_outcome))
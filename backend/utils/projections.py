@@ -0,0 +1,81 @@
+"""
+Row projections for The Music Besties database queries
+Each route declares the exact columns it needs as a slotted dataclass; the select clause
+is derived from the dataclass fields and rows come back as lightweight records that the
+fast JSON encoder serializes directly.
+"""
+from dataclasses import dataclass, fields
+from typing import Any, Dict, Iterable, List, Optional, Type, TypeVar
+
+RowT = TypeVar("RowT")
+
+@dataclass(slots=True)
+class ArtistRow:
+    id: str
+    name: str
+    genre: Optional[str] = None
+    image_url: Optional[str] = None
+
+@dataclass(slots=True)
+class AlbumRow:
+    id: str
+    title: str
+    release_year: Optional[int] = None
+    image_url: Optional[str] = None
+
+@dataclass(slots=True)
+class TrackRow:
+    id: str
+    title: str
+    duration: Optional[int] = None
+    track_number: Optional[int] = None
+
+@dataclass(slots=True)
+class CurationRow:
+    id: str
+    user_id: str
+    curated_item_id: str
+    item_type: str
+    rating: Optional[int] = None
+    comment: Optional[str] = None
+    weighted_rank_percentage: Optional[int] = None
+
+def columns(row_type: Type[Any]) -> str:
+    """
+    Build a PostgREST select clause from a row type's fields
+
+    Args:
+        row_type: Projection dataclass
+
+    Returns:
+        str: Comma-separated column list, e.g. "id, name, genre, image_url"
+    """
+    return ", ".join(field.name for field in fields(row_type))
+
+def project(row_type: Type[RowT], data: Iterable[Dict[str, Any]]) -> List[RowT]:
+    """
+    Wrap rows returned for a projection in their record type
+
+    Args:
+        row_type: Projection dataclass the query selected with columns()
+        data: Rows from a Supabase response
+
+    Returns:
+        List of row records
+    """
+    return [row_type(**row) for row in data]
+
+def pick(row_type: Type[Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    """Keep only a row type's columns from a row, e.g. before overlaying it on query results"""
+    return {field.name: row.get(field.name) for field in fields(row_type)}
+
+def discography_columns() -> str:
+    """
+    Build the embedded select clause for artist -> albums -> tracks
+
+    Songs are aliased to "tracks" so the response is already in the API shape.
+    """
+    return (
+        f"{columns(ArtistRow)}, "
+        f"albums({columns(AlbumRow)}, tracks:songs({columns(TrackRow)}))"
+    )
@@ -0,0 +1,277 @@
+"""
+Pub/sub fan-out for real-time notifications in The Music Besties API
+Connections subscribe to topics such as "user:<id>", "tribe:<id>" or "artist:<id>".
+A published event is serialized once, and the same JSON text is handed to every
+subscriber. Each subscriber has a bounded queue, and when a slow client falls behind the
+queue's policy either drops events or coalesces them by key.
+
+The hub delivers events through a broker. The in-memory broker fans out within this
+worker; with PUBSUB_BACKEND=redis, events go through Redis pub/sub so subscribers on
+every worker receive them.
+
+Usage:
+    subscription = get_pubsub().subscribe(["user:123", "artist:456"], policy="coalesce")
+    get_pubsub().publish("artist:456", {"kind": "curation", ...}, key="curation:u1:i9")
+    async for payload in subscription:
+        await websocket.send_text(payload)
+"""
+import asyncio
+import logging
+import os
+import threading
+from collections import OrderedDict
+from itertools import count
+from typing import Any, AsyncIterator, Dict, Iterable, Optional, Set
+
+from utils.metrics import PUBSUB_EVENTS
+from utils.serialization import dumps
+
+logger = logging.getLogger(__name__)
+
+PUBSUB_BACKEND = os.getenv("PUBSUB_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+PUBSUB_QUEUE_SIZE = int(os.getenv("PUBSUB_QUEUE_SIZE", "100"))
+
+# Queue policies when a subscriber is full
+DROP_OLDEST = "drop_oldest"
+DROP_NEWEST = "drop_newest"
+# Replace a queued event with the same key in place, then drop the oldest if still full
+COALESCE = "coalesce"
+POLICIES = (DROP_OLDEST, DROP_NEWEST, COALESCE)
+
+# Outcomes of offering an event to a subscriber
+QUEUED, COALESCED, DROPPED = 0, 1, 2
+
+def _topic_kind(topic: str) -> str:
+    return topic.split(":", 1)[0]
+
+class Subscription:
+    """
+    One subscriber's bounded queue of serialized events
+
+    Iterate (or await get()) on the event loop that created it.
+    """
+    def __init__(self, hub: "PubSub", topics: Set[str], maxsize: int, policy: str):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy: {policy}")
+        self.hub = hub
+        self.topics = topics
+        self.maxsize = maxsize
+        self.policy = policy
+        self.dropped = 0
+        self._queue: "OrderedDict[Any, str]" = OrderedDict()
+        self._ready = asyncio.Event()
+        self._sequence = count()
+        self.closed = False
+
+    def offer(self, payload: str, key: Optional[str]) -> int:
+        """
+        Add an event according to the queue policy (called by the hub)
+
+        Returns:
+            QUEUED, COALESCED or DROPPED
+        """
+        queue = self._queue
+        coalesce = key is not None and self.policy == COALESCE
+        if coalesce and key in queue:
+            queue[key] = payload
+            return COALESCED
+        outcome = QUEUED
+        if len(queue) >= self.maxsize:
+            self.dropped += 1
+            if self.policy == DROP_NEWEST:
+                return DROPPED
+            queue.popitem(last=False)
+            outcome = DROPPED
+        # Only the coalescing policy needs keys; everything else gets a unique slot
+        queue[key if coalesce else next(self._sequence)] = payload
+        if not self._ready.is_set():
+            self._ready.set()
+        return outcome
+
+    async def get(self) -> Optional[str]:
+        """Wait for the next serialized event; None once the subscription is closed"""
+        while not self._queue:
+            if self.closed:
+                return None
+            self._ready.clear()
+            await self._ready.wait()
+        return self._queue.popitem(last=False)[1]
+
+    def __aiter__(self) -> AsyncIterator[str]:
+        return self._iterate()
+
+    async def _iterate(self) -> AsyncIterator[str]:
+        while True:
+            payload = await self.get()
+            if payload is None:
+                return
+            yield payload
+
+    def close(self) -> None:
+        """Unsubscribe from every topic and wake any waiting consumer"""
+        if not self.closed:
+            self.closed = True
+            self.hub._remove(self)
+            self._ready.set()
+
+class MemoryBroker:
+    """Delivers events to subscribers in this worker only"""
+    async def start(self, hub: "PubSub") -> None:
+        self.hub = hub
+
+    def publish(self, topic: str, payload: str, key: Optional[str]) -> None:
+        self.hub.deliver(topic, payload, key)
+
+    async def stop(self) -> None:
+        pass
+
+class RedisBroker:
+    """
+    Fans events out to every worker through Redis pub/sub
+
+    Each event is published once to Redis, and each worker's listener delivers it to
+    that worker's subscribers. The coalescing key travels as a prefix of the message.
+    """
+    CHANNEL_PREFIX = "pubsub:"
+
+    def __init__(self, url: str = REDIS_URL):
+        # Optional dependency, only needed for cross-worker fan-out
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._listener: Optional[asyncio.Task] = None
+
+    async def start(self, hub: "PubSub") -> None:
+        self.hub = hub
+        pubsub = self._redis.pubsub()
+        await pubsub.psubscribe(f"{self.CHANNEL_PREFIX}*")
+        self._listener = asyncio.get_running_loop().create_task(self._listen(pubsub))
+
+    async def _listen(self, pubsub) -> None:
+        async for message in pubsub.listen():
+            if message["type"] != "pmessage":
+                continue
+            topic = message["channel"].decode("utf-8")[len(self.CHANNEL_PREFIX):]
+            key, _, payload = message["data"].decode("utf-8").partition("\n")
+            self.hub.deliver(topic, payload, key or None)
+
+    def publish(self, topic: str, payload: str, key: Optional[str]) -> None:
+        message = f"{key or ''}\n{payload}"
+        asyncio.get_running_loop().create_task(self._redis.publish(f"{self.CHANNEL_PREFIX}{topic}", message))
+
+    async def stop(self) -> None:
+        if self._listener is not None:
+            self._listener.cancel()
+        await self._redis.aclose()
+
+class PubSub:
+    """
+    Topic hub for one worker
+
+    publish() may be called from the event loop or from a worker thread (background
+    jobs); delivery always happens on the loop.
+    """
+    def __init__(self, broker=None):
+        self.broker = broker or MemoryBroker()
+        self._topics: Dict[str, Set[Subscription]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._started = False
+
+    async def start(self) -> None:
+        if not self._started:
+            self._loop = asyncio.get_running_loop()
+            self._loop_thread = threading.get_ident()
+            await self.broker.start(self)
+            self._started = True
+
+    async def stop(self) -> None:
+        if self._started:
+            await self.broker.stop()
+            self._started = False
+
+    def subscribe(self, topics: Iterable[str], maxsize: int = PUBSUB_QUEUE_SIZE, policy: str = DROP_OLDEST) -> Subscription:
+        """
+        Subscribe to one or more topics
+
+        Args:
+            topics: Topic names, e.g. ["user:<id>", "artist:<id>"]
+            maxsize: Events queued before the policy applies
+            policy: drop_oldest, drop_newest or coalesce
+
+        Returns:
+            Subscription
+        """
+        subscription = Subscription(self, set(topics), maxsize, policy)
+        for topic in subscription.topics:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def _remove(self, subscription: Subscription) -> None:
+        for topic in subscription.topics:
+            subscribers = self._topics.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._topics[topic]
+
+    def subscriber_count(self, topic: str) -> int:
+        return len(self._topics.get(topic, ()))
+
+    def publish(self, topic: str, event: Dict[str, Any], key: Optional[str] = None) -> None:
+        """
+        Publish an event to a topic
+
+        Args:
+            topic: Topic name
+            event: JSON-serializable event; serialized once for all subscribers
+            key: Coalescing key; coalesce subscribers keep only the latest event per key
+        """
+        payload = dumps({"type": "notification", "topic": topic, "event": event}).decode("utf-8")
+        if not self._started:
+            # No broker yet (e.g. the app ran without its lifespan): fan out locally, but
+            # only from an event loop; subscriber queues can't be touched from threads
+            if _on_event_loop():
+                self.deliver(topic, payload, key)
+            else:
+                logger.warning(f"Dropping {topic} event published from a thread before pub/sub started")
+                PUBSUB_EVENTS.inc(_topic_kind(topic), "dropped")
+        elif threading.get_ident() != self._loop_thread:
+            self._loop.call_soon_threadsafe(self.broker.publish, topic, payload, key)
+        else:
+            self.broker.publish(topic, payload, key)
+
+    def deliver(self, topic: str, payload: str, key: Optional[str] = None) -> int:
+        """Hand a serialized event to every local subscriber of a topic"""
+        subscribers = self._topics.get(topic)
+        if not subscribers:
+            return 0
+        outcomes = [0, 0, 0]
+        for subscription in list(subscribers):
+            outcomes[subscription.offer(payload, key)] += 1
+        # One metrics update per publish rather than per recipient
+        kind = _topic_kind(topic)
+        PUBSUB_EVENTS.inc(kind, "delivered", amount=len(subscribers))
+        if outcomes[COALESCED]:
+            PUBSUB_EVENTS.inc(kind, "coalesced", amount=outcomes[COALESCED])
+        if outcomes[DROPPED]:
+            PUBSUB_EVENTS.inc(kind, "dropped", amount=outcomes[DROPPED])
+        return len(subscribers)
+
+def _on_event_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+    except RuntimeError:
+        return False
+    return True
+
+# Process-wide hub
+_hub: Optional[PubSub] = None
+
+def get_pubsub() -> PubSub:
+    """Get the process-wide pub/sub hub for the configured backend"""
+    global _hub
+    if _hub is None:
+        _hub = PubSub(RedisBroker() if PUBSUB_BACKEND == "redis" else None)
+    return _hub
@@ -0,0 +1,291 @@
+"""
+Rate limiting and load shedding for The Music Besties API
+Token buckets per route group limit expensive routes, and requests to those routes are
+shed early with 503 when the worker is overloaded (too many requests in flight or
+event-loop lag above a threshold).
+
+Every request takes a token from its client IP's bucket, which allows
+RATE_LIMIT_IP_FACTOR times the route's budget so users sharing an address aren't
+starved. A request whose bearer token validates also takes one from its user's bucket;
+invalid or made-up tokens get only the IP bucket, so rotating them buys nothing. The
+client IP is the X-Forwarded-For entry appended by the nearest of TRUSTED_PROXY_HOPS
+proxies; entries to its left are client-supplied and ignored.
+
+Buckets live in process memory by default; set RATE_LIMIT_BACKEND=redis and REDIS_URL
+to share them across workers.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from utils.loop_monitor import get_loop_monitor
+
+logger = logging.getLogger(__name__)
+
+RATE_LIMIT_ENABLED = os.getenv("RATE_LIMIT_ENABLED", "true").lower() == "true"
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory").lower()
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+# Route prefix -> (tokens per second, burst). Override with RATE_LIMITS as a JSON object.
+DEFAULT_RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    "/api/chat": (0.5, 10),
+    "/api/music/search": (5, 20),
+}
+RATE_LIMITS: Dict[str, Tuple[float, float]] = {
+    prefix: (float(rate), float(burst)) for prefix, (rate, burst) in json.loads(os.environ["RATE_LIMITS"]).items()
+} if os.getenv("RATE_LIMITS") else DEFAULT_RATE_LIMITS
+
+# Per-IP budget as a multiple of the per-user one
+RATE_LIMIT_IP_FACTOR = float(os.getenv("RATE_LIMIT_IP_FACTOR", "4"))
+# Proxies in front of the app that append to X-Forwarded-For (Railway and Vercel: 1); 0 uses the socket peer
+TRUSTED_PROXY_HOPS = int(os.getenv("TRUSTED_PROXY_HOPS", "1"))
+# Seconds a validated token -> user id mapping is reused
+TOKEN_CACHE_TTL = float(os.getenv("RATE_LIMIT_TOKEN_TTL_SECONDS", "60"))
+TOKEN_CACHE_SIZE = 10000
+
+# Load shedding thresholds for the expensive routes above
+MAX_IN_FLIGHT = int(os.getenv("SHED_MAX_IN_FLIGHT", "64"))
+MAX_LOOP_LAG = float(os.getenv("SHED_MAX_LOOP_LAG_MS", "500")) / 1000
+
+class MemoryBucketStore:
+    """Token buckets in process memory"""
+    # Prune idle buckets once the table grows past this many keys
+    MAX_KEYS = 100_000
+    # A bucket idle this long has refilled completely, so it is equivalent to a new one
+    MAX_IDLE_SECONDS = max((burst / rate for rate, burst in RATE_LIMITS.values()), default=60)
+
+    def __init__(self):
+        self._buckets: Dict[str, List[float]] = {}
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        """
+        Take one token from a bucket
+
+        Returns:
+            (allowed, seconds until a token is available)
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.MAX_KEYS:
+                self._prune(now)
+            bucket = self._buckets[key] = [burst, now]
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens >= 1:
+            bucket[0] = tokens - 1
+            return True, 0.0
+        bucket[0] = tokens
+        return False, (1 - tokens) / rate
+
+    def _prune(self, now: float) -> None:
+        self._buckets = {
+            key: bucket for key, bucket in self._buckets.items()
+            if now - bucket[1] < self.MAX_IDLE_SECONDS
+        }
+
+_REDIS_TOKEN_BUCKET = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+local allowed = 0
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return {allowed, tostring(wait)}
+"""
+
+class RedisBucketStore:
+    """Token buckets shared across workers in Redis, updated atomically by a Lua script"""
+    def __init__(self, url: str = REDIS_URL):
+        # Optional dependency, only needed for the shared backend
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_TOKEN_BUCKET)
+
+    async def take(self, key: str, rate: float, burst: float) -> Tuple[bool, float]:
+        allowed, wait = await self._script(keys=[f"ratelimit:{key}"], args=[rate, burst, time.time()])
+        return bool(allowed), float(wait)
+
+# Process-wide bucket store, shared by the middleware and per-message WebSocket limits
+_store = None
+
+def get_bucket_store():
+    """Get the process-wide bucket store for the configured backend"""
+    global _store
+    if _store is None:
+        _store = RedisBucketStore() if RATE_LIMIT_BACKEND == "redis" else MemoryBucketStore()
+    return _store
+
+async def take_token(path: str, client_key: str) -> Tuple[bool, float]:
+    """
+    Apply a route's budget outside the HTTP middleware, e.g. per WebSocket message
+
+    Args:
+        path: Route path matched against RATE_LIMITS prefixes
+        client_key: Caller identity, e.g. "user:<id>"
+
+    Returns:
+        (allowed, seconds until a token is available)
+    """
+    budget = _match_budget(path) if RATE_LIMIT_ENABLED else None
+    if budget is None:
+        return True, 0.0
+    prefix, rate, burst = budget
+    return await get_bucket_store().take(f"{prefix}:{client_key}", rate, burst)
+
+def _match_budget(path: str) -> Optional[Tuple[str, float, float]]:
+    for prefix, (rate, burst) in RATE_LIMITS.items():
+        if path.startswith(prefix):
+            return prefix, rate, burst
+    return None
+
+def _client_ip(scope, hops: int = TRUSTED_PROXY_HOPS) -> str:
+    """
+    The client address as seen by the outermost trusted proxy
+
+    Each trusted proxy appends the address it received the request from, so the entry
+    `hops` from the right is the last one a trusted proxy wrote. Anything further left
+    came from the client and can be forged.
+    """
+    forwarded: List[bytes] = []
+    for name, value in scope.get("headers", []):
+        if name == b"x-forwarded-for":
+            forwarded.extend(entry.strip() for entry in value.split(b","))
+    forwarded = [entry for entry in forwarded if entry]
+    if hops > 0 and forwarded:
+        return forwarded[-min(hops, len(forwarded))].decode("latin-1")
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def _bearer_token(scope) -> Optional[str]:
+    for name, value in scope.get("headers", []):
+        if name == b"authorization" and value.startswith(b"Bearer "):
+            return value[7:].decode("latin-1")
+    return None
+
+class TokenUsers:
+    """
+    Bounded cache of bearer tokens validated against Supabase Auth
+
+    Only validated tokens are cached, keyed by a hash of the token, so a flood of
+    made-up tokens costs one lookup each and can't evict real users faster than the
+    per-IP bucket allows.
+    """
+    def __init__(self, ttl: float = TOKEN_CACHE_TTL, max_entries: int = TOKEN_CACHE_SIZE):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._users: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+
+    async def user_id(self, token: str) -> Optional[str]:
+        """Return the user a token belongs to, or None if it doesn't validate"""
+        key = hashlib.blake2b(token.encode("latin-1"), digest_size=16).digest()
+        now = time.monotonic()
+        cached = self._users.get(key)
+        if cached is not None and cached[1] > now:
+            self._users.move_to_end(key)
+            return cached[0]
+        user_id = await asyncio.to_thread(self._validate, token)
+        if user_id is None:
+            self._users.pop(key, None)
+            return None
+        self._users[key] = (user_id, now + self.ttl)
+        self._users.move_to_end(key)
+        while len(self._users) > self.max_entries:
+            self._users.popitem(last=False)
+        return user_id
+
+    @staticmethod
+    def _validate(token: str) -> Optional[str]:
+        # Imported here because the Supabase client pulls in the SDK, which the
+        # middleware shouldn't load at import time
+        from utils.supabase_client import get_supabase_client
+
+        try:
+            response = get_supabase_client().auth.get_user(token)
+        except Exception:
+            return None
+        if hasattr(response, 'error') and response.error:
+            return None
+        user = getattr(response, "user", None)
+        return user.id if user is not None else None
+
+async def _reject(send, status: int, detail: str, retry_after: float) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode("latin-1")),
+            (b"retry-after", str(max(1, math.ceil(retry_after))).encode("latin-1")),
+        ]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class RateLimitMiddleware:
+    """
+    ASGI middleware applying per-client token buckets and load shedding to expensive routes
+
+    Other routes pass straight through apart from the in-flight counter.
+    """
+    def __init__(self, app, store=None, enabled: bool = RATE_LIMIT_ENABLED, token_users: Optional[TokenUsers] = None):
+        self.app = app
+        self.enabled = enabled
+        self.store = store or get_bucket_store()
+        self.token_users = token_users or TokenUsers()
+        self.in_flight = 0
+        self.loop_monitor = get_loop_monitor()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        budget = _match_budget(scope["path"])
+        if budget is not None:
+            if not self.loop_monitor.running:
+                self.loop_monitor.start()
+
+            # Shed before doing any work when the worker is already saturated
+            if self.in_flight >= MAX_IN_FLIGHT or self.loop_monitor.lag >= MAX_LOOP_LAG:
+                logger.warning(f"Shedding {scope['path']}: in_flight={self.in_flight}, loop_lag={self.loop_monitor.lag * 1000:.0f}ms")
+                await _reject(send, 503, "Server is busy, please retry shortly", 1)
+                return
+
+            prefix, rate, burst = budget
+            # The IP bucket comes first so unvalidated tokens can't force unlimited auth lookups
+            allowed, retry_after = await self.store.take(
+                f"{prefix}:ip:{_client_ip(scope)}", rate * RATE_LIMIT_IP_FACTOR, burst * RATE_LIMIT_IP_FACTOR
+            )
+            if allowed:
+                token = _bearer_token(scope)
+                user_id = await self.token_users.user_id(token) if token else None
+                if user_id is not None:
+                    allowed, retry_after = await self.store.take(f"{prefix}:user:{user_id}", rate, burst)
+            if not allowed:
+                await _reject(send, 429, "Too many requests", retry_after)
+                return
+
+        self.in_flight += 1
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            self.in_flight -= 1
@@ -0,0 +1,349 @@
+"""
+Read-replica routing for The Music Besties API
+Sends read-only queries to replica databases and writes to the primary without giving
+up read-your-writes: a user who has just written reads from a replica only once that
+replica has replayed their write.
+
+After a write, the router asks the primary for its WAL position (the wal_lsn function in
+database/schema-replicas.sql) and records it as the write watermark of every user the
+write belongs to: the request's user, bound by bind_user(), and the owners of the
+written rows (user_curations.user_id, profiles.id), so write-buffer flushes that run
+outside the request count too. A read by a user with a watermark goes to a replica
+whose replayed position has reached it, or to the primary if none has. Replica
+positions are re-read at most every REPLICA_POSITION_TTL_MS and only move forward, so a
+cached position is a safe lower bound. Reads by everyone else, and by users whose
+writes have replicated, cost nothing beyond picking the next replica.
+
+A replica that fails a query is skipped for REPLICA_RETRY_SECONDS and the query is
+retried on the primary. If the primary has no wal_lsn function, routing turns itself
+off and every read goes to the primary. If reading the position fails for any other
+reason, the write's users read from the primary for REPLICA_RETRY_SECONDS instead.
+
+Watermarks live in this worker by default, which covers a user's requests to the same
+worker (like the write buffer's overlay); set REPLICA_WATERMARK_BACKEND=redis to share
+them across workers. The change feed reads from replicas too, so keep
+CHANGE_FEED_LOOKBACK above the replica lag.
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from itertools import count
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.metrics import REPLICA_READS
+
+logger = logging.getLogger(__name__)
+
+SUPABASE_REPLICA_URLS = [url.strip() for url in os.getenv("SUPABASE_REPLICA_URLS", "").split(",") if url.strip()]
+REPLICA_POSITION_TTL = float(os.getenv("REPLICA_POSITION_TTL_MS", "100")) / 1000
+REPLICA_RETRY_SECONDS = float(os.getenv("REPLICA_RETRY_SECONDS", "30"))
+REPLICA_WATERMARK_BACKEND = os.getenv("REPLICA_WATERMARK_BACKEND", "memory").lower()
+REPLICA_WATERMARK_TTL = float(os.getenv("REPLICA_WATERMARK_TTL_SECONDS", "600"))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+WRITE_OPERATIONS = frozenset(("insert", "upsert", "update", "delete"))
+
+# Watermark of a user whose last write position is unknown: no replica reaches it
+PRIMARY_ONLY = 1 << 64
+
+# Tables whose rows belong to a user: table -> column holding the user id
+OWNER_COLUMNS: Dict[str, str] = {
+    "user_curations": "user_id",
+    "profiles": "id",
+}
+
+def parse_lsn(value: Any) -> int:
+    """Parse a pg_lsn such as "16/B374D848" into an integer position"""
+    high, low = str(value).split("/")
+    return (int(high, 16) << 32) | int(low, 16)
+
+def _missing_function(error: Exception) -> bool:
+    """Whether an RPC failed because the function isn't defined (PostgREST PGRST202, Postgres 42883)"""
+    code = getattr(error, "code", None)
+    if code in ("PGRST202", "42883"):
+        return True
+    message = str(error)
+    return "Could not find the function" in message or ("function" in message and "does not exist" in message)
+
+class _RequestUser:
+    """The user a request acts for and their watermark, loaded on first read"""
+    __slots__ = ("user_id", "watermark")
+
+    def __init__(self, user_id: str):
+        self.user_id = user_id
+        self.watermark: Optional[int] = None
+
+_request_user: ContextVar[Optional[_RequestUser]] = ContextVar("replica_request_user", default=None)
+
+def bind_user(user_id: str) -> None:
+    """Route the rest of this request's reads for read-your-writes by a user"""
+    _request_user.set(_RequestUser(user_id))
+
+class MemoryWatermarkStore:
+    """Write watermarks in this worker's memory"""
+    # Prune replicated watermarks once this many are held
+    PRUNE_AT = 10000
+
+    def __init__(self):
+        self._watermarks: Dict[str, int] = {}
+        # User id -> time.monotonic() until which their reads go to the primary
+        self._pins: Dict[str, float] = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id: str) -> int:
+        pinned = self._pins.get(user_id)
+        if pinned is not None:
+            if pinned > time.monotonic():
+                return PRIMARY_ONLY
+            self._pins.pop(user_id, None)
+        return self._watermarks.get(user_id, 0)
+
+    def pin(self, user_ids: Iterable[str], seconds: float) -> None:
+        """Send users' reads to the primary for a while"""
+        until = time.monotonic() + seconds
+        with self._lock:
+            for user_id in user_ids:
+                self._pins[user_id] = until
+
+    def mark(self, user_ids: Iterable[str], lsn: int) -> None:
+        with self._lock:
+            for user_id in user_ids:
+                if self._watermarks.get(user_id, 0) < lsn:
+                    self._watermarks[user_id] = lsn
+
+    def prune(self, replicated: int) -> None:
+        """Forget watermarks every replica has reached"""
+        if len(self._watermarks) + len(self._pins) < self.PRUNE_AT:
+            return
+        now = time.monotonic()
+        with self._lock:
+            self._pins = {user_id: until for user_id, until in self._pins.items() if until > now}
+            self._watermarks = {user_id: lsn for user_id, lsn in self._watermarks.items() if lsn > replicated}
+
+# Keep the highest watermark when two workers record one for the same user
+_REDIS_MARK = """
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+if tonumber(ARGV[1]) > current then
+    redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+end
+"""
+
+class RedisWatermarkStore:
+    """
+    Write watermarks shared across workers in Redis
+
+    Each request reads its user's watermark at most once. Entries expire after
+    REPLICA_WATERMARK_TTL_SECONDS, by which time any healthy replica has replayed them.
+    """
+    def __init__(self, url: str = REDIS_URL, ttl: float = REPLICA_WATERMARK_TTL):
+        # Optional dependency, only needed for the shared backend. Synchronous because
+        # queries are executed synchronously.
+        import redis
+
+        self._redis = redis.Redis.from_url(url)
+        self._script = self._redis.register_script(_REDIS_MARK)
+        self._ttl_ms = int(ttl * 1000)
+
+    def get(self, user_id: str) -> int:
+        value = self._redis.get(f"replica:watermark:{user_id}")
+        return int(value) if value else 0
+
+    def mark(self, user_ids: Iterable[str], lsn: int) -> None:
+        for user_id in user_ids:
+            self._script(keys=[f"replica:watermark:{user_id}"], args=[lsn, self._ttl_ms])
+
+    def pin(self, user_ids: Iterable[str], seconds: float) -> None:
+        """Send users' reads to the primary for a while (replaces their watermark)"""
+        for user_id in user_ids:
+            self._redis.set(f"replica:watermark:{user_id}", PRIMARY_ONLY, px=int(seconds * 1000))
+
+    def prune(self, replicated: int) -> None:
+        """Entries expire on their own"""
+
+# Process-wide watermark store, shared by every router
+_store = None
+
+def get_watermark_store():
+    """Get the process-wide watermark store for the configured backend"""
+    global _store
+    if _store is None:
+        _store = RedisWatermarkStore() if REPLICA_WATERMARK_BACKEND == "redis" else MemoryWatermarkStore()
+    return _store
+
+class _Replica:
+    """A replica client and the last WAL position it was seen to have replayed"""
+    def __init__(self, name: str, client: Any):
+        self.name = name
+        self.client = client
+        self.position = 0
+        self.checked_at = float("-inf")
+        self.down_until = 0.0
+
+    def refresh(self, now: float) -> int:
+        """Re-read the replayed position; a failure takes the replica out of rotation"""
+        self.checked_at = now
+        try:
+            self.position = max(self.position, parse_lsn(self.client.rpc("wal_lsn").execute().data))
+        except Exception as e:
+            self.fail(e)
+        return self.position
+
+    def fail(self, error: Exception) -> None:
+        logger.warning(f"Read replica {self.name} failed, using the primary for {REPLICA_RETRY_SECONDS:g}s: {error}")
+        self.down_until = time.monotonic() + REPLICA_RETRY_SECONDS
+
+class _RoutedQuery:
+    """Records a query builder chain and replays it on the database chosen at execute()"""
+    __slots__ = ("_router", "_table", "_calls", "_write")
+
+    def __init__(self, router: "ReadReplicaClient", table: str):
+        self._router = router
+        self._table = table
+        self._calls: List[Tuple[str, tuple, dict]] = []
+        self._write = False
+
+    def __getattr__(self, name: str) -> Any:
+        def call(*args, **kwargs):
+            if name in WRITE_OPERATIONS:
+                self._write = True
+            self._calls.append((name, args, kwargs))
+            return self
+        return call
+
+    def build(self, client: Any) -> Any:
+        builder = client.table(self._table)
+        for name, args, kwargs in self._calls:
+            builder = getattr(builder, name)(*args, **kwargs)
+        return builder
+
+    def execute(self) -> Any:
+        if self._write:
+            return self._router.execute_write(self)
+        return self._router.execute_read(self)
+
+class ReadReplicaClient:
+    """
+    Supabase client proxy that sends reads to replicas and writes to the primary
+
+    Everything except table() (auth, rpc, storage) goes to the primary.
+
+    Args:
+        primary: Client for the primary database
+        replicas: Clients for the read replicas
+        store: Watermark store (defaults to the process-wide one)
+        position_ttl: Seconds a replica's replayed position is trusted before re-reading it
+    """
+    def __init__(self, primary: Any, replicas: List[Any], store=None, position_ttl: float = REPLICA_POSITION_TTL):
+        self._primary = primary
+        self.replicas = [_Replica(str(i), client) for i, client in enumerate(replicas)]
+        self._store = store or get_watermark_store()
+        self._position_ttl = position_ttl
+        self._turn = count()
+
+    def table(self, table_name: str) -> _RoutedQuery:
+        return _RoutedQuery(self, table_name)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._primary, name)
+
+    def _watermark(self) -> int:
+        user = _request_user.get()
+        if user is None:
+            return 0
+        if user.watermark is None:
+            user.watermark = self._store.get(user.user_id)
+        return user.watermark
+
+    def choose_replica(self) -> Tuple[Optional[_Replica], str]:
+        """
+        Pick the replica for a read by the current request's user
+
+        Returns:
+            Tuple[Optional[_Replica], str]: The replica, or None and why the read must go
+            to the primary ("watermark" or "unavailable")
+        """
+        if not self.replicas:
+            return None, "unavailable"
+        watermark = self._watermark()
+        if watermark >= PRIMARY_ONLY:
+            return None, "watermark"
+        now = time.monotonic()
+        start = next(self._turn)
+        behind = []
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            if replica.down_until > now:
+                continue
+            if replica.position >= watermark:
+                return replica, ""
+            behind.append(replica)
+        for replica in behind:
+            if now - replica.checked_at >= self._position_ttl and replica.refresh(now) >= watermark and replica.down_until <= now:
+                self._store.prune(min(r.position for r in self.replicas))
+                return replica, ""
+        return None, "watermark" if behind else "unavailable"
+
+    def execute_read(self, query: _RoutedQuery) -> Any:
+        replica, reason = self.choose_replica()
+        if replica is None:
+            REPLICA_READS.inc("primary", reason)
+            return query.build(self._primary).execute()
+        try:
+            response = query.build(replica.client).execute()
+        except Exception as replica_error:
+            # Raises if the query itself is bad; only then is the replica not to blame
+            response = query.build(self._primary).execute()
+            replica.fail(replica_error)
+            REPLICA_READS.inc("primary", "failover")
+            return response
+        REPLICA_READS.inc("replica", "routed")
+        return response
+
+    def execute_write(self, query: _RoutedQuery) -> Any:
+        response = query.build(self._primary).execute()
+        owners = set()
+        user = _request_user.get()
+        if user is not None:
+            owners.add(user.user_id)
+        column = OWNER_COLUMNS.get(query._table)
+        if column and not (hasattr(response, 'error') and response.error):
+            owners.update(row[column] for row in response.data or () if row.get(column))
+        if owners and self.replicas:
+            self._mark(owners, user)
+        return response
+
+    def _mark(self, owners: set, user: Optional[_RequestUser]) -> None:
+        try:
+            lsn = parse_lsn(self._primary.rpc("wal_lsn").execute().data)
+        except Exception as e:
+            if _missing_function(e):
+                logger.error(f"The primary has no wal_lsn function, sending all reads to the primary (is database/schema-replicas.sql applied?): {e}")
+                self.replicas = []
+                return
+            # The write's position is unknown, so no replica is known to have it
+            logger.warning(f"Could not read the primary's WAL position, reading from the primary for {len(owners)} user(s) for {REPLICA_RETRY_SECONDS:g}s: {e}")
+            self._store.pin(owners, REPLICA_RETRY_SECONDS)
+            if user is not None and user.user_id in owners:
+                user.watermark = PRIMARY_ONLY
+            return
+        self._store.mark(owners, lsn)
+        if user is not None and user.user_id in owners:
+            user.watermark = max(user.watermark or 0, lsn)
+
+def route_reads(primary: Any, replicas: List[Any]) -> Any:
+    """
+    Wrap a client so reads go to replicas, or return it unchanged without replicas
+
+    Args:
+        primary: Client for the primary database (None passes through)
+        replicas: Clients for the read replicas
+
+    Returns:
+        The routing client or the primary
+    """
+    if primary is None or not replicas:
+        return primary
+    logger.info(f"Routing reads to {len(replicas)} read replica(s)")
+    return ReadReplicaClient(primary, replicas)
@@ -0,0 +1,607 @@
+"""
+Full-text search for The Music Besties API
+An in-process inverted index over artist names, album and song titles, and curation
+comments, ranked with BM25F. Each document has one or more fields with their own
+length normalization and boost: a title match outranks the same word in the artist
+name it is listed under, and artist names outrank comments.
+
+Posting lists are delta-encoded varints (doc id gap, term frequency) in a bytearray per
+field and term, about two bytes per posting. Queries decode and score whole posting
+lists with numpy against dense per-document length and kind arrays, so a query costs a
+few array passes rather than a Python loop per posting. Documents are never rewritten
+in place: an update appends a new document id and tombstones the old one, so posting
+lists stay append-only and sorted. Dead postings are masked at query time and dropped
+by the next rebuild. Entity ids are held as dense ints from utils.interning and turned
+back into UUIDs only in results.
+
+The index is built from the database in a worker thread at startup, kept current from
+curation writes in this worker and from the change feed for everything else, and
+rebuilt every SEARCH_INDEX_REBUILD_INTERVAL seconds to drop deleted rows and
+tombstones. The last query term also matches as a prefix, so results show up while
+the user is still typing.
+"""
+import asyncio
+import bisect
+import logging
+import math
+import os
+import re
+import time
+import unicodedata
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from utils.change_feed import get_change_feed
+from utils.interning import get_interner
+from utils.supabase_client import get_supabase_client
+
+if TYPE_CHECKING:
+    import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SEARCH_INDEX_ENABLED = os.getenv("SEARCH_INDEX_ENABLED", "true").lower() == "true"
+SEARCH_INDEX_REBUILD_INTERVAL = float(os.getenv("SEARCH_INDEX_REBUILD_INTERVAL", "3600"))
+BM25_K1 = float(os.getenv("SEARCH_BM25_K1", "1.2"))
+BM25_B = float(os.getenv("SEARCH_BM25_B", "0.75"))
+
+# Per-field weight applied to term frequency before saturation
+FIELD_BOOSTS = {"name": 3.0, "title": 2.0, "album": 0.5, "artist": 0.5, "comment": 1.0}
+FIELDS = tuple(FIELD_BOOSTS)
+KINDS = ("artist", "album", "song", "comment")
+_KIND_CODES = {kind: code for code, kind in enumerate(KINDS)}
+# Kind code of tombstoned and unused document ids
+_DEAD = -1
+# Kind each table's rows are indexed as
+TABLE_KINDS = {"artists": "artist", "albums": "album", "songs": "song", "user_curations": "comment"}
+# Interner namespace of each kind's ids, and of its parent's ids
+ID_NAMESPACES = {"artist": "artists", "album": "items", "song": "items", "comment": "curations"}
+PARENT_NAMESPACES = {"album": "artists", "song": "items", "comment": "items"}
+# Row column holding each kind's parent id
+PARENT_COLUMNS = {"album": "artist_id", "song": "album_id", "comment": "curated_item_id"}
+
+# Prefix matching on the last query term
+MIN_PREFIX = 2
+MAX_EXPANSIONS = 10
+PREFIX_WEIGHT = 0.7
+# Comments only: words too common in prose to rank anything
+COMMENT_STOPWORDS = frozenset(
+    "a an and are as at be but by for from has have i in is it its my of on or so that the "
+    "this to was with".split()
+)
+SCAN_PAGE_SIZE = 1000
+
+_WORD = re.compile(r"[^\W_]+")
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, accent-folded word tokens; apostrophes are dropped so don't matches dont"""
+    if not text:
+        return []
+    if not text.isascii():
+        text = unicodedata.normalize("NFKD", text)
+        text = "".join(c for c in text if not unicodedata.combining(c)).replace("’", "")
+    return _WORD.findall(text.lower().replace("'", ""))
+
+def _encode_varint(value: int, out: bytearray) -> None:
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _decode_postings(data: bytearray) -> Tuple["np.ndarray", "np.ndarray"]:
+    """
+    Decode a delta-encoded posting list
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: Document ids and term frequencies
+    """
+    # numpy is imported on first use: it adds ~140ms to cold start
+    import numpy as np
+
+    # Copy, so the bytearray isn't locked against appends while numpy holds its buffer
+    raw = np.frombuffer(bytes(data), dtype=np.uint8)
+    last_bytes = raw < 0x80
+    if last_bytes.all():
+        # Every value fits in one byte: the common case for dense terms
+        values = raw.astype(np.int64)
+    else:
+        starts = np.flatnonzero(np.concatenate(([True], last_bytes[:-1])))
+        value_index = np.repeat(np.arange(len(starts)), np.diff(np.append(starts, len(raw))))
+        shifts = 7 * (np.arange(len(raw)) - starts[value_index])
+        values = np.add.reduceat((raw & 0x7F).astype(np.int64) << shifts, starts)
+    return np.cumsum(values[0::2]), values[1::2]
+
+class _Postings:
+    """Append-only posting list for one field and term"""
+    __slots__ = ("data", "last_doc")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.last_doc = 0
+
+    def append(self, doc_id: int, tf: int) -> None:
+        _encode_varint(doc_id - self.last_doc, self.data)
+        _encode_varint(tf, self.data)
+        self.last_doc = doc_id
+
+class _Doc:
+    """
+    One indexed entity
+
+    Attributes:
+        id: Interned entity id
+        text: The entity's own name, title or comment
+        parent: Interned artist id for albums, album id for songs, curated item id for comments
+        extra: Display fields that aren't searched (interned comment author, rating)
+        fields: Indexed text by field, including the parent names it is listed under
+    """
+    __slots__ = ("kind", "id", "text", "parent", "extra", "fields")
+
+    def __init__(self, kind: str, entity_id: int, text: str, parent: Optional[int], extra: Dict[str, Any]):
+        self.kind = kind
+        self.id = entity_id
+        self.text = text
+        self.parent = parent
+        self.extra = extra
+        self.fields: Dict[str, List[str]] = {}
+
+class SearchIndex:
+    """
+    BM25F inverted index over catalog entities and curation comments
+
+    Not thread-safe: build it in one thread, then read and update it from the event loop.
+
+    Args:
+        k1: Term frequency saturation
+        b: Length normalization strength
+    """
+    def __init__(self, k1: float = BM25_K1, b: float = BM25_B):
+        import numpy as np
+
+        self.k1 = k1
+        self.b = b
+        self._next_doc = 1
+        self._docs: Dict[int, _Doc] = {}
+        # (kind, interned id) -> live document id
+        self._live: Dict[Tuple[str, int], int] = {}
+        # Child entity keys by parent key, for re-indexing titles they are listed under
+        self._children: Dict[Tuple[str, int], Set[Tuple[str, int]]] = {}
+        self._postings: Dict[str, Dict[str, _Postings]] = {field: {} for field in FIELD_BOOSTS}
+        self._df: Dict[str, int] = {}
+        # Per document id: token count of each field, and kind code (_DEAD once tombstoned)
+        self._lengths = np.zeros((len(FIELDS), 1024), dtype=np.float32)
+        self._kinds = np.full(1024, _DEAD, dtype=np.int8)
+        self._field_docs: Dict[str, int] = dict.fromkeys(FIELD_BOOSTS, 0)
+        self._field_tokens: Dict[str, int] = dict.fromkeys(FIELD_BOOSTS, 0)
+        # Sorted vocabulary for prefix expansion
+        self._terms: List[str] = []
+        self.dead_docs = 0
+
+    def __len__(self) -> int:
+        return len(self._docs)
+
+    @property
+    def postings_bytes(self) -> int:
+        return sum(len(p.data) for postings in self._postings.values() for p in postings.values())
+
+    @property
+    def vocabulary_size(self) -> int:
+        return len(self._terms)
+
+    def _text(self, kind: str, entity_id: Optional[int]) -> Optional[str]:
+        doc_id = self._live.get((kind, entity_id))
+        return self._docs[doc_id].text if doc_id is not None else None
+
+    def _parent(self, kind: str, entity_id: Optional[int]) -> Optional[int]:
+        doc_id = self._live.get((kind, entity_id))
+        return self._docs[doc_id].parent if doc_id is not None else None
+
+    def _fields(self, doc: _Doc) -> Dict[str, List[str]]:
+        if doc.kind == "artist":
+            return {"name": tokenize(doc.text)}
+        if doc.kind == "album":
+            return {"title": tokenize(doc.text), "artist": tokenize(self._text("artist", doc.parent))}
+        if doc.kind == "song":
+            artist_id = self._parent("album", doc.parent)
+            return {
+                "title": tokenize(doc.text),
+                "album": tokenize(self._text("album", doc.parent)),
+                "artist": tokenize(self._text("artist", artist_id))
+            }
+        return {"comment": [t for t in tokenize(doc.text) if t not in COMMENT_STOPWORDS]}
+
+    def _add(self, doc: _Doc) -> None:
+        import numpy as np
+
+        doc_id = self._next_doc
+        self._next_doc += 1
+        if doc_id >= len(self._kinds):
+            capacity = 2 * len(self._kinds)
+            self._lengths = np.pad(self._lengths, ((0, 0), (0, capacity - self._lengths.shape[1])))
+            self._kinds = np.pad(self._kinds, (0, capacity - len(self._kinds)), constant_values=_DEAD)
+        doc.fields = {field: tokens for field, tokens in self._fields(doc).items() if tokens}
+        for field, tokens in doc.fields.items():
+            self._lengths[FIELDS.index(field), doc_id] = len(tokens)
+        self._kinds[doc_id] = _KIND_CODES[doc.kind]
+        terms = set()
+        for field, tokens in doc.fields.items():
+            counts: Dict[str, int] = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            postings = self._postings[field]
+            for term, tf in counts.items():
+                posting = postings.get(term)
+                if posting is None:
+                    posting = postings[term] = _Postings()
+                posting.append(doc_id, tf)
+            terms.update(counts)
+            self._field_docs[field] += 1
+            self._field_tokens[field] += len(tokens)
+        for term in terms:
+            df = self._df.get(term, 0)
+            if df == 0 and term not in self._df:
+                bisect.insort(self._terms, term)
+            self._df[term] = df + 1
+        self._docs[doc_id] = doc
+        self._live[(doc.kind, doc.id)] = doc_id
+
+    def _tombstone(self, doc_id: int) -> _Doc:
+        doc = self._docs.pop(doc_id)
+        del self._live[(doc.kind, doc.id)]
+        self._kinds[doc_id] = _DEAD
+        for field, tokens in doc.fields.items():
+            self._field_docs[field] -= 1
+            self._field_tokens[field] -= len(tokens)
+        for term in {t for tokens in doc.fields.values() for t in tokens}:
+            self._df[term] -= 1
+        self.dead_docs += 1
+        return doc
+
+    def _link(self, doc: _Doc, linked: bool) -> None:
+        if doc.kind not in ("album", "song") or doc.parent is None:
+            return
+        parent_key = ("artist" if doc.kind == "album" else "album", doc.parent)
+        if linked:
+            self._children.setdefault(parent_key, set()).add((doc.kind, doc.id))
+        else:
+            children = self._children.get(parent_key)
+            if children is not None:
+                children.discard((doc.kind, doc.id))
+                if not children:
+                    del self._children[parent_key]
+
+    def upsert(self, kind: str, entity_id: str, text: Optional[str], parent: Optional[str] = None, extra: Optional[Dict[str, Any]] = None) -> None:
+        """
+        Index an entity, replacing its previous version
+
+        Args:
+            kind: "artist", "album", "song" or "comment"
+            entity_id: Row id
+            text: Name, title or comment; an empty comment removes the document
+            parent: Artist id for albums, album id for songs, curated item id for comments
+            extra: Display fields returned with results
+        """
+        parent_id = get_interner(PARENT_NAMESPACES[kind]).intern(parent) if parent else None
+        self._upsert(kind, get_interner(ID_NAMESPACES[kind]).intern(entity_id), text, parent_id, extra)
+
+    def _upsert(self, kind: str, entity_id: int, text: Optional[str], parent: Optional[int], extra: Optional[Dict[str, Any]]) -> None:
+        key = (kind, entity_id)
+        extra = extra or {}
+        doc_id = self._live.get(key)
+        if doc_id is not None:
+            current = self._docs[doc_id]
+            if current.text == text and current.parent == parent:
+                # Re-saves with the same text (ratings, slider drags) only change display fields
+                current.extra = extra
+                return
+            self._remove(kind, entity_id, reindex_children=False)
+        if not text:
+            return
+        doc = _Doc(kind, entity_id, text, parent, extra)
+        self._add(doc)
+        self._link(doc, True)
+        self._reindex_children(key)
+
+    def remove(self, kind: str, entity_id: str) -> None:
+        """Remove an entity from results"""
+        interned = get_interner(ID_NAMESPACES[kind]).get(entity_id, sync=False)
+        if interned is not None:
+            self._remove(kind, interned)
+
+    def _remove(self, kind: str, entity_id: int, reindex_children: bool = True) -> None:
+        doc_id = self._live.get((kind, entity_id))
+        if doc_id is None:
+            return
+        doc = self._tombstone(doc_id)
+        self._link(doc, False)
+        if reindex_children:
+            self._reindex_children((kind, entity_id))
+
+    def _reindex_children(self, key: Tuple[str, int]) -> None:
+        """Re-index albums and songs listed under a renamed artist or album"""
+        for child_kind, child_id in list(self._children.get(key, ())):
+            doc_id = self._live.get((child_kind, child_id))
+            if doc_id is None:
+                continue
+            child = self._tombstone(doc_id)
+            self._add(_Doc(child.kind, child.id, child.text, child.parent, child.extra))
+            self._reindex_children((child_kind, child_id))
+
+    def apply(self, table: str, rows: Iterable[Dict[str, Any]]) -> None:
+        """
+        Index changed rows from artists, albums, songs or user_curations
+
+        Rows need id plus name (artists), title and artist_id (albums), title and
+        album_id (songs), or user_id, curated_item_id, item_type, rating and comment
+        (user_curations).
+        """
+        kind = TABLE_KINDS[table]
+        rows = list(rows)
+        # Intern each id column in one batch: one lock and file append per namespace
+        ids = get_interner(ID_NAMESPACES[kind]).intern_list([row["id"] for row in rows])
+        parents: List[Optional[int]] = [None] * len(rows)
+        if kind != "artist":
+            present = [i for i, row in enumerate(rows) if row.get(PARENT_COLUMNS[kind])]
+            interned = get_interner(PARENT_NAMESPACES[kind]).intern_list([rows[i][PARENT_COLUMNS[kind]] for i in present])
+            for i, parent in zip(present, interned):
+                parents[i] = parent
+        if kind == "artist":
+            for row, entity_id in zip(rows, ids):
+                self._upsert(kind, entity_id, row.get("name"), None, None)
+        elif kind != "comment":
+            for row, entity_id, parent in zip(rows, ids, parents):
+                self._upsert(kind, entity_id, row.get("title"), parent, None)
+        else:
+            users = get_interner("users").intern_list([row["user_id"] for row in rows])
+            for row, entity_id, parent, user in zip(rows, ids, parents, users):
+                self._upsert(kind, entity_id, row.get("comment"), parent, {
+                    "user_id": user,
+                    "item_type": row.get("item_type"),
+                    "rating": row.get("rating")
+                })
+
+    def _query_terms(self, query: str) -> List[Tuple[str, float]]:
+        tokens = tokenize(query)
+        weights = {token: 1.0 for token in tokens}
+        # Still typing: the last word also matches longer terms it is a prefix of
+        if tokens and len(tokens[-1]) >= MIN_PREFIX and not query[-1:].isspace():
+            prefix = tokens[-1]
+            start = bisect.bisect_left(self._terms, prefix)
+            end = bisect.bisect_left(self._terms, prefix + "\uffff", start)
+            expansions = sorted(
+                (term for term in self._terms[start:end] if term != prefix and self._df.get(term)),
+                key=lambda term: self._df[term],
+                reverse=True
+            )[:MAX_EXPANSIONS]
+            for term in expansions:
+                weights.setdefault(term, PREFIX_WEIGHT)
+        return list(weights.items())
+
+    def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Rank documents for a query
+
+        Args:
+            query: Free text
+            kinds: Restrict results to these kinds (default: all)
+            limit: Maximum results
+
+        Returns:
+            List[Dict[str, Any]]: Results with type, id, display fields and score, best first
+        """
+        import numpy as np
+
+        count = self._next_doc
+        live = self._kinds[:count] != _DEAD
+        if kinds:
+            live &= np.isin(self._kinds[:count], [_KIND_CODES[kind] for kind in kinds])
+        scores = np.zeros(count)
+        for term, weight in self._query_terms(query):
+            df = self._df.get(term)
+            if not df:
+                continue
+            idf = math.log(1 + (len(self._docs) - df + 0.5) / (df + 0.5))
+            # BM25F: combine boosted, length-normalized frequencies across fields, then saturate
+            combined = np.zeros(count)
+            for field_index, field in enumerate(FIELDS):
+                posting = self._postings[field].get(term)
+                if posting is None or not self._field_docs[field]:
+                    continue
+                average = self._field_tokens[field] / self._field_docs[field]
+                doc_ids, tf = _decode_postings(posting.data)
+                norm = 1 - self.b + self.b * self._lengths[field_index, doc_ids] / average
+                # Doc ids are unique within a posting list, so fancy-index += is safe
+                combined[doc_ids] += FIELD_BOOSTS[field] * tf / norm
+            scores += weight * idf * combined / (self.k1 + combined)
+
+        scores[~live] = 0.0
+        matches = np.flatnonzero(scores > 0)
+        if len(matches) > limit:
+            matches = matches[np.argpartition(-scores[matches], limit - 1)[:limit]]
+        # Best first; ties go to the older document
+        best = matches[np.lexsort((matches, -scores[matches]))]
+        return [self._result(self._docs[int(doc_id)], float(scores[doc_id])) for doc_id in best]
+
+    def _result(self, doc: _Doc, score: float) -> Dict[str, Any]:
+        artists, items = get_interner("artists"), get_interner("items")
+        result: Dict[str, Any] = {"type": doc.kind, "id": get_interner(ID_NAMESPACES[doc.kind]).lookup(doc.id)}
+        if doc.kind == "artist":
+            result["name"] = doc.text
+        elif doc.kind == "album":
+            result.update(
+                title=doc.text,
+                artist_id=artists.lookup(doc.parent) if doc.parent is not None else None,
+                artist_name=self._text("artist", doc.parent)
+            )
+        elif doc.kind == "song":
+            artist_id = self._parent("album", doc.parent)
+            result.update(
+                title=doc.text,
+                album_id=items.lookup(doc.parent) if doc.parent is not None else None,
+                album_title=self._text("album", doc.parent),
+                artist_id=artists.lookup(artist_id) if artist_id is not None else None,
+                artist_name=self._text("artist", artist_id)
+            )
+        else:
+            result.update(
+                comment=doc.text,
+                user_id=get_interner("users").lookup(doc.extra["user_id"]),
+                item_id=items.lookup(doc.parent) if doc.parent is not None else None,
+                item_type=doc.extra.get("item_type"),
+                item_title=self._text(doc.extra.get("item_type"), doc.parent),
+                rating=doc.extra.get("rating")
+            )
+        result["score"] = round(score, 4)
+        return result
+
+def scan_table(client, table: str, select: str) -> Iterator[Dict[str, Any]]:
+    """Read a whole table in id order, one page per query"""
+    last_id = None
+    while True:
+        query = client.table(table).select(select).order("id").limit(SCAN_PAGE_SIZE)
+        if last_id is not None:
+            query = query.gt("id", last_id)
+        response = query.execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error reading {table}: {response.error}")
+        yield from response.data
+        if len(response.data) < SCAN_PAGE_SIZE:
+            return
+        last_id = response.data[-1]["id"]
+
+# Columns each indexed table is read with, by the build and the change feed
+INDEX_COLUMNS = {
+    "artists": "id, name",
+    "albums": "id, title, artist_id",
+    "songs": "id, title, album_id",
+    "user_curations": "id, user_id, curated_item_id, item_type, rating, comment",
+}
+
+def build_index(client) -> SearchIndex:
+    """Build a complete index from the database (blocking; run in a thread)"""
+    index = SearchIndex()
+    for table, select in INDEX_COLUMNS.items():
+        index.apply(table, scan_table(client, table, select))
+    return index
+
+class RebuildingIndex:
+    """
+    A process-wide in-memory index built from the database, kept current with apply()
+    and rebuilt periodically
+
+    Updates that arrive while a rebuild is reading the database are applied to both the
+    serving index and a replay log, and replayed onto the new index before it is
+    swapped in, so a rebuild never loses a change.
+
+    Args:
+        name: Index name for logs
+        build: Builds a complete index from a Supabase client (blocking; run in a thread).
+            The index must have apply(table, rows) and __len__.
+        client_factory: Returns the Supabase client the index is built from
+        rebuild_interval: Seconds between full rebuilds
+    """
+    def __init__(
+        self,
+        name: str,
+        build: Callable[[Any], Any],
+        client_factory: Callable[[], Any] = get_supabase_client,
+        rebuild_interval: float = SEARCH_INDEX_REBUILD_INTERVAL
+    ):
+        self.name = name
+        self.build = build
+        self.client_factory = client_factory
+        self.rebuild_interval = rebuild_interval
+        self.index: Any = None
+        self.ready = False
+        self._replay: Optional[List[Tuple[str, List[Dict[str, Any]]]]] = None
+        self._building: Optional[asyncio.Task] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def apply(self, table: str, rows: List[Dict[str, Any]]) -> None:
+        """Index changed rows"""
+        if self.ready:
+            self.index.apply(table, rows)
+        if self._replay is not None:
+            self._replay.append((table, rows))
+
+    async def _rebuild(self) -> bool:
+        self._replay = []
+        start = time.perf_counter()
+        try:
+            index = await asyncio.to_thread(self.build, self.client_factory())
+        except Exception as e:
+            logger.error(f"Error building {self.name} index: {e}")
+            return False
+        finally:
+            replay, self._replay = self._replay, None
+        for table, rows in replay:
+            index.apply(table, rows)
+        logger.info(f"Built {self.name} index: {len(index)} documents in {time.perf_counter() - start:.1f}s")
+        self.index = index
+        self.ready = True
+        return True
+
+    async def rebuild(self) -> bool:
+        """
+        Rebuild the index from the database, joining a rebuild already running
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        if self._building is None or self._building.done():
+            self._building = asyncio.get_running_loop().create_task(self._rebuild())
+        return await asyncio.shield(self._building)
+
+    async def get(self) -> Any:
+        """
+        The current index, building it first if this worker hasn't yet
+
+        Raises:
+            RuntimeError: If the index could not be built
+        """
+        if not self.ready and not await self.rebuild():
+            raise RuntimeError(f"The {self.name} index is unavailable")
+        return self.index
+
+    async def start(self) -> None:
+        """Build the index in the background and rebuild it periodically"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            await self.rebuild()
+            await asyncio.sleep(self.rebuild_interval)
+
+class CatalogSearch(RebuildingIndex):
+    """The process-wide search index and its rebuilds"""
+    def __init__(self, **kwargs):
+        super().__init__("search", build_index, **kwargs)
+
+    async def search(self, query: str, kinds: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """Search, building the index first if this worker hasn't yet"""
+        index = await self.get()
+        return index.search(query, kinds, limit)
+
+# Process-wide search
+_search: Optional[CatalogSearch] = None
+
+def get_catalog_search() -> CatalogSearch:
+    """Get the process-wide catalog search"""
+    global _search
+    if _search is None:
+        _search = CatalogSearch()
+    return _search
+
+def _subscribe(table: str) -> None:
+    # id and updated_at are always read by the feed
+    columns = INDEX_COLUMNS[table].replace("id, ", "", 1)
+    get_change_feed().subscribe(table, lambda rows: get_catalog_search().apply(table, rows), columns=columns)
+
+for _table in INDEX_COLUMNS:
+    _subscribe(_table)
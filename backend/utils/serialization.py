@@ -0,0 +1,59 @@
+"""
+Fast JSON serialization for The Music Besties API
+Uses orjson when it is installed and falls back to the standard library json module
+"""
+import json
+from dataclasses import asdict, is_dataclass
+from datetime import date, datetime
+from typing import Any
+
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+def _default(obj: Any) -> Any:
+    """Serialize types the JSON encoder doesn't handle natively"""
+    if isinstance(obj, BaseModel):
+        return obj.model_dump(mode="json")
+    if is_dataclass(obj):
+        return asdict(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(content: Any) -> bytes:
+    """
+    Serialize content to compact UTF-8 JSON bytes
+
+    Args:
+        content: Dicts, lists, scalars or Pydantic models
+
+    Returns:
+        bytes: Encoded JSON
+    """
+    if orjson is not None:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
+
+    return json.dumps(
+        content,
+        default=_default,
+        ensure_ascii=False,
+        allow_nan=False,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered with the fast encoder
+
+    Used as the app's default response class. Routes that already hold trusted,
+    JSON-ready data can return it directly to skip response_model re-validation.
+    """
+    media_type = "application/json"
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -1,20 +1,26 @@
 import os
-from typing import Optional, Dict, Any, List, Union
-from supabase import create_client, Client
+from typing import TYPE_CHECKING, Optional, Dict, Any, List, Union
 from dotenv import load_dotenv
 
+if TYPE_CHECKING:
+    from supabase import Client
+
 # Load environment variables
 load_dotenv()
 
 # Import test configuration
 from utils.test_config import TEST_MODE, TEST_USER_PROFILE, TEST_USER_DATA, get_test_user
+from utils.metrics import instrument_supabase
+from utils.read_replicas import SUPABASE_REPLICA_URLS, route_reads
 
 # Get Supabase credentials from environment variables
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# "memory" swaps in the in-memory stand-in from utils.memory_supabase for offline load testing
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "supabase").lower()
 
 # Singleton instances of the clients
-_supabase_client: Optional[Client] = None
+_supabase_client: Optional['Client'] = None
 _mock_supabase_client: Optional['MockSupabaseClient'] = None
 
 class MockSupabaseResponse:
@@ -65,7 +71,7 @@ class MockSupabaseAuth:
             return TEST_USER_DATA
         raise ValueError("Invalid JWT token")
 
-def get_supabase_client() -> Union[Client, MockSupabaseClient]:
+def get_supabase_client() -> Union['Client', MockSupabaseClient]:
     """
     Get or create a Supabase client instance
     
@@ -74,10 +80,18 @@ def get_supabase_client() -> Union[Client, MockSupabaseClient]:
     """
     global _supabase_client, _mock_supabase_client
     
+    # The in-memory stand-in is shared with utils.supabase_client so both see the same data
+    if SUPABASE_BACKEND == "memory":
+        if _supabase_client is None:
+            from utils.memory_supabase import get_memory_client
+            memory = get_memory_client()
+            _supabase_client = instrument_supabase(route_reads(memory, memory.replicas))
+        return _supabase_client
+    
     # Return mock client in test mode
     if TEST_MODE:
         if _mock_supabase_client is None:
-            _mock_supabase_client = MockSupabaseClient()
+            _mock_supabase_client = instrument_supabase(MockSupabaseClient())
         return _mock_supabase_client
     
     # Return real client in normal mode
@@ -85,7 +99,10 @@ def get_supabase_client() -> Union[Client, MockSupabaseClient]:
         if not SUPABASE_URL or not SUPABASE_KEY:
             raise ValueError("Supabase URL and Key must be set in environment variables")
         
-        _supabase_client = create_client(SUPABASE_URL, SUPABASE_KEY)
+        # Imported here because the supabase package is slow to import
+        from supabase import create_client
+        replicas = [create_client(url, SUPABASE_KEY) for url in SUPABASE_REPLICA_URLS]
+        _supabase_client = instrument_supabase(route_reads(create_client(SUPABASE_URL, SUPABASE_KEY), replicas))
     
     return _supabase_client
 
@@ -1,7 +1,8 @@
 import os
-from supabase import create_client
 from dotenv import load_dotenv
 import logging
+from utils.metrics import instrument_supabase
+from utils.read_replicas import SUPABASE_REPLICA_URLS, route_reads
 
 # Configure logging
 logging.basicConfig(
@@ -16,24 +17,43 @@ load_dotenv()
 # Get Supabase credentials from environment variables
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
+# "memory" swaps in the in-memory stand-in from utils.memory_supabase for offline load testing
+SUPABASE_BACKEND = os.getenv("SUPABASE_BACKEND", "supabase").lower()
 
-# Initialize Supabase client
-if SUPABASE_URL and SUPABASE_KEY:
-    try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
-        logger.info("Supabase client initialized successfully")
-    except Exception as e:
-        logger.error(f"Failed to initialize Supabase client: {e}")
-        supabase = None
-else:
-    logger.warning("Supabase URL or Key not provided. Check your environment variables.")
-    supabase = None
+# Supabase client, created on first use so importing the routes stays cheap on cold start
+supabase = None
+_initialized = False
 
 def get_supabase_client():
     """
-    Get the Supabase client instance
+    Get the Supabase client instance, creating it on first call
     
     Returns:
         The initialized Supabase client or None if initialization failed
     """
+    global supabase, _initialized
+    
+    if _initialized:
+        return supabase
+    _initialized = True
+    
+    if SUPABASE_BACKEND == "memory":
+        from utils.memory_supabase import get_memory_client
+        memory = get_memory_client()
+        supabase = instrument_supabase(route_reads(memory, memory.replicas))
+        logger.info("Using in-memory Supabase stand-in")
+    elif SUPABASE_URL and SUPABASE_KEY:
+        try:
+            # Imported here because the supabase package is slow to import
+            from supabase import create_client
+            replicas = [create_client(url, SUPABASE_KEY) for url in SUPABASE_REPLICA_URLS]
+            supabase = instrument_supabase(route_reads(create_client(SUPABASE_URL, SUPABASE_KEY), replicas))
+            logger.info("Supabase client initialized successfully")
+        except Exception as e:
+            logger.error(f"Failed to initialize Supabase client: {e}")
+            supabase = None
+    else:
+        logger.warning("Supabase URL or Key not provided. Check your environment variables.")
+        supabase = None
+    
     return supabase
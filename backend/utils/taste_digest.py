@@ -0,0 +1,294 @@
+"""
+Per-user taste digests for grounding chat in The Music Besties API
+A digest is a short plain-text summary of a user's taste: their primary artist by name,
+their top-rated albums and songs, and their most recent comments, truncated to a token
+budget. It goes into the chat system message so the model can personalize without
+looking anything up.
+
+Digests are built once per user (a few queries, in a worker thread) and then kept
+current from curation writes: a re-rating of an item already in the digest is applied
+in place, and only items the digest hasn't seen yet need a background title lookup.
+Chat turns read the cached text and make no queries. Other workers see curation
+changes when their copy expires after TASTE_DIGEST_TTL seconds; artist names, titles
+and primary artist changes reach every worker through the change feed.
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.change_feed import get_change_feed
+from utils.jobs import enqueue_job, register_job
+from utils.metrics import record_cache_lookup
+from utils.supabase import get_supabase_client
+
+logger = logging.getLogger(__name__)
+
+TASTE_DIGEST_TOKEN_BUDGET = int(os.getenv("TASTE_DIGEST_TOKEN_BUDGET", "250"))
+TASTE_DIGEST_TTL = float(os.getenv("TASTE_DIGEST_TTL", "900"))
+TASTE_DIGEST_MAX_USERS = int(os.getenv("TASTE_DIGEST_MAX_USERS", "10000"))
+
+# Items listed per section, and curations read when building a digest
+TOP_ITEMS = 5
+RECENT_COMMENTS = 3
+MAX_COMMENT_CHARS = 160
+BUILD_SCAN_LIMIT = 200
+
+# (item_type, item_id)
+ItemKey = Tuple[str, str]
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count for English text (about four characters per token)"""
+    return (len(text) + 3) // 4
+
+@dataclass
+class TasteDigest:
+    """
+    Materialized taste state for one user
+
+    Attributes:
+        items: Curated items by (item_type, item_id), least recently curated first
+        text: Rendered digest, or None until the next render
+    """
+    user_id: str
+    artist_id: Optional[str] = None
+    artist_name: Optional[str] = None
+    items: "OrderedDict[ItemKey, Dict[str, Any]]" = field(default_factory=OrderedDict)
+    built_at: float = field(default_factory=time.monotonic)
+    text: Optional[str] = None
+
+    def apply(self, key: ItemKey, row: Dict[str, Any], title: str) -> None:
+        """Record a curation as the user's most recent"""
+        self.items.pop(key, None)
+        self.items[key] = {
+            "title": title,
+            "rating": row.get("rating"),
+            "weighted_rank_percentage": row.get("weighted_rank_percentage"),
+            "comment": row.get("comment")
+        }
+        self.text = None
+
+    def render(self, budget: int = TASTE_DIGEST_TOKEN_BUDGET) -> str:
+        """Render the digest, keeping whole lines until the token budget is used up"""
+        lines = []
+        if self.artist_name:
+            lines.append(f"Primary artist: {self.artist_name}")
+        for item_type, label in (("album", "Top albums"), ("song", "Top songs")):
+            ranked = sorted(
+                (item for (kind, _), item in self.items.items() if kind == item_type and item["rating"]),
+                key=lambda item: (item["rating"], item["weighted_rank_percentage"] or 0),
+                reverse=True
+            )[:TOP_ITEMS]
+            if ranked:
+                lines.append(f"{label}: " + ", ".join(f"{item['title']} ({item['rating']}/5)" for item in ranked))
+        comments = [item for item in reversed(self.items.values()) if item["comment"]][:RECENT_COMMENTS]
+        for item in comments:
+            comment = item["comment"]
+            if len(comment) > MAX_COMMENT_CHARS:
+                comment = comment[:MAX_COMMENT_CHARS - 3].rstrip() + "..."
+            lines.append(f'Recent comment on {item["title"]}: "{comment}"')
+
+        kept, used = [], 0
+        for line in lines:
+            cost = estimate_tokens(line) + 1
+            if used + cost > budget:
+                break
+            kept.append(line)
+            used += cost
+        return "\n".join(kept)
+
+def _fetch_titles(supabase, keys: Iterable[ItemKey]) -> Dict[ItemKey, str]:
+    """Resolve album and song titles, one query per item type"""
+    titles = {}
+    for item_type, table in (("album", "albums"), ("song", "songs")):
+        ids = list({item_id for kind, item_id in keys if kind == item_type})
+        if not ids:
+            continue
+        response = supabase.table(table).select("id, title").in_("id", ids).execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error fetching {table} titles: {response.error}")
+        titles.update({(item_type, row["id"]): row["title"] for row in response.data})
+    return titles
+
+def _item_key(row: Dict[str, Any]) -> ItemKey:
+    return (row["item_type"], row["curated_item_id"])
+
+class TasteDigestCache:
+    """
+    LRU cache of taste digests for recently active users
+
+    Args:
+        ttl: Seconds a digest is trusted before it is rebuilt from the database
+        max_users: Digests kept before the least recently used is evicted
+    """
+    def __init__(self, ttl: float = TASTE_DIGEST_TTL, max_users: int = TASTE_DIGEST_MAX_USERS):
+        self.ttl = ttl
+        self.max_users = max_users
+        self._digests: "OrderedDict[str, TasteDigest]" = OrderedDict()
+
+    def _fresh(self, user_id: str) -> Optional[TasteDigest]:
+        digest = self._digests.get(user_id)
+        if digest is not None and time.monotonic() - digest.built_at > self.ttl:
+            del self._digests[user_id]
+            digest = None
+        return digest
+
+    def get(self, user_id: str) -> Optional[str]:
+        """Cached digest text for a user, or None if it needs building"""
+        digest = self._fresh(user_id)
+        record_cache_lookup("taste_digest", hit=digest is not None)
+        if digest is None:
+            return None
+        self._digests.move_to_end(user_id)
+        if digest.text is None:
+            digest.text = digest.render()
+        return digest.text
+
+    def build(self, user_id: str, profile: Optional[Dict[str, Any]] = None) -> TasteDigest:
+        """
+        Build a user's digest from the database (blocking; run in a thread)
+
+        Args:
+            user_id: User to summarize
+            profile: The user's profile row, for the primary artist
+
+        Returns:
+            TasteDigest: Rendered digest, empty if the user has no curations or artist yet
+        """
+        supabase = get_supabase_client()
+        digest = TasteDigest(user_id=user_id)
+
+        artist_id = digest.artist_id = profile.get("primary_artist_id") if profile else None
+        if artist_id:
+            response = supabase.table("artists").select("name").eq("id", artist_id).execute()
+            if response.data:
+                digest.artist_name = response.data[0]["name"]
+
+        response = supabase.table("user_curations").select(
+            "curated_item_id, item_type, rating, comment, weighted_rank_percentage, updated_at"
+        ).eq("user_id", user_id).order("updated_at", desc=True).limit(BUILD_SCAN_LIMIT).execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(f"Error fetching curations: {response.error}")
+        rows = response.data
+        titles = _fetch_titles(supabase, [_item_key(row) for row in rows])
+        # Oldest first, so the most recent curation ends up last
+        for row in reversed(rows):
+            key = _item_key(row)
+            if key in titles:
+                digest.apply(key, row, titles[key])
+
+        digest.text = digest.render()
+        return digest
+
+    async def load(self, user_id: str, profile: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        """
+        Get a user's digest text, building it in a worker thread on a cache miss
+
+        Returns:
+            str or None if the digest could not be built
+        """
+        text = self.get(user_id)
+        if text is not None:
+            return text
+        try:
+            digest = await asyncio.to_thread(self.build, user_id, profile)
+        except Exception as e:
+            logger.error(f"Error building taste digest for {user_id}: {e}")
+            return None
+        # Cache on the event loop, which owns every mutation of the cached digests
+        self._digests[user_id] = digest
+        while len(self._digests) > self.max_users:
+            self._digests.popitem(last=False)
+        return digest.text
+
+    def apply_curations(self, rows: List[Dict[str, Any]]) -> None:
+        """
+        Fold saved curation rows into cached digests
+
+        Items a digest already knows are updated in place; new items are handed to a
+        background job to resolve their titles. Users without a cached digest are
+        skipped, since their next build reads the saved rows anyway.
+        """
+        unknown = []
+        for row in rows:
+            digest = self._digests.get(row["user_id"])
+            if digest is None:
+                continue
+            key = _item_key(row)
+            known = digest.items.get(key)
+            if known is not None:
+                digest.apply(key, row, known["title"])
+            else:
+                unknown.append(row)
+        for row in unknown:
+            enqueue_job("taste_digest.update", {
+                "user_id": row["user_id"],
+                "curated_item_id": row["curated_item_id"],
+                "item_type": row["item_type"],
+                "rating": row.get("rating"),
+                "comment": row.get("comment"),
+                "weighted_rank_percentage": row.get("weighted_rank_percentage")
+            })
+
+    async def apply_new_items(self, rows: List[Dict[str, Any]]) -> None:
+        """Resolve titles for newly curated items and apply them"""
+        titles = await asyncio.to_thread(_fetch_titles, get_supabase_client(), [_item_key(row) for row in rows])
+        for row in rows:
+            digest = self._digests.get(row["user_id"])
+            key = _item_key(row)
+            if digest is not None and key in titles:
+                digest.apply(key, row, titles[key])
+
+    def invalidate(self, user_id: str) -> None:
+        """Drop a user's digest, e.g. after their primary artist changes"""
+        self._digests.pop(user_id, None)
+
+    def on_profiles_changed(self, rows: List[Dict[str, Any]]) -> None:
+        """Change feed: drop digests whose primary artist changed"""
+        for row in rows:
+            digest = self._digests.get(row["id"])
+            if digest is not None and digest.artist_id != row.get("primary_artist_id"):
+                del self._digests[row["id"]]
+
+    def on_artists_changed(self, rows: List[Dict[str, Any]]) -> None:
+        """Change feed: refresh renamed primary artists in place"""
+        names = {row["id"]: row["name"] for row in rows}
+        for digest in self._digests.values():
+            name = names.get(digest.artist_id)
+            if name is not None and name != digest.artist_name:
+                digest.artist_name = name
+                digest.text = None
+
+    def on_titles_changed(self, item_type: str, rows: List[Dict[str, Any]]) -> None:
+        """Change feed: refresh renamed albums or songs in place"""
+        titles = {(item_type, row["id"]): row["title"] for row in rows}
+        for digest in self._digests.values():
+            for key, title in titles.items():
+                item = digest.items.get(key)
+                if item is not None and item["title"] != title:
+                    item["title"] = title
+                    digest.text = None
+
+# Process-wide cache
+_cache: Optional[TasteDigestCache] = None
+
+def get_taste_digests() -> TasteDigestCache:
+    """Get the process-wide taste digest cache"""
+    global _cache
+    if _cache is None:
+        _cache = TasteDigestCache()
+    return _cache
+
+async def _update_digests(rows: List[Dict[str, Any]]) -> None:
+    """Background job: add newly curated items to cached digests"""
+    await get_taste_digests().apply_new_items(rows)
+
+register_job("taste_digest.update", _update_digests, batch_size=100)
+
+get_change_feed().subscribe("profiles", lambda rows: get_taste_digests().on_profiles_changed(rows), columns="primary_artist_id")
+get_change_feed().subscribe("artists", lambda rows: get_taste_digests().on_artists_changed(rows), columns="name")
+get_change_feed().subscribe("albums", lambda rows: get_taste_digests().on_titles_changed("album", rows), columns="title")
+get_change_feed().subscribe("songs", lambda rows: get_taste_digests().on_titles_changed("song", rows), columns="title")
@@ -0,0 +1,158 @@
+"""
+Write-behind buffer for The Music Besties API
+Coalesces bursts of writes to the same row (star re-ratings, weighted-rank slider
+drags) over a short window and flushes the latest value per key in one bulk upsert.
+
+Guarantees:
+    - Latest value wins: a later put for a key replaces the queued row, and a failed
+      flush never overwrites a newer put for the same key
+    - Read-your-writes in this worker: get() and rows() include rows that are queued
+      or being flushed, so handlers can overlay them on database reads
+    - close() flushes everything still queued; the lifespan hook calls it on shutdown
+
+A hard crash (SIGKILL, OOM) loses at most one window of acknowledged writes. Set
+WRITE_BUFFER_WINDOW_MS=0 to write through instead.
+"""
+import asyncio
+import logging
+import os
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+from utils.metrics import WRITE_BUFFER_FLUSHES, WRITE_BUFFER_ROWS
+
+logger = logging.getLogger(__name__)
+
+WRITE_BUFFER_WINDOW = float(os.getenv("WRITE_BUFFER_WINDOW_MS", "500")) / 1000
+WRITE_BUFFER_MAX_BATCH = int(os.getenv("WRITE_BUFFER_MAX_BATCH", "500"))
+
+class WriteBuffer:
+    """
+    Coalescing write-behind buffer for one table
+
+    Rows must carry their primary key in "id" so a flush is a single upsert.
+
+    Args:
+        table: Table the rows are upserted into
+        client_factory: Returns the Supabase client used to flush
+        window: Seconds a row waits for newer values before it is flushed
+        max_batch: Flush early once this many keys are queued
+        on_flush: Called on the event loop with the rows of each successful flush
+        on_conflict: Comma-separated unique columns the upsert merges on instead of the
+            primary key, so rows another worker wrote under the same key are updated
+    """
+    def __init__(
+        self,
+        table: str,
+        client_factory: Callable[[], Any],
+        window: float = WRITE_BUFFER_WINDOW,
+        max_batch: int = WRITE_BUFFER_MAX_BATCH,
+        on_flush: Optional[Callable[[List[Dict[str, Any]]], None]] = None,
+        on_conflict: Optional[str] = None
+    ):
+        self.table = table
+        self.client_factory = client_factory
+        self.window = window
+        self.max_batch = max_batch
+        self.on_flush = on_flush
+        self.on_conflict = on_conflict
+        self._pending: Dict[Hashable, Dict[str, Any]] = {}
+        self._flushing: Dict[Hashable, Dict[str, Any]] = {}
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.window > 0
+
+    def get(self, key: Hashable) -> Optional[Dict[str, Any]]:
+        """The newest unflushed row for a key, if any"""
+        row = self._pending.get(key)
+        return row if row is not None else self._flushing.get(key)
+
+    def rows(self, predicate: Callable[[Dict[str, Any]], bool] = lambda row: True) -> List[Dict[str, Any]]:
+        """Unflushed rows matching a predicate, newest value per key"""
+        merged = {**self._flushing, **self._pending}
+        return [row for row in merged.values() if predicate(row)]
+
+    def put(self, key: Hashable, row: Dict[str, Any]) -> None:
+        """Queue a row, replacing any queued row for the same key"""
+        self._pending[key] = row
+        WRITE_BUFFER_ROWS.inc(self.table, "put")
+        loop = asyncio.get_running_loop()
+        if len(self._pending) >= self.max_batch:
+            self._schedule_flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.window, self._schedule_flush)
+
+    def _schedule_flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+
+    async def flush(self) -> int:
+        """
+        Write every queued row in one upsert
+
+        Returns:
+            int: Rows written (0 if the flush failed and was re-queued)
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            if not self._pending:
+                return 0
+            self._flushing, self._pending = self._pending, {}
+            batch = list(self._flushing.values())
+            start = time.perf_counter()
+            try:
+                await asyncio.to_thread(self._write, batch)
+            except Exception as e:
+                logger.error(f"Error flushing {len(batch)} buffered {self.table} rows, will retry: {e}")
+                WRITE_BUFFER_FLUSHES.inc(self.table, "error")
+                # Re-queue unless a newer value arrived while this flush was running
+                for key, row in self._flushing.items():
+                    self._pending.setdefault(key, row)
+                self._flushing = {}
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(self.window, self._schedule_flush)
+                return 0
+
+            self._flushing = {}
+            WRITE_BUFFER_FLUSHES.inc(self.table, "ok")
+            WRITE_BUFFER_ROWS.inc(self.table, "written", amount=len(batch))
+            logger.debug(f"Flushed {len(batch)} {self.table} rows in {(time.perf_counter() - start) * 1000:.1f}ms")
+            if self.on_flush is not None:
+                self.on_flush(batch)
+            # Rows queued during the flush wait at most one more window
+            if self._pending and self._timer is None:
+                self._timer = asyncio.get_running_loop().call_later(self.window, self._schedule_flush)
+            return len(batch)
+
+    def _write(self, batch: List[Dict[str, Any]]) -> None:
+        query = self.client_factory().table(self.table)
+        response = (query.upsert(batch, on_conflict=self.on_conflict) if self.on_conflict else query.upsert(batch)).execute()
+        if hasattr(response, 'error') and response.error:
+            raise RuntimeError(response.error)
+
+    async def close(self, attempts: int = 3) -> bool:
+        """
+        Flush everything queued, retrying failed flushes
+
+        Returns:
+            bool: True if nothing is left unwritten
+        """
+        for _ in range(attempts):
+            if self._flush_task is not None and not self._flush_task.done():
+                await self._flush_task
+            await self.flush()
+            if not self._pending:
+                return True
+        logger.error(f"Dropping {len(self._pending)} buffered {self.table} rows after {attempts} failed flushes")
+        return False
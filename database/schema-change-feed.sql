@@ -0,0 +1,22 @@
+-- Music Besties change feed
+-- The backend's change feed polls updated_at on these tables to invalidate its caches.
+-- Phase 1 only maintains updated_at on profiles and user_curations; the catalog tables
+-- need the same trigger, and every polled table needs an index on (updated_at, id).
+
+CREATE TRIGGER update_artists_modtime
+BEFORE UPDATE ON artists
+FOR EACH ROW EXECUTE FUNCTION update_modified_column();
+
+CREATE TRIGGER update_albums_modtime
+BEFORE UPDATE ON albums
+FOR EACH ROW EXECUTE FUNCTION update_modified_column();
+
+CREATE TRIGGER update_songs_modtime
+BEFORE UPDATE ON songs
+FOR EACH ROW EXECUTE FUNCTION update_modified_column();
+
+-- The feed pages by (updated_at, id), so rows sharing a timestamp are never skipped
+CREATE INDEX IF NOT EXISTS idx_profiles_updated_at ON profiles(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_artists_updated_at ON artists(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_albums_updated_at ON albums(updated_at, id);
+CREATE INDEX IF NOT EXISTS idx_songs_updated_at ON songs(updated_at, id);
@@ -0,0 +1,20 @@
+-- Music Besties chat history
+-- Stores each chat turn written by the backend's chat.persist background job
+
+CREATE TABLE IF NOT EXISTS chat_messages (
+  id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+  user_id UUID REFERENCES profiles(id) ON DELETE CASCADE NOT NULL,
+  conversation_id TEXT,
+  sender TEXT NOT NULL CHECK (sender IN ('user', 'assistant')),
+  content TEXT NOT NULL,
+  metadata JSONB,
+  created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_chat_messages_user_conversation ON chat_messages(user_id, conversation_id, created_at);
+
+-- Users can only read their own messages; the backend writes with the service key
+ALTER TABLE chat_messages ENABLE ROW LEVEL SECURITY;
+
+CREATE POLICY chat_messages_select_policy ON chat_messages
+  FOR SELECT USING (auth.uid() = user_id);
@@ -0,0 +1,15 @@
+-- Music Besties: one curation per user and item
+-- The backend's write buffer upserts curations on (user_id, curated_item_id, item_type),
+-- so two workers saving the same user's first curation of an item at once end up with
+-- one row instead of two. Apply after schema-phase1.sql.
+
+-- Keep the most recently updated row of any existing duplicates
+DELETE FROM user_curations a
+USING user_curations b
+WHERE a.user_id = b.user_id
+  AND a.curated_item_id = b.curated_item_id
+  AND a.item_type = b.item_type
+  AND (a.updated_at, a.id) < (b.updated_at, b.id);
+
+ALTER TABLE user_curations
+  ADD CONSTRAINT user_curations_user_item_key UNIQUE (user_id, curated_item_id, item_type);
@@ -0,0 +1,12 @@
+-- Music Besties read replicas
+-- The backend routes reads to replicas (SUPABASE_REPLICA_URLS) and records the primary's
+-- WAL position after each write so a user's next reads wait for a replica that has
+-- replayed it. Apply this on the primary; replicas receive it through replication.
+-- On a replica it reports the replayed position, on the primary the current one.
+
+CREATE OR REPLACE FUNCTION wal_lsn()
+RETURNS TEXT AS $$
+    SELECT (CASE WHEN pg_is_in_recovery() THEN pg_last_wal_replay_lsn() ELSE pg_current_wal_lsn() END)::TEXT;
+$$ LANGUAGE sql STABLE;
+
+GRANT EXECUTE ON FUNCTION wal_lsn() TO anon, authenticated, service_role;
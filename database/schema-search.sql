@@ -0,0 +1,5 @@
+-- Music Besties full-text search
+-- The backend's search index follows comment edits through the change feed, which polls
+-- updated_at on user_curations as well (see schema-change-feed.sql).
+
+CREATE INDEX IF NOT EXISTS idx_user_curations_updated_at ON user_curations(updated_at, id);